@@ -0,0 +1,209 @@
+"""Vectorized spending analytics over a user's expense history.
+
+Each function loads what it needs in bulk through an ExpenseRepo (from the
+rollups where it can, aggregated by the database before it reaches Python)
+into NumPy arrays; everything after that is array arithmetic, with no
+per-row Python loops.
+"""
+import calendar
+from datetime import date, timedelta
+
+import numpy as np
+
+FORECAST_LOOKBACK_DAYS = 90
+OUTLIER_THRESHOLD = 3.5         # modified z-score (Iglewicz and Hoaglin)
+OUTLIER_MIN_GROUP = 8           # categories with fewer sampled expenses are not scored
+OUTLIER_SAMPLE_SIZE = 5000
+
+def _day_range(start, end):
+    return np.arange(np.datetime64(start), np.datetime64(end) + 1, dtype='datetime64[D]')
+
+def _day_offsets(dates, start):
+    return (np.array(dates, dtype='datetime64[D]') - np.datetime64(start)).astype(int)
+
+def load_daily_matrix(expenses, start, end):
+    """Spend per day and category between start and end (inclusive).
+
+    Returns (categories, matrix) with matrix[d, c] the total of category c
+    on day start + d.
+    """
+    rows = expenses.daily_totals(('date', 'category'), start.isoformat(), end.isoformat())
+    days = (end - start).days + 1
+    if not rows:
+        return [], np.zeros((days, 0))
+    dates, categories, totals = zip(*rows)
+    names, index = np.unique(np.array(categories, dtype=object), return_inverse=True)
+    matrix = np.zeros((days, len(names)))
+    matrix[_day_offsets(dates, start), index] = totals
+    return names.tolist(), matrix
+
+def load_daily_totals(expenses, start, end):
+    """Total spend of every day between start and end (inclusive)"""
+    rows = expenses.daily_totals(('date',), start.isoformat(), end.isoformat())
+    daily = np.zeros((end - start).days + 1)
+    if rows:
+        dates, totals = zip(*rows)
+        daily[_day_offsets(dates, start)] = totals
+    return daily
+
+def load_monthly_matrix(expenses, first_month, last_month):
+    """Spend per month and category between two month-start dates (inclusive).
+
+    Returns (categories, matrix) with matrix[m, c] the total of category c
+    in the m-th month after first_month.
+    """
+    rows = expenses.monthly_totals(('month', 'category'), first_month.strftime('%Y-%m'), last_month.strftime('%Y-%m'))
+    months = (last_month.year - first_month.year) * 12 + last_month.month - first_month.month + 1
+    if not rows:
+        return [], np.zeros((months, 0))
+    labels, categories, totals = zip(*rows)
+    offsets = (np.array(labels, dtype='datetime64[M]') - np.datetime64(first_month, 'M')).astype(int)
+    names, index = np.unique(np.array(categories, dtype=object), return_inverse=True)
+    matrix = np.zeros((months, len(names)))
+    matrix[offsets, index] = totals
+    return names.tolist(), matrix
+
+def rolling_average(values, window):
+    """Trailing mean over ``window`` points (shorter at the start of the series)"""
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    ends = np.arange(1, len(values) + 1)
+    widths = np.minimum(ends, window)
+    return (sums[ends] - sums[ends - widths]) / widths
+
+def trends(expenses, today, days=90):
+    """Daily spend with 7- and 30-day rolling averages for the last ``days`` days"""
+    start = today - timedelta(days=days - 1)
+    # Load 29 extra days so the 30-day average is complete from the first day
+    daily = load_daily_totals(expenses, start - timedelta(days=29), today)
+    return {
+        'dates': _day_range(start, today).astype(str).tolist(),
+        'daily': np.round(daily[29:], 2).tolist(),
+        'rolling_7': np.round(rolling_average(daily, 7)[29:], 2).tolist(),
+        'rolling_30': np.round(rolling_average(daily, 30)[29:], 2).tolist(),
+    }
+
+def forecast_month_end(expenses, today, lookback=FORECAST_LOOKBACK_DAYS):
+    """Projected total spend for the current month.
+
+    The rest of the month is projected from the average spend of each
+    weekday over the last ``lookback`` days; the range is a 95% band from
+    the spread of the daily totals around those weekday means.
+    """
+    start = today - timedelta(days=lookback - 1)
+    categories, matrix = load_daily_matrix(expenses, start, today)
+    daily = matrix.sum(axis=1)
+    weekdays = (_day_range(start, today).view('int64') + 3) % 7  # 1970-01-01 was a Thursday; 0 = Monday
+    day_counts = np.bincount(weekdays, minlength=7)
+    weekday_mean = np.bincount(weekdays, weights=daily, minlength=7) / np.maximum(day_counts, 1)
+    residual_std = float(np.std(daily - weekday_mean[weekdays])) if len(daily) > 1 else 0.0
+
+    month_start = today.replace(day=1)
+    month_end = today.replace(day=calendar.monthrange(today.year, today.month)[1])
+    elapsed = (today - month_start).days + 1
+    remaining = (month_end - today).days
+    remaining_weekdays = np.arange(today.weekday() + 1, today.weekday() + 1 + remaining) % 7
+
+    spent = matrix[-elapsed:].sum(axis=0) if elapsed <= lookback else matrix.sum(axis=0)
+    spent_total = float(spent.sum())
+    projected = spent_total + float(weekday_mean[remaining_weekdays].sum())
+    margin = 1.96 * residual_std * np.sqrt(remaining)
+    category_rate = matrix.mean(axis=0)
+    by_category = spent + category_rate * remaining
+    return {
+        'month': today.strftime('%Y-%m'),
+        'days_elapsed': elapsed,
+        'days_remaining': remaining,
+        'spent_to_date': round(spent_total, 2),
+        'forecast_total': round(projected, 2),
+        'forecast_low': round(max(spent_total, projected - margin), 2),
+        'forecast_high': round(projected + margin, 2),
+        'by_category': {name: round(float(total), 2) for name, total in zip(categories, by_category)},
+    }
+
+def category_seasonality(expenses, today, years=3):
+    """Seasonal index of each category per calendar month.
+
+    An index of 1.5 for December means the category's December spend is 50%
+    above its average month. Only complete months since the user's first
+    expense in the window count; months never observed are None.
+    """
+    first_month = date(today.year - years, today.month, 1)
+    last_month = (today.replace(day=1) - timedelta(days=1)).replace(day=1)
+    categories, monthly = load_monthly_matrix(expenses, first_month, last_month)
+    month_labels = list(calendar.month_abbr)[1:]
+    if not categories:
+        return {'months': month_labels, 'categories': {}}
+    active = np.nonzero(monthly.sum(axis=1))[0]
+    if active.size == 0:
+        return {'months': month_labels, 'categories': {}}
+    monthly = monthly[active[0]:]
+    calendar_month = (first_month.month - 1 + active[0] + np.arange(len(monthly))) % 12
+
+    observed = np.bincount(calendar_month, minlength=12)
+    by_calendar = np.zeros((12, len(categories)))
+    np.add.at(by_calendar, calendar_month, monthly)
+    seasonal_mean = by_calendar / np.maximum(observed, 1)[:, None]
+    overall_mean = monthly.mean(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        index = np.where(overall_mean > 0, seasonal_mean / overall_mean, np.nan)
+    index[observed == 0] = np.nan
+    return {
+        'months': month_labels,
+        'categories': {
+            name: [None if np.isnan(value) else round(float(value), 3) for value in index[:, i]]
+            for i, name in enumerate(categories)
+        },
+    }
+
+def _group_medians(values, groups, starts, counts):
+    """Median of ``values`` within each group (groups given as integer codes)"""
+    ordered = values[np.lexsort((values, groups))]
+    return (ordered[starts + (counts - 1) // 2] + ordered[starts + counts // 2]) / 2
+
+def outlier_expenses(expenses, today, days=180, limit=20, threshold=OUTLIER_THRESHOLD):
+    """Expenses unusually large for their category.
+
+    Each category's median and median absolute deviation are taken from the
+    most recent OUTLIER_SAMPLE_SIZE expenses in the window (all of them for
+    smaller histories). Then only the largest expenses of each category
+    above its cut-off are read back, scored with the modified z-score, and
+    the ``limit`` highest returned.
+    """
+    start, end = (today - timedelta(days=days - 1)).isoformat(), today.isoformat()
+    rows = expenses.recent_amounts(start, end, OUTLIER_SAMPLE_SIZE)
+    if not rows:
+        return []
+    categories, amounts = zip(*rows)
+    names, groups = np.unique(np.array(categories, dtype=object), return_inverse=True)
+    amounts = np.array(amounts, dtype=float)
+    counts = np.bincount(groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    median = _group_medians(amounts, groups, starts, counts)
+    deviation = np.abs(amounts - median[groups])
+    mad = _group_medians(deviation, groups, starts, counts)
+    # Fall back to the mean absolute deviation when most amounts are identical
+    mean_ad = np.bincount(groups, weights=deviation) / counts
+    scale = np.where(mad > 0, mad / 0.6745, mean_ad * 1.2533)
+    scored = np.nonzero((counts >= OUTLIER_MIN_GROUP) & (scale > 0))[0]
+    if not len(scored):
+        return []
+
+    # Only the largest expenses of each scored category above its cut-off
+    cutoffs = median[scored] + threshold * scale[scored]
+    candidates = expenses.largest_above(
+        {names[group]: float(cutoff) for group, cutoff in zip(scored, cutoffs)}, start, end, limit
+    )
+    if not candidates:
+        return []
+    candidate_groups = np.searchsorted(names, np.array([row['category'] for row in candidates], dtype=object))
+    amounts = np.array([row['amount'] for row in candidates], dtype=float)
+    scores = (amounts - median[candidate_groups]) / scale[candidate_groups]
+    return [dict(
+        _expense_dict(candidates[i]),
+        category_median=round(float(median[candidate_groups[i]]), 2),
+        score=round(float(scores[i]), 2),
+    ) for i in np.argsort(-scores)[:limit]]
+
+def _expense_dict(row):
+    return {key: row[key] for key in ('id', 'date', 'category', 'amount', 'payment_mode', 'notes')}
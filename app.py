@@ -1,15 +1,92 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, session, g, stream_with_context
+import calendar
+import click
+import math
 from datetime import datetime, timedelta
-from werkzeug.security import generate_password_hash, check_password_hash
 from functools import wraps
+import base64
+import hashlib
+import csv
+import json
 import os
-from database import init_db, get_db_connection
+import re
+import time
+import analytics
+from cache import create_cache
+from exporter import DATASETS, EXPORT_BATCH_SIZE, FORMATS, build_query, csv_chunks, parquet_available, parquet_chunks
+from events import ChangeNotifier
+from instrumentation import DEFAULT_SLOW_QUERY_MS, QueryLog, RequestMetrics, configure_logging, log_request, server_timing
+from passwords import DEFAULT_HASH_WORKERS, DEFAULT_MAX_PENDING, HasherBusy, PasswordHasher
+from recurring import DEFAULT_BATCH_SIZE as DEFAULT_RECURRING_BATCH_SIZE, DEFAULT_INTERVAL as DEFAULT_RECURRING_INTERVAL, FREQUENCIES, RecurringScheduler, next_occurrence
+from importer import RowError, detect_format, iter_records, validate_expense
+from database import set_query_auditor, DEFAULT_POOL_SIZE, DEFAULT_SHARD_COUNT
+from query_audit import QueryPlanAuditor
+from shards import move_user, rebalance
+from storage import BudgetRepo, ChangeRepo, ExpenseRepo, GoalRepo, SavingsRepo, SQLiteStorage, create_storage
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
 app.config['DATABASE'] = 'expenses.db'
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', DEFAULT_POOL_SIZE))
+app.config['DB_SHARDS'] = int(os.environ.get('DB_SHARDS', DEFAULT_SHARD_COUNT))
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'sqlite')
+app.config['STORAGE_URL'] = os.environ.get('STORAGE_URL')
+app.config['RESULT_CACHE'] = os.environ.get('RESULT_CACHE', 'true').lower() == 'true'
+app.config['CACHE_TTL'] = int(os.environ.get('CACHE_TTL', 60))
+app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES', 4096))
+app.config['CACHE_MAX_BYTES'] = int(os.environ.get('CACHE_MAX_BYTES', 32 * 1024 * 1024))
+app.config['CACHE_REDIS_URL'] = os.environ.get('CACHE_REDIS_URL')
+app.config['EVENTS_POLL_INTERVAL'] = float(os.environ.get('EVENTS_POLL_INTERVAL', 1.0))
+app.config['REQUEST_INSTRUMENTATION'] = os.environ.get('REQUEST_INSTRUMENTATION', 'true').lower() == 'true'
+app.config['REQUEST_LOG_LEVEL'] = os.environ.get('REQUEST_LOG_LEVEL', 'INFO')
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS))
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', DEFAULT_HASH_WORKERS))
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', DEFAULT_MAX_PENDING))
+app.config['USER_CONTEXT_TTL'] = int(os.environ.get('USER_CONTEXT_TTL', 3600))
+app.config['QUERY_PLAN_AUDIT'] = os.environ.get('QUERY_PLAN_AUDIT', 'false').lower() == 'true'
+app.config['RECURRING_SCHEDULER'] = os.environ.get('RECURRING_SCHEDULER', 'true').lower() == 'true'
+app.config['RECURRING_INTERVAL'] = float(os.environ.get('RECURRING_INTERVAL', DEFAULT_RECURRING_INTERVAL))
+app.config['RECURRING_BATCH_SIZE'] = int(os.environ.get('RECURRING_BATCH_SIZE', DEFAULT_RECURRING_BATCH_SIZE))
 
-init_db()
+def stored_data_version(user_id):
+    """The user's change counter in their store, bumped by every write to
+    their data from any process (routes, other workers, CLI commands)"""
+    return storage.changes(user_id).version()
+
+def polled_data_version(user_id):
+    """stored_data_version() on a connection of its own, for event streams
+    that outlive their request's connection"""
+    with storage.connect(user_id) as db:
+        return ChangeRepo(db, user_id).version()
+
+def user_data_changed(user_id):
+    """Invalidate everything derived from a user's data after a write and
+    wake the user's event streams in this worker"""
+    result_cache.invalidate_user(user_id)
+    change_notifier.notify(user_id)
+
+def recurring_expenses_written(user_ids):
+    """Called by the recurring scheduler after each batch it commits"""
+    for user_id in user_ids:
+        user_data_changed(user_id)
+
+# Under ``python app.py`` every spawned password hash worker re-imports this
+# module as __mp_main__. The workers only run passwords.py functions, so they
+# skip opening the databases and setting up the server's services.
+if __name__ != '__mp_main__':
+    storage = create_storage(app.config)
+    storage.init_app(app)
+    result_cache = create_cache(app.config, stored_data_version)
+    change_notifier = ChangeNotifier(polled_data_version, app.config['EVENTS_POLL_INTERVAL'])
+    request_metrics = RequestMetrics()
+    password_hasher = PasswordHasher(app.config['PASSWORD_HASH_WORKERS'], app.config['PASSWORD_HASH_MAX_PENDING'])
+    recurring_scheduler = RecurringScheduler(
+        storage, app.config['RECURRING_INTERVAL'], app.config['RECURRING_BATCH_SIZE'], recurring_expenses_written
+    )
+    configure_logging(app.config['REQUEST_LOG_LEVEL'])
+    if app.config['QUERY_PLAN_AUDIT']:
+        set_query_auditor(QueryPlanAuditor())
 
 def login_required(f):
     @wraps(f)
@@ -23,14 +100,354 @@ def get_current_user_id():
     """Get current logged in user ID"""
     return session.get('user_id')
 
-def get_month_range(month_date):
-    """Get start and end dates for a given month"""
-    month_start = month_date.replace(day=1).strftime('%Y-%m-%d')
-    if month_date.month == 12:
-        month_end = month_date.replace(year=month_date.year + 1, month=1, day=1) - timedelta(days=1)
-    else:
-        month_end = month_date.replace(month=month_date.month + 1, day=1) - timedelta(days=1)
-    return month_start, month_end.strftime('%Y-%m-%d')
+def get_user_context(user_id):
+    """Name, email and profile of a user.
+
+    Cached outside the user's data version, so pages and ``/api/profile``
+    need no queries. The entry records the profile version it was read at;
+    a session holding a newer ``profile_version`` (set on sign in and on
+    every profile update) reads the user again.
+    """
+    key = f'{result_cache.prefix}:{user_id}:user-context'
+    version = session.get('profile_version', 0)
+    cached = result_cache.get(key)
+    if cached is not None:
+        context = json.loads(cached)
+        if context['version'] >= version:
+            return context
+    row = storage.users().context(user_id)
+    if row is None:
+        return None
+    context = {
+        'version': version,
+        'name': row['name'],
+        'email': row['email'],
+        'profile': {
+            'about': row['about'] or '',
+            'vision_year': row['vision_year'] or '',
+            'vision_month': row['vision_month'] or '',
+            'company': row['company'] or '',
+        },
+    }
+    result_cache.set(key, json.dumps(context).encode(), app.config['USER_CONTEXT_TTL'])
+    return context
+
+def request_data_version(user_id):
+    """The user's result-cache version, looked up once per request and shared
+    by the ETag and the cache key"""
+    if 'data_version' not in g:
+        g.data_version = result_cache.version(user_id)
+    return g.data_version
+
+def cached_response(f):
+    """Serve GET responses from the per-user result cache.
+
+    Entries are keyed by user, path, query string and today's date (the
+    default date window of the dashboard endpoints), and are dropped when
+    the user writes anything through the API. RESULT_CACHE=false bypasses it.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if request.method != 'GET' or not app.config['RESULT_CACHE']:
+            return f(*args, **kwargs)
+        user_id = get_current_user_id()
+        key = result_cache.key(
+            user_id, request.path,
+            sorted(request.args.items(multi=True)), datetime.now().strftime('%Y-%m-%d'),
+            version=request_data_version(user_id)
+        )
+        body = result_cache.get(key)
+        if body is not None:
+            return app.response_class(body, mimetype='application/json')
+        response = f(*args, **kwargs)
+        if isinstance(response, app.response_class) and response.status_code == 200:
+            result_cache.set(key, response.get_data())
+        return response
+    return decorated_function
+
+@app.before_request
+def start_request_timer():
+    """Start timing the request and collecting the SQL it runs"""
+    if app.config['REQUEST_INSTRUMENTATION']:
+        g.request_started = time.perf_counter()
+        g.query_log = QueryLog()
+
+@app.after_request
+def record_request(response):
+    """Report the request's timing in a Server-Timing header, the request log
+    and the /metrics histograms (registered first, so it runs after the other
+    after_request hooks)"""
+    query_log = g.get('query_log')
+    if query_log is None:
+        return response
+    seconds = time.perf_counter() - g.request_started
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    slow_queries = log_request(
+        request.method, route, request.path, response.status_code, seconds,
+        query_log, app.config['SLOW_QUERY_MS'] / 1000
+    )
+    request_metrics.observe(route, request.method, response.status_code, seconds, query_log, slow_queries)
+    response.headers['Server-Timing'] = server_timing(query_log, seconds)
+    return response
+
+@app.before_request
+def start_recurring_scheduler():
+    """Start this worker's recurring-expense thread (once per process)"""
+    if app.config['RECURRING_SCHEDULER']:
+        recurring_scheduler.ensure_started()
+
+@app.after_request
+def invalidate_after_write(response):
+    """Any successful API mutation invalidates the caller's cached results"""
+    if (request.method in ('POST', 'PUT', 'DELETE') and request.path.startswith('/api/')
+            and response.status_code < 400 and 'user_id' in session):
+        user_data_changed(session['user_id'])
+    return response
+
+def current_etag():
+    """ETag for the current API GET: the user's data version plus the request
+    and today's date (the dashboard endpoints default to the current month).
+    The profile is versioned by the session's profile version instead."""
+    user_id = session['user_id']
+    variant = hashlib.sha1(
+        f"{request.full_path}|{datetime.now().strftime('%Y-%m-%d')}".encode()
+    ).hexdigest()[:16]
+    if request.endpoint == 'profile':
+        return f"{user_id}-p{session.get('profile_version', 0)}-{variant}"
+    return f'{user_id}-{request_data_version(user_id)}-{variant}'
+
+@app.before_request
+def conditional_get():
+    """Answer a matching If-None-Match with 304 before touching the database"""
+    if request.method == 'GET' and request.path.startswith('/api/') and 'user_id' in session:
+        g.etag = current_etag()
+        if request.if_none_match.contains(g.etag):
+            response = app.response_class(status=304)
+            response.set_etag(g.etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+
+@app.after_request
+def add_etag(response):
+    """Tag successful API GET responses so clients can revalidate them"""
+    etag = g.get('etag')
+    if etag and response.status_code == 200 and not response.is_streamed:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+STREAM_BATCH_SIZE = 500
+
+# sort argument -> (column, direction); ties are broken by id in the same direction
+SORT_ORDERS = {
+    'date_desc': ('date', 'DESC'),
+    'date_asc': ('date', 'ASC'),
+    'amount_desc': ('amount', 'DESC'),
+    'amount_asc': ('amount', 'ASC'),
+}
+# query argument, column, operator, conversion
+RANGE_FILTERS = (
+    ('date_from', 'date', '>=', str),
+    ('date_to', 'date', '<=', str),
+    ('amount_min', 'amount', '>=', float),
+    ('amount_max', 'amount', '<=', float),
+)
+
+def encode_cursor(row, column='date'):
+    """Opaque keyset cursor pointing just past a (column, id) row"""
+    return base64.urlsafe_b64encode(f"{row[column]}|{row['id']}".encode()).decode()
+
+def decode_cursor(cursor, column='date'):
+    value, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().rsplit('|', 1)
+    return (float(value) if column == 'amount' else value), int(row_id)
+
+def range_filters():
+    """(column, operator, value) conditions for the date and amount range
+    arguments. Raises ValueError when an amount is not a number."""
+    conditions = []
+    for arg, column, operator, convert in RANGE_FILTERS:
+        value = request.args.get(arg)
+        if value:
+            conditions.append((column, operator, convert(value)))
+    return conditions
+
+def in_filters(columns):
+    """``IN`` conditions for columns given one or more times in the query
+    string (e.g. ``?category=Travel&category=Shopping``)"""
+    conditions = []
+    for column in columns:
+        values = [value for value in request.args.getlist(column) if value]
+        if values:
+            conditions.append((column, 'IN', values))
+    return conditions
+
+def list_filters(columns):
+    """Range and multi-value filters together"""
+    return range_filters() + in_filters(columns)
+
+def list_rows(repo_class, conditions, to_dict, extra=None, index=None):
+    """Return the current user's rows of a ledger repository matching
+    ``conditions``, newest first unless ``sort`` says otherwise (see
+    SORT_ORDERS).
+
+    By default the whole result is returned as a JSON array. With ``limit``
+    and/or ``cursor`` a keyset page on (sort column, id) is returned together
+    with the cursor of the next page and any ``extra`` fields; ``index`` is
+    the index SQLite should walk for it. With ``stream=json`` or
+    ``stream=ndjson`` rows are streamed straight from the database cursor.
+    """
+    sort = request.args.get('sort', 'date_desc')
+    if sort not in SORT_ORDERS:
+        return jsonify({'success': False, 'message': f"sort must be one of {', '.join(SORT_ORDERS)}"}), 400
+    column, direction = SORT_ORDERS[sort]
+    
+    stream = request.args.get('stream')
+    if stream:
+        if stream not in ('json', 'ndjson'):
+            return jsonify({'success': False, 'message': 'stream must be json or ndjson'}), 400
+        return stream_rows(repo_class, conditions, column, direction, to_dict, stream)
+    
+    user_id = get_current_user_id()
+    repo = repo_class(storage.session(user_id), user_id)
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    if not limit and not cursor:
+        rows = repo.page(conditions, column, direction)
+        return jsonify([to_dict(row) for row in rows])
+    
+    limit = max(1, min(limit or PAGE_SIZE, MAX_PAGE_SIZE))
+    after = None
+    if cursor:
+        try:
+            after = decode_cursor(cursor, column)
+        except (ValueError, UnicodeDecodeError):
+            return jsonify({'success': False, 'message': 'Invalid cursor'}), 400
+    rows = repo.page(conditions, column, direction, limit + 1, after, index)
+    
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return jsonify(dict(
+        extra or {},
+        items=[to_dict(row) for row in rows],
+        next_cursor=encode_cursor(rows[-1], column) if has_more else None
+    ))
+
+def stream_rows(repo_class, conditions, column, direction, to_dict, fmt):
+    """Stream matching rows as a JSON array or NDJSON without materializing them"""
+    user_id = get_current_user_id()
+    
+    def generate():
+        with storage.connect(user_id) as db:
+            batches = repo_class(db, user_id).batches(conditions, column, direction, STREAM_BATCH_SIZE)
+            first = True
+            if fmt == 'json':
+                yield '['
+            for rows in batches:
+                chunk = []
+                for row in rows:
+                    item = json.dumps(to_dict(row))
+                    if fmt == 'ndjson':
+                        chunk.append(item + '\n')
+                    else:
+                        chunk.append(item if first else ',' + item)
+                    first = False
+                yield ''.join(chunk)
+            if fmt == 'json':
+                yield ']'
+    
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+SEARCH_TERM = re.compile(r'\w+', re.UNICODE)
+MAX_SEARCH_TERMS = 8
+
+def search_terms(text):
+    """The words of a free-text search (None when there is nothing to search)"""
+    return SEARCH_TERM.findall(text or '')[:MAX_SEARCH_TERMS] or None
+
+def search_rows(repo, conditions, to_dict):
+    """Ranked, paginated full-text search over a ledger repository's rows.
+
+    ``q`` is the search text (every word must occur, the last one as a
+    prefix, for search-as-you-type); ``page`` (from 1) and ``limit`` select
+    the page and ``conditions`` filter the matches (see LedgerRepo.search).
+    """
+    terms = search_terms(request.args.get('q'))
+    if terms is None:
+        return jsonify({'success': False, 'message': 'q must contain at least one word'}), 400
+    limit = max(1, min(request.args.get('limit', PAGE_SIZE, type=int), MAX_PAGE_SIZE))
+    page = max(1, request.args.get('page', 1, type=int))
+    rows = repo.search(terms, conditions, limit + 1, (page - 1) * limit)
+    return jsonify({
+        'items': [dict(to_dict(row), score=round(row['score'], 3)) for row in rows[:limit]],
+        'page': page,
+        'has_more': len(rows) > limit
+    })
+
+def last_n_months(count):
+    """Get (year, month) pairs for the last ``count`` calendar months, oldest first"""
+    now = datetime.now()
+    year, month = now.year, now.month
+    months = []
+    for _ in range(count):
+        months.append((year, month))
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return months[::-1]
+
+def running_totals(amounts):
+    """Turn per-day amounts into a rounded cumulative series"""
+    cumulative = []
+    running_total = 0
+    for amount in amounts:
+        running_total += amount
+        cumulative.append(round(running_total, 2))
+    return cumulative
+
+def summary_payload(month_total, today_total, monthly_budget):
+    """Build the dashboard summary-card values"""
+    days_in_month = datetime.now().day
+    avg_daily = month_total / days_in_month if days_in_month > 0 else 0
+    remaining_budget = monthly_budget - month_total
+    return {
+        'month_total': round(month_total, 2),
+        'today_total': round(today_total, 2),
+        'avg_daily': round(avg_daily, 2),
+        'monthly_budget': round(monthly_budget, 2),
+        'remaining_budget': round(remaining_budget, 2),
+        'budget_usage_percent': round((month_total / monthly_budget * 100) if monthly_budget > 0 else 0, 2)
+    }
+
+DEFAULT_COMPARISON_MONTHS = 6
+MAX_COMPARISON_MONTHS = 120
+
+def comparison_window():
+    """Number of months requested via ?months= (default 6)"""
+    months = request.args.get('months', DEFAULT_COMPARISON_MONTHS, type=int)
+    return max(1, min(months, MAX_COMPARISON_MONTHS))
+
+def monthly_comparison_data(db, kind, user_id, window=DEFAULT_COMPARISON_MONTHS):
+    """Get per-month expense or savings totals for the last ``window`` calendar
+    months with one grouped rollup query; months without rows are zero-filled"""
+    months = last_n_months(window)
+    keys = [f'{year:04d}-{month:02d}' for year, month in months]
+    
+    repo = SavingsRepo(db, user_id) if kind == 'savings' else ExpenseRepo(db, user_id)
+    rows = repo.monthly_totals(('month',), keys[0], keys[-1])
+    
+    totals = {row['month']: row['total'] for row in rows}
+    return {
+        'months': [datetime(year, month, 1).strftime('%b %Y') for year, month in months],
+        'amounts': [round(totals.get(key, 0), 2) for key in keys]
+    }
+
+def sorted_totals(totals):
+    """Split a {label: total} dict into labels and rounded amounts, largest first"""
+    ordered = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    return [label for label, _ in ordered], [round(total, 2) for _, total in ordered]
 
 
 @app.route('/signup', methods=['GET', 'POST'])
@@ -48,32 +465,24 @@ def signup():
         if len(password) < 6:
             return jsonify({'success': False, 'message': 'Password must be at least 6 characters'}), 400
         
-        conn = get_db_connection()
-        existing_user = conn.execute(
-            'SELECT id FROM users WHERE email = ?', (email,)
-        ).fetchone()
-        
-        if existing_user:
-            conn.close()
+        users = storage.users()
+        if users.by_email(email):
             return jsonify({'success': False, 'message': 'Email already registered'}), 400
         
-        password_hash = generate_password_hash(password)
         try:
-            cursor = conn.execute(
-                'INSERT INTO users (email, password, name) VALUES (?, ?, ?)',
-                (email, password_hash, name)
-            )
-            conn.commit()
-            user_id = cursor.lastrowid
-            conn.close()
+            password_hash = password_hasher.hash(password)
+        except HasherBusy:
+            return jsonify({'success': False, 'message': 'Server is busy, please try again'}), 503
+        try:
+            user_id = users.create(email, password_hash, name)
             
             session['user_id'] = user_id
             session['user_name'] = name
             session['user_email'] = email
+            session['profile_version'] = time.time_ns()
             
             return jsonify({'success': True, 'message': 'Account created successfully'}), 201
         except Exception as e:
-            conn.close()
             return jsonify({'success': False, 'message': str(e)}), 400
     
     return render_template('signup.html')
@@ -89,16 +498,18 @@ def signin():
         if not email or not password:
             return jsonify({'success': False, 'message': 'Email and password are required'}), 400
         
-        conn = get_db_connection()
-        user = conn.execute(
-            'SELECT id, email, password, name FROM users WHERE email = ?', (email,)
-        ).fetchone()
-        conn.close()
+        user = storage.users().by_email(email)
+        
+        try:
+            valid = user is not None and password_hasher.verify(user['password'], password)
+        except HasherBusy:
+            return jsonify({'success': False, 'message': 'Server is busy, please try again'}), 503
         
-        if user and check_password_hash(user['password'], password):
+        if valid:
             session['user_id'] = user['id']
             session['user_name'] = user['name']
             session['user_email'] = user['email']
+            session['profile_version'] = time.time_ns()
             return jsonify({'success': True, 'message': 'Signed in successfully'}), 200
         else:
             return jsonify({'success': False, 'message': 'Invalid email or password'}), 401
@@ -124,12 +535,22 @@ def dashboard():
     """Main dashboard page"""
     return render_template('dashboard.html')
 
+def expense_to_dict(exp):
+    return {
+        'id': exp['id'],
+        'amount': exp['amount'],
+        'category': exp['category'],
+        'date': exp['date'],
+        'payment_mode': exp['payment_mode'],
+        'notes': exp['notes'],
+        'recurring_id': exp['recurring_id']
+    }
+
 @app.route('/api/expenses', methods=['GET', 'POST'])
 @login_required
 def expenses():
     """Handle expense operations"""
     user_id = get_current_user_id()
-    conn = get_db_connection()
     
     if request.method == 'POST':
         data = request.get_json()
@@ -140,145 +561,310 @@ def expenses():
             payment_mode = data['payment_mode']
             notes = data.get('notes', '')
             
-            conn.execute(
-                'INSERT INTO expenses (user_id, amount, category, date, payment_mode, notes) VALUES (?, ?, ?, ?, ?, ?)',
-                (user_id, amount, category, date, payment_mode, notes)
-            )
-            conn.commit()
-            conn.close()
+            storage.expenses(user_id).add(amount, category, date, payment_mode, notes)
             return jsonify({'success': True, 'message': 'Expense added successfully'}), 201
         except Exception as e:
-            conn.close()
             return jsonify({'success': False, 'message': str(e)}), 400
     
-    date_from = request.args.get('date_from')
-    date_to = request.args.get('date_to')
-    category = request.args.get('category')
-    
-    query = 'SELECT * FROM expenses WHERE user_id = ?'
-    params = [user_id]
-    
-    if date_from:
-        query += ' AND date >= ?'
-        params.append(date_from)
-    if date_to:
-        query += ' AND date <= ?'
-        params.append(date_to)
-    if category:
-        query += ' AND category = ?'
-        params.append(category)
+    try:
+        conditions = list_filters(('category', 'payment_mode'))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'amount_min and amount_max must be numbers'}), 400
+    
+    # Pages carry facet counts, and the number of matching rows picks the plan
+    index, extra = None, None
+    sort = SORT_ORDERS.get(request.args.get('sort', 'date_desc'))
+    if (request.args.get('limit') or request.args.get('cursor')) and not request.args.get('stream') and sort:
+        expenses_repo = storage.expenses(user_id)
+        facets = expense_facets(expenses_repo)
+        limit = max(1, min(request.args.get('limit', PAGE_SIZE, type=int) or PAGE_SIZE, MAX_PAGE_SIZE))
+        amounts = bool(request.args.get('amount_min') or request.args.get('amount_max'))
+        faceted = any(request.args.getlist('category') + request.args.getlist('payment_mode'))
+        index = expenses_repo.page_index(sort[0], facets['total'], limit, amounts, faceted)
+        extra = {'facets': facets}
+    
+    return list_rows(ExpenseRepo, conditions, expense_to_dict, extra, index)
+
+def expense_facets(expenses_repo):
+    """Expense counts per category and per payment mode under the current
+    filters, plus the total.
+
+    Each facet ignores its own filter, so the counts show what selecting
+    another value would give. Both come from one grouped query under the
+    range filters (see ExpenseRepo.facet_counts).
+    """
+    groups = expenses_repo.facet_counts(range_filters())
+    
+    selected_categories = {value for value in request.args.getlist('category') if value}
+    selected_modes = {value for value in request.args.getlist('payment_mode') if value}
+    by_category, by_mode, total = {}, {}, 0
+    for category, mode, count in groups:
+        category_selected = not selected_categories or category in selected_categories
+        mode_selected = not selected_modes or mode in selected_modes
+        if mode_selected:
+            by_category[category] = by_category.get(category, 0) + count
+        if category_selected:
+            by_mode[mode] = by_mode.get(mode, 0) + count
+        if category_selected and mode_selected:
+            total += count
+    return {
+        'category': dict(sorted(by_category.items())),
+        'payment_mode': dict(sorted(by_mode.items())),
+        'total': total
+    }
+
+@app.route('/api/expenses/search')
+@login_required
+@cached_response
+def search_expenses():
+    """Full-text search over expense notes, category and payment mode
+    (?q=, plus the filters of the expense list)"""
+    try:
+        conditions = list_filters(('category', 'payment_mode'))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'amount_min and amount_max must be numbers'}), 400
+    return search_rows(storage.expenses(get_current_user_id()), conditions, expense_to_dict)
+
+IMPORT_CHUNK_SIZE = 500
+IMPORT_MAX_REPORTED_ERRORS = 100
+
+@app.route('/api/expenses/import', methods=['POST'])
+@login_required
+def import_expenses():
+    """Bulk import expenses from a CSV or NDJSON upload.
+
+    The upload is parsed as a stream and valid rows are inserted in chunks of
+    IMPORT_CHUNK_SIZE, each in its own short transaction, so other writers
+    are not locked out for the whole upload. Chunks already committed stay
+    imported if a later row fails; invalid rows, and the rows of a chunk the
+    database rejects, are skipped and reported.
+    """
+    started = time.perf_counter()
+    user_id = get_current_user_id()
+    expenses_repo = storage.expenses(user_id)
     
-    query += ' ORDER BY date DESC, id DESC'
-    expenses = conn.execute(query, params).fetchall()
-    conn.close()
+    upload = request.files.get('file')
+    if upload:
+        stream, fmt = upload.stream, detect_format(upload.mimetype, upload.filename, request.args.get('format'))
+    else:
+        stream, fmt = request.stream, detect_format(request.mimetype, None, request.args.get('format'))
+    if fmt not in ('csv', 'ndjson'):
+        return jsonify({'success': False, 'message': 'format must be csv or ndjson'}), 400
+    
+    categories = storage.users().category_names()
+    inserted = 0
+    failed = 0
+    errors = []
+    batch = []
+    batch_lines = []
+    
+    def reject(line_number, message):
+        nonlocal failed
+        failed += 1
+        if len(errors) < IMPORT_MAX_REPORTED_ERRORS:
+            errors.append({'row': line_number, 'message': message})
+    
+    def flush():
+        nonlocal inserted
+        try:
+            inserted += expenses_repo.add_many(batch)
+        except storage.errors as e:
+            for line_number in batch_lines:
+                reject(line_number, f'Could not be saved: {e}')
+        batch.clear()
+        batch_lines.clear()
     
-    result = [{
-        'id': exp['id'],
-        'amount': exp['amount'],
-        'category': exp['category'],
-        'date': exp['date'],
-        'payment_mode': exp['payment_mode'],
-        'notes': exp['notes']
-    } for exp in expenses]
+    try:
+        for line_number, record in iter_records(stream, fmt):
+            try:
+                batch.append(validate_expense(record, categories))
+            except RowError as e:
+                reject(line_number, str(e))
+                continue
+            batch_lines.append(line_number)
+            if len(batch) >= IMPORT_CHUNK_SIZE:
+                flush()
+        if batch:
+            flush()
+    except (UnicodeDecodeError, csv.Error) as e:
+        return jsonify({
+            'success': False,
+            'message': f'Could not parse upload: {e}',
+            'inserted': inserted,
+            'failed': failed,
+            'errors': errors
+        }), 400
+    finally:
+        # invalidate_after_write only sees successful responses
+        if inserted:
+            user_data_changed(user_id)
     
-    return jsonify(result)
+    return jsonify({
+        'success': True,
+        'message': f'Imported {inserted} expenses',
+        'inserted': inserted,
+        'failed': failed,
+        'errors': errors,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+    })
 
 @app.route('/api/expenses/<int:expense_id>', methods=['PUT', 'DELETE'])
 @login_required
 def expense_detail(expense_id):
     """Update or delete a specific expense"""
-    user_id = get_current_user_id()
-    conn = get_db_connection()
+    expenses_repo = storage.expenses(get_current_user_id())
     
     if request.method == 'PUT':
         data = request.get_json()
         try:
-            conn.execute(
-                '''UPDATE expenses SET amount = ?, category = ?, date = ?, 
-                   payment_mode = ?, notes = ? WHERE id = ? AND user_id = ?''',
-                (data['amount'], data['category'], data['date'], 
-                 data['payment_mode'], data.get('notes', ''), expense_id, user_id)
-            )
-            conn.commit()
-            conn.close()
+            expenses_repo.update(expense_id, data['amount'], data['category'], data['date'],
+                                 data['payment_mode'], data.get('notes', ''))
             return jsonify({'success': True, 'message': 'Expense updated successfully'})
         except Exception as e:
-            conn.close()
             return jsonify({'success': False, 'message': str(e)}), 400
     
     elif request.method == 'DELETE':
         try:
-            conn.execute('DELETE FROM expenses WHERE id = ? AND user_id = ?', (expense_id, user_id))
-            conn.commit()
-            conn.close()
+            expenses_repo.delete(expense_id)
             return jsonify({'success': True, 'message': 'Expense deleted successfully'})
         except Exception as e:
-            conn.close()
+            return jsonify({'success': False, 'message': str(e)}), 400
+
+def recurring_to_dict(rule):
+    return {
+        'id': rule['id'],
+        'amount': rule['amount'],
+        'category': rule['category'],
+        'payment_mode': rule['payment_mode'],
+        'notes': rule['notes'],
+        'frequency': rule['frequency'],
+        'interval': rule['interval'],
+        'start_date': rule['start_date'],
+        'end_date': rule['end_date'],
+        'next_date': rule['next_date'],
+        'active': bool(rule['active'])
+    }
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+
+@app.route('/api/recurring', methods=['GET', 'POST'])
+@login_required
+def recurring_expenses():
+    """List or create recurring expenses.
+
+    Occurrences are written by the background scheduler (or ``flask
+    run-recurring``), never by this request; a rule starting in the past is
+    backfilled by the next pass, which is triggered right away.
+    """
+    recurring_repo = storage.recurring(get_current_user_id())
+    
+    if request.method == 'POST':
+        data = request.get_json()
+        try:
+            amount = float(data['amount'])
+            category = data['category']
+            payment_mode = data['payment_mode']
+            notes = data.get('notes', '')
+            frequency = data.get('frequency', 'monthly')
+            if frequency not in FREQUENCIES:
+                raise ValueError(f"frequency must be one of {', '.join(FREQUENCIES)}")
+            interval = int(data.get('interval', 1))
+            if interval < 1:
+                raise ValueError('interval must be at least 1')
+            start_date = parse_date(data.get('start_date')) or datetime.now().date()
+            end_date = parse_date(data.get('end_date'))
+            if end_date and end_date < start_date:
+                raise ValueError('end_date must not be before start_date')
+            
+            rule_id = recurring_repo.add(amount, category, payment_mode, notes, frequency, interval,
+                                         start_date.isoformat(), end_date.isoformat() if end_date else None)
+            recurring_scheduler.wake()
+            return jsonify({'success': True, 'message': 'Recurring expense created successfully', 'id': rule_id}), 201
+        except Exception as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify([recurring_to_dict(rule) for rule in recurring_repo.list()])
+
+@app.route('/api/recurring/<int:rule_id>', methods=['PUT', 'DELETE'])
+@login_required
+def recurring_expense_detail(rule_id):
+    """Update or delete a recurring expense.
+
+    Changes apply to future occurrences only; expenses already written stay
+    as they are. Resuming a paused rule skips the occurrences it missed.
+    """
+    recurring_repo = storage.recurring(get_current_user_id())
+    
+    if request.method == 'PUT':
+        data = request.get_json()
+        
+        def update_rule(repo):
+            rule = repo.get(rule_id)
+            if rule is None:
+                return False
+            active = bool(data.get('active', rule['active']))
+            end_date = parse_date(data['end_date']) if 'end_date' in data else parse_date(rule['end_date'])
+            next_date = parse_date(rule['next_date'])
+            if active and not rule['active']:
+                anchor, today = parse_date(rule['start_date']), datetime.now().date()
+                while next_date < today:
+                    next_date = next_occurrence(rule['frequency'], rule['interval'], anchor, next_date)
+            if end_date and next_date > end_date:
+                active = False
+            repo.update(rule_id, float(data.get('amount', rule['amount'])), data.get('category', rule['category']),
+                        data.get('payment_mode', rule['payment_mode']), data.get('notes', rule['notes']),
+                        end_date.isoformat() if end_date else None, next_date.isoformat(), active)
+            return True
+        
+        try:
+            found = recurring_repo.transaction(update_rule)
+            if not found:
+                return jsonify({'success': False, 'message': 'Recurring expense not found'}), 404
+            recurring_scheduler.wake()
+            return jsonify({'success': True, 'message': 'Recurring expense updated successfully'})
+        except Exception as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+    
+    elif request.method == 'DELETE':
+        try:
+            recurring_repo.delete(rule_id)
+            return jsonify({'success': True, 'message': 'Recurring expense deleted successfully'})
+        except Exception as e:
             return jsonify({'success': False, 'message': str(e)}), 400
 
 @app.route('/api/dashboard/summary')
 @login_required
+@cached_response
 def dashboard_summary():
     """Get summary statistics for dashboard"""
     user_id = get_current_user_id()
-    conn = get_db_connection()
+    return jsonify(dashboard_summary_data(storage.session(user_id), user_id))
+
+def dashboard_summary_data(db, user_id):
+    """Compute the dashboard summary cards for a user"""
     today = datetime.now().strftime('%Y-%m-%d')
     current_month_start = datetime.now().replace(day=1).strftime('%Y-%m-%d')
     current_month_end = datetime.now().strftime('%Y-%m-%d')
     
-    month_total = conn.execute(
-        'SELECT COALESCE(SUM(amount), 0) FROM expenses WHERE user_id = ? AND date >= ? AND date <= ?',
-        (user_id, current_month_start, current_month_end)
-    ).fetchone()[0]
-    
-    today_total = conn.execute(
-        'SELECT COALESCE(SUM(amount), 0) FROM expenses WHERE user_id = ? AND date = ?',
-        (user_id, today)
-    ).fetchone()[0]
-    
-    days_in_month = datetime.now().day
-    avg_daily = month_total / days_in_month if days_in_month > 0 else 0
-    
-    budget_row = conn.execute(
-        'SELECT amount FROM budget WHERE user_id = ? AND type = ? AND month = ?',
-        (user_id, 'monthly', datetime.now().strftime('%Y-%m'))
-    ).fetchone()
-    monthly_budget = budget_row['amount'] if budget_row else 0
-    remaining_budget = monthly_budget - month_total
-    
-    conn.close()
+    by_date = {row['date']: row['total'] for row in
+               ExpenseRepo(db, user_id).daily_totals(('date',), current_month_start, current_month_end)}
+    monthly_budget = BudgetRepo(db, user_id).amount('monthly', datetime.now().strftime('%Y-%m'))
     
-    return jsonify({
-        'month_total': round(month_total, 2),
-        'today_total': round(today_total, 2),
-        'avg_daily': round(avg_daily, 2),
-        'monthly_budget': round(monthly_budget, 2),
-        'remaining_budget': round(remaining_budget, 2),
-        'budget_usage_percent': round((month_total / monthly_budget * 100) if monthly_budget > 0 else 0, 2)
-    })
+    return summary_payload(sum(by_date.values()), by_date.get(today, 0), monthly_budget)
 
 @app.route('/api/dashboard/charts/category-distribution')
 @login_required
+@cached_response
 def category_distribution():
     """Get category-wise expense distribution for pie chart"""
-    user_id = get_current_user_id()
-    conn = get_db_connection()
     current_month_start = datetime.now().replace(day=1).strftime('%Y-%m-%d')
     current_month_end = datetime.now().strftime('%Y-%m-%d')
     
-    results = conn.execute(
-        '''SELECT category, SUM(amount) as total 
-           FROM expenses 
-           WHERE user_id = ? AND date >= ? AND date <= ?
-           GROUP BY category 
-           ORDER BY total DESC''',
-        (user_id, current_month_start, current_month_end)
-    ).fetchall()
-    
-    conn.close()
-    
-    categories = [row['category'] for row in results]
-    amounts = [round(row['total'], 2) for row in results]
+    results = storage.expenses(get_current_user_id()).daily_totals(
+        ('category',), current_month_start, current_month_end
+    )
+    categories, amounts = sorted_totals({row['category']: row['total'] for row in results})
     
     return jsonify({
         'categories': categories,
@@ -287,23 +873,13 @@ def category_distribution():
 
 @app.route('/api/dashboard/charts/daily-trend')
 @login_required
+@cached_response
 def daily_trend():
     """Get daily expense trend for line chart"""
-    user_id = get_current_user_id()
-    conn = get_db_connection()
     current_month_start = datetime.now().replace(day=1).strftime('%Y-%m-%d')
     current_month_end = datetime.now().strftime('%Y-%m-%d')
     
-    results = conn.execute(
-        '''SELECT date, SUM(amount) as total 
-           FROM expenses 
-           WHERE user_id = ? AND date >= ? AND date <= ?
-           GROUP BY date 
-           ORDER BY date''',
-        (user_id, current_month_start, current_month_end)
-    ).fetchall()
-    
-    conn.close()
+    results = storage.expenses(get_current_user_id()).daily_totals(('date',), current_month_start, current_month_end)
     
     dates = [row['date'] for row in results]
     amounts = [round(row['total'], 2) for row in results]
@@ -315,26 +891,16 @@ def daily_trend():
 
 @app.route('/api/dashboard/charts/category-bar')
 @login_required
+@cached_response
 def category_bar():
     """Get category vs total amount for bar chart"""
-    user_id = get_current_user_id()
-    conn = get_db_connection()
     current_month_start = datetime.now().replace(day=1).strftime('%Y-%m-%d')
     current_month_end = datetime.now().strftime('%Y-%m-%d')
     
-    results = conn.execute(
-        '''SELECT category, SUM(amount) as total 
-           FROM expenses 
-           WHERE user_id = ? AND date >= ? AND date <= ?
-           GROUP BY category 
-           ORDER BY total DESC''',
-        (user_id, current_month_start, current_month_end)
-    ).fetchall()
-    
-    conn.close()
-    
-    categories = [row['category'] for row in results]
-    amounts = [round(row['total'], 2) for row in results]
+    results = storage.expenses(get_current_user_id()).daily_totals(
+        ('category',), current_month_start, current_month_end
+    )
+    categories, amounts = sorted_totals({row['category']: row['total'] for row in results})
     
     return jsonify({
         'categories': categories,
@@ -343,26 +909,16 @@ def category_bar():
 
 @app.route('/api/dashboard/charts/payment-mode')
 @login_required
+@cached_response
 def payment_mode():
     """Get payment mode split for donut chart"""
-    user_id = get_current_user_id()
-    conn = get_db_connection()
     current_month_start = datetime.now().replace(day=1).strftime('%Y-%m-%d')
     current_month_end = datetime.now().strftime('%Y-%m-%d')
     
-    results = conn.execute(
-        '''SELECT payment_mode, SUM(amount) as total 
-           FROM expenses 
-           WHERE user_id = ? AND date >= ? AND date <= ?
-           GROUP BY payment_mode 
-           ORDER BY total DESC''',
-        (user_id, current_month_start, current_month_end)
-    ).fetchall()
-    
-    conn.close()
-    
-    modes = [row['payment_mode'] for row in results]
-    amounts = [round(row['total'], 2) for row in results]
+    results = storage.expenses(get_current_user_id()).daily_totals(
+        ('payment_mode',), current_month_start, current_month_end
+    )
+    modes, amounts = sorted_totals({row['payment_mode']: row['total'] for row in results})
     
     return jsonify({
         'modes': modes,
@@ -371,48 +927,21 @@ def payment_mode():
 
 @app.route('/api/dashboard/charts/monthly-comparison')
 @login_required
+@cached_response
 def monthly_comparison():
     """Get monthly expense comparison"""
     user_id = get_current_user_id()
-    conn = get_db_connection()
-    
-    months = []
-    amounts = []
-    
-    for i in range(5, -1, -1):
-        month_date = datetime.now() - timedelta(days=30*i)
-        month_start, month_end = get_month_range(month_date)
-        
-        result = conn.execute(
-            'SELECT COALESCE(SUM(amount), 0) FROM expenses WHERE user_id = ? AND date >= ? AND date <= ?',
-            (user_id, month_start, month_end)
-        ).fetchone()[0]
-        
-        months.append(month_date.strftime('%b %Y'))
-        amounts.append(round(result, 2))
-    
-    conn.close()
-    return jsonify({'months': months, 'amounts': amounts})
+    return jsonify(monthly_comparison_data(storage.session(user_id), 'expenses', user_id, comparison_window()))
 
 @app.route('/api/dashboard/charts/top-expenses')
 @login_required
+@cached_response
 def top_expenses():
     """Get top 5 highest expenses"""
-    user_id = get_current_user_id()
-    conn = get_db_connection()
     current_month_start = datetime.now().replace(day=1).strftime('%Y-%m-%d')
     current_month_end = datetime.now().strftime('%Y-%m-%d')
     
-    results = conn.execute(
-        '''SELECT category, amount, date 
-           FROM expenses 
-           WHERE user_id = ? AND date >= ? AND date <= ?
-           ORDER BY amount DESC 
-           LIMIT 5''',
-        (user_id, current_month_start, current_month_end)
-    ).fetchall()
-    
-    conn.close()
+    results = storage.expenses(get_current_user_id()).largest(current_month_start, current_month_end, 5)
     
     labels = [f"{row['category']} ({row['date']})" for row in results]
     amounts = [round(row['amount'], 2) for row in results]
@@ -424,41 +953,107 @@ def top_expenses():
 
 @app.route('/api/dashboard/charts/cumulative')
 @login_required
+@cached_response
 def cumulative_spending():
     """Get cumulative spending over the month"""
-    user_id = get_current_user_id()
-    conn = get_db_connection()
     current_month_start = datetime.now().replace(day=1).strftime('%Y-%m-%d')
     current_month_end = datetime.now().strftime('%Y-%m-%d')
     
-    results = conn.execute(
-        '''SELECT date, SUM(amount) as daily_total 
-           FROM expenses 
-           WHERE user_id = ? AND date >= ? AND date <= ?
-           GROUP BY date 
-           ORDER BY date''',
-        (user_id, current_month_start, current_month_end)
-    ).fetchall()
-    
-    conn.close()
+    results = storage.expenses(get_current_user_id()).daily_totals(('date',), current_month_start, current_month_end)
     
     dates = [row['date'] for row in results]
-    daily_amounts = [row['daily_total'] for row in results]
-    
-    cumulative = []
-    running_total = 0
-    for amount in daily_amounts:
-        running_total += amount
-        cumulative.append(round(running_total, 2))
+    cumulative = running_totals(row['total'] for row in results)
     
     return jsonify({'dates': dates, 'cumulative': cumulative})
 
+@app.route('/api/dashboard/bundle')
+@login_required
+@cached_response
+def dashboard_bundle():
+    """Get the summary and every dashboard chart from one pass over the month's rollup rows"""
+    user_id = get_current_user_id()
+    db = storage.session(user_id)
+    expenses_repo = ExpenseRepo(db, user_id)
+    today = datetime.now().strftime('%Y-%m-%d')
+    current_month_start = datetime.now().replace(day=1).strftime('%Y-%m-%d')
+    current_month_end = datetime.now().strftime('%Y-%m-%d')
+    
+    rows = expenses_repo.daily_totals(('date', 'category', 'payment_mode'), current_month_start, current_month_end)
+    top = expenses_repo.largest(current_month_start, current_month_end, 5)
+    monthly_budget = BudgetRepo(db, user_id).amount('monthly', datetime.now().strftime('%Y-%m'))
+    monthly = monthly_comparison_data(db, 'expenses', user_id, comparison_window())
+    
+    month_total = 0
+    today_total = 0
+    by_category = {}
+    by_date = {}
+    by_mode = {}
+    for row in rows:
+        amount = row['total']
+        month_total += amount
+        if row['date'] == today:
+            today_total += amount
+        by_category[row['category']] = by_category.get(row['category'], 0) + amount
+        by_date[row['date']] = by_date.get(row['date'], 0) + amount
+        by_mode[row['payment_mode']] = by_mode.get(row['payment_mode'], 0) + amount
+    
+    categories, category_amounts = sorted_totals(by_category)
+    modes, mode_amounts = sorted_totals(by_mode)
+    dates = list(by_date)
+    
+    return jsonify({
+        'summary': summary_payload(month_total, today_total, monthly_budget),
+        'category_distribution': {'categories': categories, 'amounts': category_amounts},
+        'daily_trend': {'dates': dates, 'amounts': [round(by_date[d], 2) for d in dates]},
+        'payment_mode': {'modes': modes, 'amounts': mode_amounts},
+        'monthly_comparison': monthly,
+        'top_expenses': {
+            'labels': [f"{row['category']} ({row['date']})" for row in top],
+            'amounts': [round(row['amount'], 2) for row in top]
+        },
+        'cumulative': {'dates': dates, 'cumulative': running_totals(by_date[d] for d in dates)}
+    })
+
+def bounded_arg(name, default, maximum):
+    """Integer query parameter clamped to 1..maximum"""
+    return max(1, min(request.args.get(name, default, type=int), maximum))
+
+@app.route('/api/dashboard/analytics/trends')
+@login_required
+@cached_response
+def analytics_trends():
+    """Daily spend with 7- and 30-day rolling averages (?days=, default 90)"""
+    return jsonify(analytics.trends(storage.expenses(get_current_user_id()), datetime.now().date(), bounded_arg('days', 90, 730)))
+
+@app.route('/api/dashboard/analytics/forecast')
+@login_required
+@cached_response
+def analytics_forecast():
+    """Projected month-end spend, overall and per category"""
+    return jsonify(analytics.forecast_month_end(storage.expenses(get_current_user_id()), datetime.now().date()))
+
+@app.route('/api/dashboard/analytics/seasonality')
+@login_required
+@cached_response
+def analytics_seasonality():
+    """Per-category seasonal index of each calendar month (?years=, default 3)"""
+    return jsonify(analytics.category_seasonality(storage.expenses(get_current_user_id()), datetime.now().date(), bounded_arg('years', 3, 10)))
+
+@app.route('/api/dashboard/analytics/outliers')
+@login_required
+@cached_response
+def analytics_outliers():
+    """Unusually large expenses for their category (?days=, default 180; ?limit=, default 20)"""
+    return jsonify(analytics.outlier_expenses(
+        storage.expenses(get_current_user_id()), datetime.now().date(),
+        bounded_arg('days', 180, 730), bounded_arg('limit', 20, 100)
+    ))
+
 @app.route('/api/budget', methods=['GET', 'POST', 'PUT'])
 @login_required
 def budget():
     """Handle budget operations"""
-    user_id = get_current_user_id()
-    conn = get_db_connection()
+    budget_repo = storage.budgets(get_current_user_id())
     
     if request.method == 'POST':
         data = request.get_json()
@@ -468,50 +1063,13 @@ def budget():
             month = data.get('month', datetime.now().strftime('%Y-%m'))
             category = data.get('category', None)
             
-            if category:
-                existing = conn.execute(
-                    'SELECT id FROM budget WHERE user_id = ? AND type = ? AND month = ? AND category = ?',
-                    (user_id, budget_type, month, category)
-                ).fetchone()
-                if existing:
-                    conn.execute(
-                        'UPDATE budget SET amount = ? WHERE user_id = ? AND type = ? AND month = ? AND category = ?',
-                        (amount, user_id, budget_type, month, category)
-                    )
-                else:
-                    conn.execute(
-                        'INSERT INTO budget (user_id, amount, type, month, category) VALUES (?, ?, ?, ?, ?)',
-                        (user_id, amount, budget_type, month, category)
-                    )
-            else:
-                existing = conn.execute(
-                    'SELECT id FROM budget WHERE user_id = ? AND type = ? AND month = ? AND category IS NULL',
-                    (user_id, budget_type, month)
-                ).fetchone()
-                if existing:
-                    conn.execute(
-                        'UPDATE budget SET amount = ? WHERE user_id = ? AND type = ? AND month = ? AND category IS NULL',
-                        (amount, user_id, budget_type, month)
-                    )
-                else:
-                    conn.execute(
-                        'INSERT INTO budget (user_id, amount, type, month, category) VALUES (?, ?, ?, ?, ?)',
-                        (user_id, amount, budget_type, month, None)
-                    )
-            
-            conn.commit()
-            conn.close()
+            budget_repo.set(amount, budget_type, month, category)
             return jsonify({'success': True, 'message': 'Budget set successfully'}), 201
         except Exception as e:
-            conn.close()
             return jsonify({'success': False, 'message': str(e)}), 400
     
     month = request.args.get('month', datetime.now().strftime('%Y-%m'))
-    budgets = conn.execute(
-        'SELECT * FROM budget WHERE user_id = ? AND month = ?',
-        (user_id, month)
-    ).fetchall()
-    conn.close()
+    budgets = budget_repo.for_month(month)
     
     result = [{
         'id': row['id'],
@@ -523,6 +1081,122 @@ def budget():
     
     return jsonify(result)
 
+BUDGET_WARNING_PERCENT = 80
+
+@app.route('/api/budget/status')
+@login_required
+@cached_response
+def budget_status():
+    """Get spending against every budget of a month"""
+    user_id = get_current_user_id()
+    month = request.args.get('month', datetime.now().strftime('%Y-%m'))
+    try:
+        datetime.strptime(month, '%Y-%m')
+    except ValueError:
+        return jsonify({'success': False, 'message': 'month must be YYYY-MM'}), 400
+    
+    return jsonify(budget_status_data(storage.session(user_id), user_id, month))
+
+def budget_status_data(db, user_id, month):
+    """Compute spending against every budget of a YYYY-MM month.
+
+    Budgets and the month's per-category spend (from the rollup) are joined
+    in a single query (see BudgetRepo.status). For each budget the result has utilization, the
+    daily burn rate so far and the projected month-end spend/overspend at
+    that rate.
+    """
+    month_date = datetime.strptime(month, '%Y-%m')
+    days_in_month = calendar.monthrange(month_date.year, month_date.month)[1]
+    current_month = datetime.now().strftime('%Y-%m')
+    if month < current_month:
+        days_elapsed = days_in_month
+    elif month == current_month:
+        days_elapsed = datetime.now().day
+    else:
+        days_elapsed = 0
+    
+    rows = BudgetRepo(db, user_id).status(month)
+    
+    budgets = []
+    for row in rows:
+        amount = row['amount']
+        spent = row['spent']
+        burn_rate = spent / days_elapsed if days_elapsed > 0 else 0
+        projected = burn_rate * days_in_month if days_elapsed > 0 else spent
+        utilization = (spent / amount * 100) if amount > 0 else 0
+        if utilization >= 100:
+            status = 'danger'
+        elif utilization >= BUDGET_WARNING_PERCENT:
+            status = 'warning'
+        else:
+            status = 'success'
+        budgets.append({
+            'id': row['id'],
+            'type': row['type'],
+            'category': row['category'],
+            'amount': round(amount, 2),
+            'spent': round(spent, 2),
+            'remaining': round(amount - spent, 2),
+            'utilization_percent': round(utilization, 2),
+            'burn_rate': round(burn_rate, 2),
+            'projected_spend': round(projected, 2),
+            'projected_overspend': round(max(0, projected - amount), 2),
+            'status': status
+        })
+    
+    return {
+        'month': month,
+        'days_elapsed': days_elapsed,
+        'days_in_month': days_in_month,
+        'monthly': next((b for b in budgets if b['type'] == 'monthly' and b['category'] is None), None),
+        'budgets': budgets
+    }
+
+SSE_KEEPALIVE_SECONDS = 15
+SSE_MAX_STREAM_SECONDS = 300
+
+@app.route('/api/events')
+@login_required
+def events():
+    """Server-sent events stream of the user's summary and budget status.
+
+    An ``update`` event carrying the full state is sent on connect, then only
+    the sections that changed whenever the user's data changes (in this or
+    any other worker). Streams end after SSE_MAX_STREAM_SECONDS and the
+    browser reconnects, so an idle tab never holds a worker forever.
+    """
+    user_id = get_current_user_id()
+    
+    def snapshot():
+        with storage.connect(user_id) as db:
+            return {
+                'summary': dashboard_summary_data(db, user_id),
+                'budget': budget_status_data(db, user_id, datetime.now().strftime('%Y-%m'))
+            }
+    
+    def generate():
+        started = time.monotonic()
+        version = change_notifier.current_version(user_id)
+        last = snapshot()
+        yield f'retry: 3000\nevent: update\ndata: {json.dumps(last)}\n\n'
+        while time.monotonic() - started < SSE_MAX_STREAM_SECONDS:
+            current = change_notifier.wait_for_change(user_id, version, SSE_KEEPALIVE_SECONDS)
+            if current == version:
+                yield ': keepalive\n\n'
+                continue
+            version = current
+            state = snapshot()
+            delta = {key: value for key, value in state.items() if last.get(key) != value}
+            last = state
+            if delta:
+                yield f'event: update\ndata: {json.dumps(delta)}\n\n'
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @app.route('/expense-history')
 @login_required
 def expense_history():
@@ -541,12 +1215,20 @@ def savings_page():
     """Savings dashboard page"""
     return render_template('savings.html')
 
+def saving_to_dict(saving):
+    return {
+        'id': saving['id'],
+        'amount': saving['amount'],
+        'source': saving['source'],
+        'date': saving['date'],
+        'notes': saving['notes']
+    }
+
 @app.route('/api/savings', methods=['GET', 'POST'])
 @login_required
 def savings():
     """Handle savings operations"""
     user_id = get_current_user_id()
-    conn = get_db_connection()
     
     if request.method == 'POST':
         data = request.get_json()
@@ -556,166 +1238,138 @@ def savings():
             date = data['date']
             notes = data.get('notes', '')
             
-            conn.execute(
-                'INSERT INTO savings (user_id, amount, source, date, notes) VALUES (?, ?, ?, ?, ?)',
-                (user_id, amount, source, date, notes)
-            )
-            conn.commit()
-            conn.close()
+            storage.savings(user_id).add(amount, source, date, notes)
             return jsonify({'success': True, 'message': 'Savings added successfully'}), 201
         except Exception as e:
-            conn.close()
             return jsonify({'success': False, 'message': str(e)}), 400
     
-    date_from = request.args.get('date_from')
-    date_to = request.args.get('date_to')
-    source = request.args.get('source')
-    
-    query = 'SELECT * FROM savings WHERE user_id = ?'
-    params = [user_id]
-    
-    if date_from:
-        query += ' AND date >= ?'
-        params.append(date_from)
-    if date_to:
-        query += ' AND date <= ?'
-        params.append(date_to)
-    if source:
-        query += ' AND source = ?'
-        params.append(source)
-    
-    query += ' ORDER BY date DESC, id DESC'
-    savings_list = conn.execute(query, params).fetchall()
-    conn.close()
-    
-    result = [{
-        'id': saving['id'],
-        'amount': saving['amount'],
-        'source': saving['source'],
-        'date': saving['date'],
-        'notes': saving['notes']
-    } for saving in savings_list]
+    try:
+        conditions = list_filters(('source',))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'amount_min and amount_max must be numbers'}), 400
     
-    return jsonify(result)
+    return list_rows(SavingsRepo, conditions, saving_to_dict)
+
+@app.route('/api/savings/search')
+@login_required
+@cached_response
+def search_savings():
+    """Full-text search over savings notes and source
+    (?q=, plus the filters of the savings list)"""
+    try:
+        conditions = list_filters(('source',))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'amount_min and amount_max must be numbers'}), 400
+    return search_rows(storage.savings(get_current_user_id()), conditions, saving_to_dict)
 
 @app.route('/api/savings/<int:saving_id>', methods=['PUT', 'DELETE'])
 @login_required
 def saving_detail(saving_id):
     """Update or delete a specific saving"""
-    user_id = get_current_user_id()
-    conn = get_db_connection()
+    savings_repo = storage.savings(get_current_user_id())
     
     if request.method == 'PUT':
         data = request.get_json()
         try:
-            conn.execute(
-                '''UPDATE savings SET amount = ?, source = ?, date = ?, notes = ? WHERE id = ? AND user_id = ?''',
-                (data['amount'], data['source'], data['date'], data.get('notes', ''), saving_id, user_id)
-            )
-            conn.commit()
-            conn.close()
+            savings_repo.update(saving_id, data['amount'], data['source'], data['date'], data.get('notes', ''))
             return jsonify({'success': True, 'message': 'Savings updated successfully'})
         except Exception as e:
-            conn.close()
             return jsonify({'success': False, 'message': str(e)}), 400
     
     elif request.method == 'DELETE':
         try:
-            conn.execute('DELETE FROM savings WHERE id = ? AND user_id = ?', (saving_id, user_id))
-            conn.commit()
-            conn.close()
+            savings_repo.delete(saving_id)
             return jsonify({'success': True, 'message': 'Savings deleted successfully'})
         except Exception as e:
-            conn.close()
             return jsonify({'success': False, 'message': str(e)}), 400
 
 @app.route('/api/savings/summary')
 @login_required
+@cached_response
 def savings_summary():
     """Get summary statistics for savings dashboard"""
     user_id = get_current_user_id()
-    conn = get_db_connection()
-    current_month_start = datetime.now().replace(day=1).strftime('%Y-%m-%d')
-    current_month_end = datetime.now().strftime('%Y-%m-%d')
-    
-    total_savings = conn.execute(
-        'SELECT COALESCE(SUM(amount), 0) FROM savings WHERE user_id = ?',
-        (user_id,)
-    ).fetchone()[0]
-    
-    month_savings = conn.execute(
-        'SELECT COALESCE(SUM(amount), 0) FROM savings WHERE user_id = ? AND date >= ? AND date <= ?',
-        (user_id, current_month_start, current_month_end)
-    ).fetchone()[0]
-    
-    goal_row = conn.execute(
-        'SELECT goal_name, target_amount FROM savings_goals WHERE user_id = ? ORDER BY created_at DESC LIMIT 1',
-        (user_id,)
-    ).fetchone()
+    return jsonify(savings_summary_data(storage.session(user_id), user_id))
+
+SAVINGS_RATE_DAYS = 90
+MAX_PROJECTION_DAYS = 100 * 365
+
+def savings_rate(savings_repo, today):
+    """Average savings per day over the last SAVINGS_RATE_DAYS days.
+
+    Reads a fixed window of the daily rollup, so the cost does not grow with
+    the length of the savings history.
+    """
+    start = (today - timedelta(days=SAVINGS_RATE_DAYS - 1)).strftime('%Y-%m-%d')
+    recent = savings_repo.daily_totals(('source',), start, today.strftime('%Y-%m-%d'))
+    return sum(row['total'] for row in recent) / SAVINGS_RATE_DAYS
+
+def goal_progress(target_amount, target_date, total_savings, daily_rate, today):
+    """Progress of one goal and the date it is reached at the current savings rate.
+
+    The projected date is None when the recent rate is not positive (or
+    would take more than a century); on_track is None without a target date.
+    """
+    remaining = max(0, target_amount - total_savings)
+    projected = None
+    if remaining == 0:
+        projected = today.strftime('%Y-%m-%d')
+    elif daily_rate > 0 and remaining / daily_rate <= MAX_PROJECTION_DAYS:
+        projected = (today + timedelta(days=math.ceil(remaining / daily_rate))).strftime('%Y-%m-%d')
+    return {
+        'current_amount': round(total_savings, 2),
+        'remaining_amount': round(remaining, 2),
+        'progress_percent': round(min(100, (total_savings / target_amount * 100) if target_amount > 0 else 0), 2),
+        'projected_completion_date': projected,
+        'on_track': (projected is not None and projected <= target_date) if target_date else None,
+    }
+
+def savings_summary_data(db, user_id):
+    """Savings totals and the active (newest) goal's progress"""
+    today = datetime.now().date()
+    savings_repo = SavingsRepo(db, user_id)
+    total_savings = savings_repo.total()
+    month = today.strftime('%Y-%m')
+    month_savings = sum(row['total'] for row in savings_repo.monthly_totals(('source',), month, month))
+    goal_row = GoalRepo(db, user_id).newest()
     
     active_goal_name = goal_row['goal_name'] if goal_row else None
     target_amount = goal_row['target_amount'] if goal_row else 0
+    projected = None
+    if goal_row and target_amount > 0:
+        progress = goal_progress(target_amount, goal_row['target_date'], total_savings,
+                                 savings_rate(savings_repo, today), today)
+        projected = progress['projected_completion_date']
     remaining_to_goal = max(0, target_amount - total_savings) if target_amount > 0 else 0
     
-    conn.close()
-    
-    return jsonify({
+    return {
         'total_savings': round(total_savings, 2),
         'month_savings': round(month_savings, 2),
         'active_goal_name': active_goal_name,
         'target_amount': round(target_amount, 2),
-        'remaining_to_goal': round(remaining_to_goal, 2)
-    })
+        'remaining_to_goal': round(remaining_to_goal, 2),
+        'projected_completion_date': projected
+    }
 
 @app.route('/api/savings/charts/growth')
 @login_required
+@cached_response
 def savings_growth():
     """Get savings growth over time (cumulative)"""
-    user_id = get_current_user_id()
-    conn = get_db_connection()
-    
-    results = conn.execute(
-        '''SELECT date, SUM(amount) as daily_total 
-           FROM savings 
-           WHERE user_id = ?
-           GROUP BY date 
-           ORDER BY date''',
-        (user_id,)
-    ).fetchall()
-    
-    conn.close()
+    results = storage.savings(get_current_user_id()).daily_totals(('date',))
     
     dates = [row['date'] for row in results]
-    daily_amounts = [row['daily_total'] for row in results]
-    
-    cumulative = []
-    running_total = 0
-    for amount in daily_amounts:
-        running_total += amount
-        cumulative.append(round(running_total, 2))
+    cumulative = running_totals(row['total'] for row in results)
     
     return jsonify({'dates': dates, 'cumulative': cumulative})
 
 @app.route('/api/savings/charts/source-distribution')
 @login_required
+@cached_response
 def savings_source_distribution():
     """Get source-wise savings distribution for pie chart"""
-    user_id = get_current_user_id()
-    conn = get_db_connection()
-    
-    results = conn.execute(
-        '''SELECT source, SUM(amount) as total 
-           FROM savings 
-           WHERE user_id = ?
-           GROUP BY source 
-           ORDER BY total DESC''',
-        (user_id,)
-    ).fetchall()
-    
-    conn.close()
-    
-    sources = [row['source'] for row in results]
-    amounts = [round(row['total'], 2) for row in results]
+    results = storage.savings(get_current_user_id()).monthly_totals(('source',))
+    sources, amounts = sorted_totals({row['source']: row['total'] for row in results})
     
     return jsonify({
         'sources': sources,
@@ -724,35 +1378,48 @@ def savings_source_distribution():
 
 @app.route('/api/savings/charts/monthly-comparison')
 @login_required
+@cached_response
 def savings_monthly_comparison():
     """Get monthly savings comparison"""
     user_id = get_current_user_id()
-    conn = get_db_connection()
+    return jsonify(monthly_comparison_data(storage.session(user_id), 'savings', user_id, comparison_window()))
+
+@app.route('/api/savings/bundle')
+@login_required
+@cached_response
+def savings_bundle():
+    """Get the savings summary and the charts from one pass over the user's daily savings rollup"""
+    user_id = get_current_user_id()
+    db = storage.session(user_id)
     
-    months = []
-    amounts = []
+    rows = SavingsRepo(db, user_id).daily_totals(('date', 'source'))
+    summary = savings_summary_data(db, user_id)
+    monthly = monthly_comparison_data(db, 'savings', user_id, comparison_window())
     
-    for i in range(5, -1, -1):
-        month_date = datetime.now() - timedelta(days=30*i)
-        month_start, month_end = get_month_range(month_date)
-        
-        result = conn.execute(
-            'SELECT COALESCE(SUM(amount), 0) FROM savings WHERE user_id = ? AND date >= ? AND date <= ?',
-            (user_id, month_start, month_end)
-        ).fetchone()[0]
-        
-        months.append(month_date.strftime('%b %Y'))
-        amounts.append(round(result, 2))
+    by_date = {}
+    by_source = {}
+    for row in rows:
+        amount = row['total']
+        by_date[row['date']] = by_date.get(row['date'], 0) + amount
+        by_source[row['source']] = by_source.get(row['source'], 0) + amount
+    
+    sources, source_amounts = sorted_totals(by_source)
+    dates = list(by_date)
     
-    conn.close()
-    return jsonify({'months': months, 'amounts': amounts})
+    return jsonify({
+        'summary': summary,
+        'growth': {'dates': dates, 'cumulative': running_totals(by_date[d] for d in dates)},
+        'source_distribution': {'sources': sources, 'amounts': source_amounts},
+        'monthly_comparison': monthly
+    })
 
 @app.route('/api/savings/goals', methods=['GET', 'POST'])
 @login_required
+@cached_response
 def savings_goals():
     """Handle savings goals operations"""
     user_id = get_current_user_id()
-    conn = get_db_connection()
+    goal_repo = storage.goals(user_id)
     
     if request.method == 'POST':
         data = request.get_json()
@@ -761,36 +1428,25 @@ def savings_goals():
             target_amount = float(data['target_amount'])
             target_date = data.get('target_date', None)
             
-            conn.execute(
-                'INSERT INTO savings_goals (user_id, goal_name, target_amount, target_date) VALUES (?, ?, ?, ?)',
-                (user_id, goal_name, target_amount, target_date)
-            )
-            conn.commit()
-            conn.close()
+            goal_repo.add(goal_name, target_amount, target_date)
             return jsonify({'success': True, 'message': 'Savings goal created successfully'}), 201
         except Exception as e:
-            conn.close()
             return jsonify({'success': False, 'message': str(e)}), 400
     
-    goals = conn.execute(
-        'SELECT * FROM savings_goals WHERE user_id = ? ORDER BY created_at DESC',
-        (user_id,)
-    ).fetchall()
+    goals = goal_repo.list()
     
-    total_savings = conn.execute(
-        'SELECT COALESCE(SUM(amount), 0) FROM savings WHERE user_id = ?',
-        (user_id,)
-    ).fetchone()[0]
-    conn.close()
+    savings_repo = storage.savings(user_id)
+    today = datetime.now().date()
+    total_savings = savings_repo.total()
+    daily_rate = savings_rate(savings_repo, today) if goals else 0
     
-    result = [{
+    result = [dict({
         'id': goal['id'],
         'goal_name': goal['goal_name'],
         'target_amount': goal['target_amount'],
         'target_date': goal['target_date'],
-        'current_amount': round(total_savings, 2),
-        'progress_percent': round(min(100, (total_savings / goal['target_amount'] * 100) if goal['target_amount'] > 0 else 0), 2)
-    } for goal in goals]
+    }, **goal_progress(goal['target_amount'], goal['target_date'], total_savings, daily_rate, today))
+        for goal in goals]
     
     return jsonify(result)
 
@@ -798,18 +1454,50 @@ def savings_goals():
 @login_required
 def savings_goal_detail(goal_id):
     """Delete a specific savings goal"""
-    user_id = get_current_user_id()
-    conn = get_db_connection()
-    
     try:
-        conn.execute('DELETE FROM savings_goals WHERE id = ? AND user_id = ?', (goal_id, user_id))
-        conn.commit()
-        conn.close()
+        storage.goals(get_current_user_id()).delete(goal_id)
         return jsonify({'success': True, 'message': 'Savings goal deleted successfully'})
     except Exception as e:
-        conn.close()
         return jsonify({'success': False, 'message': str(e)}), 400
 
+@app.route('/api/export/<dataset>')
+@login_required
+def export_data(dataset):
+    """Stream a user's full expenses, savings or budget ledger as CSV or Parquet.
+
+    Rows are read from a database cursor in batches and written to the
+    response as they are produced, so memory stays flat however many rows
+    are exported. Accepts date_from, date_to and category (the source, for
+    savings) filters.
+    """
+    if dataset not in DATASETS:
+        return jsonify({'success': False, 'message': f'Unknown dataset: {dataset}'}), 404
+    fmt = request.args.get('format', 'csv')
+    if fmt not in FORMATS:
+        return jsonify({'success': False, 'message': 'format must be csv or parquet'}), 400
+    if fmt == 'parquet' and not parquet_available():
+        return jsonify({'success': False, 'message': 'Parquet export needs the pyarrow package'}), 501
+    
+    user_id = get_current_user_id()
+    query, params = build_query(
+        dataset, user_id,
+        request.args.get('date_from'), request.args.get('date_to'), request.args.get('category')
+    )
+    columns = DATASETS[dataset][1]
+    chunks = csv_chunks if fmt == 'csv' else parquet_chunks
+    
+    def generate():
+        with storage.connect(user_id) as db:
+            yield from chunks(db.stream(query, params, EXPORT_BATCH_SIZE), columns)
+    
+    mimetype, extension = FORMATS[fmt]
+    filename = f"{dataset}-{datetime.now().strftime('%Y%m%d')}.{extension}"
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
 @app.route('/profile')
 @login_required
 def profile_page():
@@ -821,7 +1509,6 @@ def profile_page():
 def profile():
     """Handle profile operations"""
     user_id = get_current_user_id()
-    conn = get_db_connection()
     
     if request.method == 'PUT':
         data = request.get_json()
@@ -831,56 +1518,60 @@ def profile():
             vision_month = data.get('vision_month', '')
             company = data.get('company', '')
             
-            # Check if profile exists
-            existing = conn.execute(
-                'SELECT id FROM user_profile WHERE user_id = ?', (user_id,)
-            ).fetchone()
-            
-            if existing:
-                # Update existing profile
-                conn.execute(
-                    '''UPDATE user_profile SET about = ?, vision_year = ?, vision_month = ?, 
-                       company = ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?''',
-                    (about, vision_year, vision_month, company, user_id)
-                )
-            else:
-                # Create new profile
-                conn.execute(
-                    '''INSERT INTO user_profile (user_id, about, vision_year, vision_month, company) 
-                       VALUES (?, ?, ?, ?, ?)''',
-                    (user_id, about, vision_year, vision_month, company)
-                )
-            
-            conn.commit()
-            conn.close()
+            storage.users().save_profile(user_id, about, vision_year, vision_month, company)
+            session['profile_version'] = time.time_ns()
             return jsonify({'success': True, 'message': 'Profile updated successfully'})
         except Exception as e:
-            conn.close()
             return jsonify({'success': False, 'message': str(e)}), 400
     
     # GET request
-    profile_data = conn.execute(
-        'SELECT about, vision_year, vision_month, company FROM user_profile WHERE user_id = ?',
-        (user_id,)
-    ).fetchone()
-    conn.close()
-    
-    if profile_data:
-        result = {
-            'about': profile_data['about'] or '',
-            'vision_year': profile_data['vision_year'] or '',
-            'vision_month': profile_data['vision_month'] or '',
-            'company': profile_data['company'] or ''
-        }
+    context = get_user_context(user_id)
+    if context is None:
+        return jsonify({'success': False, 'message': 'User not found'}), 404
+    return jsonify(dict(context['profile'], name=context['name'], email=context['email']))
+
+@app.route('/metrics')
+def metrics():
+    """Per-route request and SQL metrics in Prometheus text format"""
+    token = app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return jsonify({'success': False, 'message': 'Unauthorized'}), 401
+    return app.response_class(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.cli.command('rebuild-rollups')
+def rebuild_rollups_command():
+    """Recompute the expense/savings rollup tables from the raw rows"""
+    storage.rebuild_rollups()
+    print('Rollup tables rebuilt.')
+
+@app.cli.command('run-recurring')
+def run_recurring_command():
+    """Write every due recurring expense now (e.g. from cron)"""
+    result = recurring_scheduler.run_once()
+    print(f"Wrote {result['occurrences']} occurrences of {result['rules']} recurring expenses.")
+
+@app.cli.command('rebalance-shards')
+@click.option('--shards', type=int, help='Move every user to shard user_id % SHARDS')
+@click.option('--user', 'user_id', type=int, help='Move only this user (with --to)')
+@click.option('--to', 'target', type=int, help='Target shard for --user')
+def rebalance_shards_command(shards, user_id, target):
+    """Move users between shard files (run with the app stopped)"""
+    if not isinstance(storage, SQLiteStorage):
+        raise click.UsageError('Shards are files of the SQLite backend; STORAGE_BACKEND is not sqlite')
+    if user_id is not None and target is not None:
+        rows = move_user(user_id, target)
+        print(f'Moved user {user_id} to shard {target} ({rows} rows).')
+    elif shards:
+        moved = rebalance(shards)
+        print(f'Moved {moved} users. Set DB_SHARDS={shards} before starting the app.')
     else:
-        result = {
-            'about': '',
-            'vision_year': '',
-            'vision_month': '',
-            'company': ''
-        }
-    
-    return jsonify(result)
+        raise click.UsageError('Pass --shards N, or --user ID --to SHARD')
+
+@app.cli.command('rebuild-search-index')
+def rebuild_search_index_command():
+    """Re-index expense and savings notes for full-text search"""
+    storage.rebuild_search_index()
+    print('Search index rebuilt.')
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,161 @@
+"""ASGI entry point for production serving.
+
+Run with the bundled launcher configuration:
+
+    gunicorn -c gunicorn.conf.py asgi:app
+
+or directly with uvicorn:
+
+    uvicorn asgi:app --port 5000
+"""
+import asyncio
+import contextvars
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app as flask_app
+
+# Request bodies larger than this are spooled to disk instead of memory
+MAX_MEMORY_BODY = 1024 * 1024
+
+class WsgiAdapter:
+    """Thin ASGI-to-WSGI bridge for the Flask app.
+
+    Each request runs on a bounded thread pool, so the event loop never
+    blocks on sqlite3 and at most ``max_threads`` requests use the database
+    at once; the rest wait on the loop without holding a thread. Bodies of
+    streamed responses (server-sent events, exports) are iterated on a
+    separate pool so long-lived streams cannot starve ordinary requests.
+    """
+
+    def __init__(self, wsgi_app, max_threads, stream_threads):
+        self.wsgi_app = wsgi_app
+        self.executor = ThreadPoolExecutor(max_threads, thread_name_prefix='asgi')
+        self.stream_executor = ThreadPoolExecutor(stream_threads, thread_name_prefix='asgi-stream')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise NotImplementedError(f"Unsupported ASGI scope type: {scope['type']}")
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                self.stream_executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        body = tempfile.SpooledTemporaryFile(max_size=MAX_MEMORY_BODY)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+        body.seek(0)
+        return body
+
+    def _environ(self, scope, body):
+        server = scope.get('server') or ('localhost', 80)
+        client = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope['query_string'].decode('latin-1'),
+            'SERVER_NAME': server[0],
+            'SERVER_PORT': str(server[1]),
+            'REMOTE_ADDR': client[0],
+            'REMOTE_PORT': str(client[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': body,
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': True,
+            'wsgi.run_once': False,
+        }
+        for name, value in scope.get('headers', []):
+            name = name.decode('latin-1')
+            value = value.decode('latin-1')
+            if name == 'content-type':
+                environ['CONTENT_TYPE'] = value
+            elif name == 'content-length':
+                environ['CONTENT_LENGTH'] = value
+            else:
+                key = 'HTTP_' + name.upper().replace('-', '_')
+                environ[key] = f'{environ[key]},{value}' if key in environ else value
+        return environ
+
+    async def _http(self, scope, receive, send):
+        body = await self._read_body(receive)
+        if body is None:
+            return
+        environ = self._environ(scope, body)
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+            return lambda data: None
+
+        def run():
+            result = self.wsgi_app(environ, start_response)
+            iterator = iter(result)
+            # Responses with a Content-Length are already materialized and are
+            # drained here; anything else is streamed chunk by chunk below
+            if any(name.lower() == 'content-length' for name, _ in started['headers']):
+                return result, iter(()), b''.join(iterator)
+            return result, iterator, next(iterator, b'')
+
+        # Every step of one response runs in the same context, whichever pool
+        # thread picks it up, so stream_with_context generators keep their
+        # request context between chunks
+        context = contextvars.copy_context()
+        loop = asyncio.get_running_loop()
+        try:
+            result, iterator, chunk = await loop.run_in_executor(self.executor, context.run, run)
+        finally:
+            body.close()
+
+        disconnected = asyncio.Event()
+
+        async def watch_disconnect():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': started['status'],
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in started['headers']],
+            })
+            while chunk is not None and not disconnected.is_set():
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                chunk = await loop.run_in_executor(self.stream_executor, context.run, next, iterator, None)
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        finally:
+            watcher.cancel()
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(self.stream_executor, context.run, result.close)
+
+app = WsgiAdapter(
+    flask_app,
+    max_threads=int(os.environ.get('ASGI_THREADS', flask_app.config['DB_POOL_SIZE'])),
+    stream_threads=int(os.environ.get('ASGI_STREAM_THREADS', 64)),
+)
@@ -0,0 +1,356 @@
+"""Latency and throughput benchmarks for the API routes.
+
+Seeds an expenses.db with synthetic users, expenses and savings, then
+drives every read endpoint from concurrent sessions and reports p50/p95/p99
+latency and requests per second:
+
+    python benchmark.py --expenses 100000 --users 20
+    python benchmark.py --targets werkzeug asgi --concurrency 32
+    python benchmark.py --save-baseline benchmark_baseline.json
+    python benchmark.py --compare benchmark_baseline.json
+
+The ``client`` target runs the app in-process through the Flask test client;
+``werkzeug`` and ``asgi`` start the development server and the gunicorn
+ASGI launcher against the same database. Run with ``--compare`` to exit
+non-zero when an endpoint got slower than the baseline by more than
+``--tolerance``.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+PASSWORD = 'benchmark'
+SEED_BATCH_SIZE = 10000
+PAYMENT_MODES = ('Cash', 'Card', 'UPI', 'Net Banking')
+SAVING_SOURCES = ('Salary', 'Freelance', 'Investment', 'Gift')
+NOTE_WORDS = (
+    'coffee', 'lunch', 'dinner', 'groceries', 'taxi', 'metro', 'fuel', 'rent', 'electricity',
+    'internet', 'movie', 'concert', 'pharmacy', 'doctor', 'books', 'course', 'flight', 'hotel',
+    'haircut', 'gift', 'birthday', 'office', 'weekend', 'family', 'friends', 'monthly', 'refund',
+    'subscription', 'market', 'bakery', 'snacks', 'repair', 'insurance', 'bonus', 'dividend',
+)
+
+ENDPOINTS = [
+    '/api/expenses?limit=50',
+    '/api/expenses?limit=50&amount_min=100&amount_max=200',
+    '/api/expenses?limit=50&category=Travel&category=Shopping&payment_mode=Cash&sort=amount_desc',
+    '/api/expenses/search?q=coffee&limit=50',
+    '/api/expenses/search?q=family+dinn&limit=50',
+    '/api/dashboard/summary',
+    '/api/dashboard/charts/category-distribution',
+    '/api/dashboard/charts/daily-trend',
+    '/api/dashboard/charts/category-bar',
+    '/api/dashboard/charts/payment-mode',
+    '/api/dashboard/charts/monthly-comparison',
+    '/api/dashboard/charts/top-expenses',
+    '/api/dashboard/charts/cumulative',
+    '/api/dashboard/bundle',
+    '/api/dashboard/analytics/trends',
+    '/api/dashboard/analytics/forecast',
+    '/api/dashboard/analytics/seasonality',
+    '/api/dashboard/analytics/outliers',
+    '/api/budget',
+    '/api/budget/status',
+    '/api/savings?limit=50',
+    '/api/savings/search?q=bonus&limit=50',
+    '/api/savings/summary',
+    '/api/savings/charts/growth',
+    '/api/savings/charts/source-distribution',
+    '/api/savings/charts/monthly-comparison',
+    '/api/savings/bundle',
+    '/api/savings/goals',
+    '/api/profile',
+]
+
+SERVERS = {
+    'werkzeug': [sys.executable, os.path.join(ROOT, 'app.py')],
+    'asgi': [
+        sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+        '--access-logfile', '/dev/null', 'asgi:app',
+    ],
+}
+
+def seed_database(users, expenses, savings, days=730, seed=0):
+    """Fill ./expenses.db with ``users`` users sharing the given row counts"""
+    from werkzeug.security import generate_password_hash
+    import database
+
+    database.init_db()
+    rng = random.Random(seed)
+    conn = sqlite3.connect(database.DATABASE)
+    database.configure_connection(conn)
+    categories = [row[0] for row in conn.execute('SELECT name FROM categories')]
+    password_hash = generate_password_hash(PASSWORD)
+    today = date.today()
+    month = today.strftime('%Y-%m')
+
+    with conn:
+        conn.executemany(
+            'INSERT INTO users (email, password, name) VALUES (?, ?, ?)',
+            [(f'bench{i}@example.com', password_hash, f'Bench {i}') for i in range(users)],
+        )
+    user_ids = [row[0] for row in conn.execute("SELECT id FROM users WHERE email LIKE 'bench%@example.com'")]
+
+    def random_date():
+        return (today - timedelta(days=rng.randrange(days))).isoformat()
+
+    def random_notes():
+        return ' '.join(rng.sample(NOTE_WORDS, rng.randrange(4)))
+
+    def insert(sql, total, make_row):
+        for start in range(0, total, SEED_BATCH_SIZE):
+            rows = [make_row(user_ids[i % len(user_ids)]) for i in range(start, min(start + SEED_BATCH_SIZE, total))]
+            with conn:
+                conn.executemany(sql, rows)
+
+    insert(
+        'INSERT INTO expenses (user_id, amount, category, date, payment_mode, notes) VALUES (?, ?, ?, ?, ?, ?)',
+        expenses,
+        lambda user_id: (user_id, round(rng.uniform(1, 500), 2), rng.choice(categories),
+                         random_date(), rng.choice(PAYMENT_MODES), random_notes()),
+    )
+    insert(
+        'INSERT INTO savings (user_id, amount, source, date, notes) VALUES (?, ?, ?, ?, ?)',
+        savings,
+        lambda user_id: (user_id, round(rng.uniform(10, 2000), 2), rng.choice(SAVING_SOURCES), random_date(), random_notes()),
+    )
+    with conn:
+        for user_id in user_ids:
+            conn.execute(
+                "INSERT INTO budget (user_id, amount, type, month, category) VALUES (?, ?, 'monthly', ?, NULL)",
+                (user_id, 50000, month),
+            )
+            conn.executemany(
+                "INSERT INTO budget (user_id, amount, type, month, category) VALUES (?, ?, 'category', ?, ?)",
+                [(user_id, 5000, month, category) for category in categories[:3]],
+            )
+            conn.execute(
+                'INSERT INTO savings_goals (user_id, goal_name, target_amount, target_date) VALUES (?, ?, ?, ?)',
+                (user_id, 'Emergency fund', 100000, (today + timedelta(days=365)).isoformat()),
+            )
+    database.analyze(conn)
+    conn.close()
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class ClientSession:
+    """One signed-in user talking to the app through the Flask test client"""
+
+    def __init__(self, flask_app, user_id):
+        self.client = flask_app.test_client()
+        with self.client.session_transaction() as session:
+            session['user_id'] = user_id
+            session['user_name'] = 'Bench'
+
+    def get(self, path):
+        return self.client.get(path).status_code
+
+    def close(self):
+        pass
+
+class HttpSession:
+    """One signed-in user on a keep-alive connection to a local server"""
+
+    def __init__(self, port, email):
+        self.port = port
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        body = json.dumps({'email': email, 'password': PASSWORD})
+        self.conn.request('POST', '/signin', body=body, headers={'Content-Type': 'application/json'})
+        response = self.conn.getresponse()
+        response.read()
+        self.cookie = response.getheader('Set-Cookie').split(';', 1)[0]
+
+    def get(self, path):
+        try:
+            self.conn.request('GET', path, headers={'Cookie': self.cookie})
+            response = self.conn.getresponse()
+            response.read()
+            return response.status
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            return 0
+
+    def close(self):
+        self.conn.close()
+
+def start_server(name, port):
+    env = dict(os.environ, PORT=str(port), FLASK_DEBUG='false', PYTHONPATH=ROOT)
+    process = subprocess.Popen(SERVERS[name], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/signin')
+            conn.getresponse().read()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{name} server did not start on port {port}')
+
+def run_endpoint(sessions, path, duration, warmup=3):
+    """Drive ``path`` from every session at once for ``duration`` seconds"""
+    for session in sessions:
+        for _ in range(warmup):
+            session.get(path)
+    latencies = [[] for _ in sessions]
+    errors = [0] * len(sessions)
+    deadline = time.monotonic() + duration
+
+    def worker(index, session):
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            status = session.get(path)
+            if status == 200:
+                latencies[index].append(time.perf_counter() - started)
+            else:
+                errors[index] += 1
+
+    threads = [threading.Thread(target=worker, args=(i, s)) for i, s in enumerate(sessions)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    ordered = sorted(latency for per_session in latencies for latency in per_session)
+    return {
+        'requests': len(ordered),
+        'errors': sum(errors),
+        'rps': round(len(ordered) / elapsed, 1),
+        'p50_ms': round(1000 * percentile(ordered, 0.50), 2),
+        'p95_ms': round(1000 * percentile(ordered, 0.95), 2),
+        'p99_ms': round(1000 * percentile(ordered, 0.99), 2),
+    }
+
+def run_target(target, user_ids, args):
+    process = None
+    if target == 'client':
+        from app import app as flask_app
+        sessions = [ClientSession(flask_app, user_ids[i % len(user_ids)]) for i in range(args.concurrency)]
+    else:
+        process = start_server(target, args.port)
+        sessions = [
+            HttpSession(args.port, f'bench{i % len(user_ids)}@example.com')
+            for i in range(args.concurrency)
+        ]
+    results = {}
+    try:
+        for path in args.endpoints:
+            results[path] = result = run_endpoint(sessions, path, args.duration)
+            print(f"{target:>8} {path:<46} {result['rps']:>8} req/s  p50 {result['p50_ms']:>7} ms  "
+                  f"p95 {result['p95_ms']:>7} ms  p99 {result['p99_ms']:>7} ms  {result['errors']} errors")
+    finally:
+        for session in sessions:
+            session.close()
+        if process:
+            process.terminate()
+            process.wait()
+    return results
+
+def compare(report, baseline, tolerance):
+    """Return a description of every endpoint that regressed against the baseline"""
+    regressions = []
+    for target, endpoints in report['results'].items():
+        for path, result in endpoints.items():
+            before = baseline.get('results', {}).get(target, {}).get(path)
+            if not before:
+                continue
+            if result['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{target} {path}: p95 {before['p95_ms']} -> {result['p95_ms']} ms")
+            if result['rps'] < before['rps'] * (1 - tolerance):
+                regressions.append(f"{target} {path}: {before['rps']} -> {result['rps']} req/s")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the expense tracker API routes')
+    parser.add_argument('--targets', nargs='+', default=['client'], choices=['client', *SERVERS])
+    parser.add_argument('--endpoints', nargs='+', default=ENDPOINTS)
+    parser.add_argument('--users', type=int, default=10)
+    parser.add_argument('--expenses', type=int, default=10000, help='total expense rows across all users')
+    parser.add_argument('--savings', type=int, default=2000, help='total savings rows across all users')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5, help='seconds per endpoint')
+    parser.add_argument('--workdir', help='directory holding expenses.db; reused if it already exists')
+    parser.add_argument('--no-cache', action='store_true', help='disable the response cache')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--save-baseline', metavar='PATH')
+    parser.add_argument('--compare', metavar='PATH')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    save_path = args.save_baseline and os.path.abspath(args.save_baseline)
+    baseline_path = args.compare and os.path.abspath(args.compare)
+    workdir = os.path.abspath(args.workdir) if args.workdir else tempfile.mkdtemp(prefix='bench-')
+    os.makedirs(workdir, exist_ok=True)
+    # The app opens expenses.db relative to the working directory, both
+    # in-process and in the servers started below
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    if args.no_cache:
+        os.environ['RESULT_CACHE'] = 'false'
+    # Keep the per-request log lines out of the report; slow queries still show
+    os.environ.setdefault('REQUEST_LOG_LEVEL', 'WARNING')
+
+    try:
+        if not os.path.exists('expenses.db'):
+            started = time.perf_counter()
+            seed_database(args.users, args.expenses, args.savings)
+            print(f'Seeded {args.expenses} expenses and {args.savings} savings for {args.users} users '
+                  f'in {time.perf_counter() - started:.1f}s')
+        conn = sqlite3.connect('expenses.db')
+        user_ids = [row[0] for row in conn.execute("SELECT id FROM users WHERE email LIKE 'bench%@example.com' ORDER BY id")]
+        counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] for table in ('expenses', 'savings')}
+        conn.close()
+        if not user_ids:
+            parser.error(f'{workdir}/expenses.db has no benchmark users; point --workdir at an empty directory')
+
+        report = {
+            'meta': {
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'users': len(user_ids),
+                'expenses': counts['expenses'],
+                'savings': counts['savings'],
+                'concurrency': args.concurrency,
+                'duration': args.duration,
+                'cache': not args.no_cache,
+            },
+            'results': {target: run_target(target, user_ids, args) for target in args.targets},
+        }
+    finally:
+        if not args.workdir:
+            os.chdir(ROOT)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if save_path:
+        with open(save_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Baseline saved to {save_path}')
+    if baseline_path:
+        with open(baseline_path) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print('No regressions against the baseline.')
+
+if __name__ == '__main__':
+    main()
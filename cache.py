@@ -0,0 +1,165 @@
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+
+class LocalBackend:
+    """Thread-safe in-process LRU store with per-entry TTL and a memory cap.
+
+    Values are bytes; the memory cap counts key and value lengths.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._counters = {}
+        # Counters start from the boot time rather than 0 so values handed out
+        # before a restart (e.g. in ETags) are never reused afterwards.
+        self._counter_base = time.time_ns() // 1000
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        size = len(key) + len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(key) + len(value)
+
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.get(key, self._counter_base)
+
+    def incr(self, key):
+        # Counters live outside the LRU so they are never evicted; an evicted
+        # counter would reset and could make stale entries reachable again.
+        with self._lock:
+            self._counters[key] = self._counters.get(key, self._counter_base) + 1
+            return self._counters[key]
+
+    def clear(self):
+        # Counters are kept so data versions never go backwards
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+class RedisBackend:
+    """Shared store so several workers see the same entries and invalidations.
+
+    Needs the optional ``redis`` package.
+    """
+
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('CACHE_REDIS_URL is set but the redis package is not installed') from e
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value, ttl):
+        self._client.set(key, value, ex=max(1, int(ttl)))
+
+    def _init_counter(self, key):
+        # Seed missing counters from the clock (see LocalBackend) so a flushed
+        # Redis never repeats a previously issued value
+        self._client.set(key, time.time_ns() // 1000, nx=True)
+
+    def get_counter(self, key):
+        value = self._client.get(key)
+        if value is None:
+            self._init_counter(key)
+            value = self._client.get(key)
+        return int(value)
+
+    def incr(self, key):
+        self._init_counter(key)
+        return self._client.incr(key)
+
+    def clear(self):
+        self._client.flushdb()
+
+class ResultCache:
+    """Per-user cache of serialized responses.
+
+    Every key embeds the user's version, so invalidating a user is a single
+    counter bump: their old entries become unreachable and age out of the
+    LRU, while other users' entries are untouched. The version combines the
+    cache's own generation number, bumped by invalidate_user(), with the
+    user's stored data version from ``data_version(user_id)`` if given, which
+    also changes on writes made by other processes. It doubles as the
+    user's data version for ETags.
+    """
+
+    def __init__(self, backend, ttl=DEFAULT_TTL, prefix='rc', data_version=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.data_version = data_version
+
+    def generation(self, user_id):
+        return self.backend.get_counter(f'{self.prefix}:gen:{user_id}')
+
+    def version(self, user_id):
+        generation = self.generation(user_id)
+        if self.data_version is None:
+            return str(generation)
+        return f'{generation}.{self.data_version(user_id)}'
+
+    def key(self, user_id, *parts, version=None):
+        """Cache key under the user's current version, or ``version`` if the
+        caller already looked it up"""
+        if version is None:
+            version = self.version(user_id)
+        return f'{self.prefix}:{user_id}:{version}:' + '|'.join(str(p) for p in parts)
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, self.ttl if ttl is None else ttl)
+
+    def invalidate_user(self, user_id):
+        """Drop every cached entry for one user"""
+        return self.backend.incr(f'{self.prefix}:gen:{user_id}')
+
+    def clear(self):
+        self.backend.clear()
+
+def create_cache(config, data_version=None):
+    """Build the result cache from app config (CACHE_* keys)"""
+    if config.get('CACHE_REDIS_URL'):
+        backend = RedisBackend(config['CACHE_REDIS_URL'])
+    else:
+        backend = LocalBackend(
+            max_entries=int(config.get('CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)),
+            max_bytes=int(config.get('CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+        )
+    return ResultCache(backend, ttl=int(config.get('CACHE_TTL', DEFAULT_TTL)), data_version=data_version)
@@ -1,16 +1,833 @@
+import os
+import queue
+import random
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_app_context
+
+from instrumentation import current_query_log
 
 DATABASE = 'expenses.db'
+DEFAULT_POOL_SIZE = 8
+
+# journal_mode is persistent in the database file and is set once by init_db();
+# the rest are per-connection and applied whenever a connection is opened.
+JOURNAL_MODE = 'WAL'
+PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'cache_size': -16000,       # negative means KiB, so ~16 MB per connection
+    'mmap_size': 134217728,     # 128 MB
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000,       # ms to wait on a locked database before SQLITE_BUSY
+}
+
+WRITE_RETRIES = 5
+WRITE_RETRY_BASE_DELAY = 0.05
+WRITE_RETRY_MAX_DELAY = 1.0
+
+def configure_connection(conn):
+    """Apply the per-connection PRAGMAs"""
+    for name, value in PRAGMAS.items():
+        # Bypasses PooledConnection's query log: not part of any request's work
+        sqlite3.Connection.execute(conn, f'PRAGMA {name} = {value}')
+
+def _is_lock_error(error):
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+def run_write(conn, work):
+    """Run work(conn) in an IMMEDIATE transaction and commit it.
+
+    Taking the write lock up front means concurrent writers wait on
+    busy_timeout instead of failing halfway through; if SQLite still reports
+    the database as locked, the transaction is rolled back and retried with
+    jittered exponential backoff. Returns whatever work returns.
+    """
+    delay = WRITE_RETRY_BASE_DELAY
+    for attempt in range(WRITE_RETRIES + 1):
+        try:
+            if not conn.in_transaction:
+                conn.execute('BEGIN IMMEDIATE')
+            result = work(conn)
+            conn.commit()
+            return result
+        except sqlite3.OperationalError as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not _is_lock_error(e) or attempt == WRITE_RETRIES:
+                raise
+            time.sleep(delay + random.uniform(0, delay))
+            delay = min(delay * 2, WRITE_RETRY_MAX_DELAY)
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+
+# Optional query_audit.QueryPlanAuditor that explains every statement
+_query_auditor = None
+
+def set_query_auditor(auditor):
+    """Install (or with None remove) the query plan auditor; returns the previous one"""
+    global _query_auditor
+    previous, _query_auditor = _query_auditor, auditor
+    return previous
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that adds its fetch time and row count to a QueryLog entry"""
+
+    entry = None
+
+    def _track(self, started, rows):
+        self.entry[1] += time.perf_counter() - started
+        self.entry[2] += rows
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._track(started, row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._track(started, len(rows))
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._track(started, len(rows))
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        row = super().__next__()
+        self._track(started, 1)
+        return row
+
+class PooledConnection(sqlite3.Connection):
+    """SQLite connection that is handed back to its pool instead of being closed.
+
+    While a request is being handled, every statement is timed into the
+    request's QueryLog (see instrumentation.py).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+        self.request_bound = False
+
+    def _instrumented(self, method, sql, parameters):
+        if _query_auditor is not None and method == 'execute':
+            _query_auditor.check(self, sql, parameters)
+        query_log = current_query_log()
+        if query_log is None:
+            return getattr(super(), method)(sql, parameters)
+        started = time.perf_counter()
+        cursor = self.cursor(InstrumentedCursor)
+        getattr(cursor, method)(sql, parameters)
+        cursor.entry = query_log.add(sql, time.perf_counter() - started, max(cursor.rowcount, 0))
+        return cursor
+
+    def execute(self, sql, parameters=()):
+        return self._instrumented('execute', sql, parameters)
+
+    def executemany(self, sql, parameters):
+        return self._instrumented('executemany', sql, parameters)
+
+    def close(self):
+        """Return the connection to its pool (no-op while bound to a request)"""
+        if self.request_bound:
+            return
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().close()
+
+    def discard(self):
+        """Really close the underlying SQLite connection"""
+        self.pool = None
+        self.request_bound = False
+        sqlite3.Connection.close(self)
+
+class ConnectionPool:
+    """Pool of reusable SQLite connections for one database file.
+
+    Up to ``size`` idle connections are kept; extra connections opened under
+    load are closed when released.  Idle connections are handed out LIFO so
+    the most recently used (warmest page cache) connection is reused first.
+    """
+
+    def __init__(self, database, size=DEFAULT_POOL_SIZE):
+        self.database = database
+        self.size = size
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, factory=PooledConnection, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.pool = self
+        configure_connection(conn)
+        return conn
+
+    def _is_healthy(self, conn):
+        try:
+            sqlite3.Connection.execute(conn, 'SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        """Check out a connection, replacing it if it fails the health check"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+        if not self._is_healthy(conn):
+            conn.discard()
+            return self._connect()
+        return conn
+
+    def release(self, conn):
+        """Roll back any unfinished transaction and put the connection back"""
+        conn.request_bound = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            conn.discard()
+            return
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.discard()
+
+    def close_all(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                self._idle.get_nowait().discard()
+            except queue.Empty:
+                break
+
+# Sharding: each user's expenses, savings, budgets, goals and recurring rules
+# (and everything derived from them by triggers) live in one shard file, so
+# users on different shards never wait on the same write lock. Accounts,
+# profiles, categories and the user_shards map stay in the directory
+# database. Shard 0 is the directory file itself: a single-shard setup is
+# one file, and data from before sharding is already on shard 0.
+DEFAULT_SHARD_COUNT = 1
+
+def shard_path(shard, database=None):
+    """File holding a shard: the directory database for shard 0, else a sibling file"""
+    database = database or DATABASE
+    if shard == 0:
+        return database
+    stem, extension = os.path.splitext(database)
+    return f'{stem}-shard{shard}{extension}'
+
+class ShardRouter:
+    """Maps users to shards and keeps one connection pool per shard file.
+
+    A user's shard is recorded in the directory's user_shards table when
+    the account is created (user_id modulo ``shard_count``) and only
+    changes when the offline rebalancer (shards.py) moves the user. Lookups
+    are cached for the life of the process; users without a row (created
+    before sharding) live on shard 0.
+    """
+
+    def __init__(self, database, shard_count=DEFAULT_SHARD_COUNT, pool_size=DEFAULT_POOL_SIZE):
+        self.database = database
+        self.shard_count = max(shard_count, 1)
+        self.pool_size = pool_size
+        self.pid = os.getpid()
+        self._pools = {}
+        self._shards = {}
+        self._lock = threading.Lock()
+
+    def pool(self, shard):
+        """Connection pool of one shard (shard 0 is also the directory)"""
+        pool = self._pools.get(shard)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(shard)
+                if pool is None:
+                    pool = self._pools[shard] = ConnectionPool(shard_path(shard, self.database), self.pool_size)
+        return pool
+
+    def shard_for(self, user_id):
+        """Shard holding a user's data"""
+        shard = self._shards.get(user_id)
+        if shard is None:
+            conn = self.pool(0).acquire()
+            try:
+                row = conn.execute('SELECT shard FROM user_shards WHERE user_id = ?', (user_id,)).fetchone()
+            finally:
+                conn.close()
+            shard = self._shards[user_id] = row[0] if row else 0
+        return shard
+
+    def place(self, conn, user_id):
+        """Record the shard of a new user, inside the caller's directory transaction"""
+        shard = user_id % self.shard_count
+        conn.execute('INSERT OR REPLACE INTO user_shards (user_id, shard) VALUES (?, ?)', (user_id, shard))
+        return shard
+
+    def forget(self, user_id):
+        """Drop a cached lookup after the user was moved"""
+        self._shards.pop(user_id, None)
+
+    def shards(self):
+        """Every shard that is configured or still holds a user"""
+        conn = self.pool(0).acquire()
+        try:
+            highest = conn.execute('SELECT MAX(shard) FROM user_shards').fetchone()[0]
+        finally:
+            conn.close()
+        return range(max(self.shard_count, (highest or 0) + 1))
+
+    def close_all(self):
+        """Close every idle connection of every shard"""
+        for pool in list(self._pools.values()):
+            pool.close_all()
+
+_router = None
+_pool_size = DEFAULT_POOL_SIZE
+_shard_count = DEFAULT_SHARD_COUNT
+_pool_lock = threading.Lock()
+
+def get_router():
+    """Get the shard router for this process, recreating it after a fork"""
+    global _router
+    router = _router
+    if router is None or router.pid != os.getpid():
+        with _pool_lock:
+            if _router is None or _router.pid != os.getpid():
+                _router = ShardRouter(DATABASE, _shard_count, _pool_size)
+            router = _router
+    return router
+
+def get_pool(shard=0):
+    """Get the connection pool of a shard (by default the directory's)"""
+    return get_router().pool(shard)
+
+def get_db_connection(user_id=None):
+    """Get a connection to the shard holding ``user_id``'s data, or to the
+    users directory when no user is given.
+
+    Inside a Flask app context the same pooled connection (one per shard)
+    is reused for the whole request and returned to the pool on teardown,
+    so calling close() on it in a handler is harmless.
+    """
+    router = get_router()
+    shard = 0 if user_id is None else router.shard_for(user_id)
+    if has_app_context():
+        conns = g.setdefault('_db_conns', {})
+        conn = conns.get(shard)
+        if conn is None:
+            conn = conns[shard] = router.pool(shard).acquire()
+            conn.request_bound = True
+        return conn
+    return router.pool(shard).acquire()
+
+@contextmanager
+def pooled_connection(user_id=None, shard=None):
+    """Check out a connection that is independent of the request, e.g. for a
+    streamed response whose generator outlives the view function. It goes
+    to ``user_id``'s shard, to ``shard``, or else to the directory."""
+    router = get_router()
+    if shard is None:
+        shard = 0 if user_id is None else router.shard_for(user_id)
+    conn = router.pool(shard).acquire()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+def close_db_connection(exception=None):
+    """Return the request's connections to their pools"""
+    for conn in g.pop('_db_conns', {}).values():
+        conn.request_bound = False
+        conn.close()
+
+def init_app(app):
+    """Configure the pools, shards and PRAGMAs from app config and register request teardown"""
+    global _router, _pool_size, _shard_count
+    PRAGMAS.update(app.config.get('SQLITE_PRAGMAS', {}))
+    with _pool_lock:
+        _pool_size = int(app.config.get('DB_POOL_SIZE', DEFAULT_POOL_SIZE))
+        _shard_count = int(app.config.get('DB_SHARDS', DEFAULT_SHARD_COUNT))
+        if _router is not None:
+            _router.close_all()
+        _router = None
+    app.teardown_appcontext(close_db_connection)
+
+# Rollup tables kept in step with expenses/savings by triggers, so every write
+# path (routes, imports, scripts) updates them in the same transaction.
+ROLLUP_TABLES = [
+    '''CREATE TABLE IF NOT EXISTS expense_daily_totals (
+        user_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        category TEXT NOT NULL,
+        payment_mode TEXT NOT NULL,
+        total REAL NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, date, category, payment_mode)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS savings_daily_totals (
+        user_id INTEGER NOT NULL,
+        date TEXT NOT NULL,
+        source TEXT NOT NULL,
+        total REAL NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, date, source)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS savings_monthly_totals (
+        user_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        source TEXT NOT NULL,
+        total REAL NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, month, source)
+    ) WITHOUT ROWID''',
+]
+
+def rollup_sql(table, keys, values, sign):
+    """SQL adding (sign='+') or removing (sign='-') one row's amount to a rollup
+    (trigger body statements, shared with the server schema in storage.py)"""
+    if sign == '+':
+        return (
+            f"INSERT INTO {table} ({', '.join(keys)}, total, count) "
+            f"VALUES ({', '.join(values)}, NEW.amount, 1) "
+            f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET "
+            f"total = {table}.total + excluded.total, count = {table}.count + 1;"
+        )
+    match = ' AND '.join(f'{key} = {value}' for key, value in zip(keys, values))
+    return (
+        f"UPDATE {table} SET total = total - OLD.amount, count = count - 1 WHERE {match}; "
+        f"DELETE FROM {table} WHERE {match} AND count <= 0;"
+    )
 
-def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+# source table -> (columns whose change moves a row between buckets,
+#                  [(rollup table, key columns, key expressions over {row})])
+ROLLUPS = {
+    'expenses': ('amount, user_id, date, category, payment_mode', [
+        ('expense_daily_totals', ['user_id', 'date', 'category', 'payment_mode'],
+         ['{row}.user_id', '{row}.date', '{row}.category', '{row}.payment_mode']),
+    ]),
+    'savings': ('amount, user_id, date, source', [
+        ('savings_daily_totals', ['user_id', 'date', 'source'],
+         ['{row}.user_id', '{row}.date', '{row}.source']),
+        ('savings_monthly_totals', ['user_id', 'month', 'source'],
+         ['{row}.user_id', 'substr({row}.date, 1, 7)', '{row}.source']),
+    ]),
+}
+
+def _rollup_triggers():
+    """Build the INSERT/DELETE/UPDATE triggers for every table in ROLLUPS"""
+    statements = []
+    for source_table, (watched, targets) in ROLLUPS.items():
+        add = ' '.join(
+            rollup_sql(table, keys, [v.format(row='NEW') for v in values], '+')
+            for table, keys, values in targets
+        )
+        remove = ' '.join(
+            rollup_sql(table, keys, [v.format(row='OLD') for v in values], '-')
+            for table, keys, values in targets
+        )
+        statements += [
+            f'CREATE TRIGGER IF NOT EXISTS {source_table}_rollup_insert AFTER INSERT ON {source_table} BEGIN {add} END',
+            f'CREATE TRIGGER IF NOT EXISTS {source_table}_rollup_delete AFTER DELETE ON {source_table} BEGIN {remove} END',
+            f'CREATE TRIGGER IF NOT EXISTS {source_table}_rollup_update AFTER UPDATE OF {watched} ON {source_table} '
+            f'BEGIN {remove} {add} END',
+        ]
+    return statements
+
+def rebuild_rollups(conn):
+    """Recompute every rollup table from the raw expenses and savings rows"""
+    _rebuild_daily_rollups(conn)
+    _rebuild_savings_totals(conn)
+    _rebuild_expense_monthly_totals(conn)
+    _rebuild_expense_facet_totals(conn)
+
+def _rebuild_daily_rollups(conn):
+    conn.execute('DELETE FROM expense_daily_totals')
+    conn.execute('''
+        INSERT INTO expense_daily_totals (user_id, date, category, payment_mode, total, count)
+        SELECT user_id, date, category, payment_mode, SUM(amount), COUNT(*)
+        FROM expenses WHERE user_id IS NOT NULL
+        GROUP BY user_id, date, category, payment_mode
+    ''')
+    conn.execute('DELETE FROM savings_daily_totals')
+    conn.execute('''
+        INSERT INTO savings_daily_totals (user_id, date, source, total, count)
+        SELECT user_id, date, source, SUM(amount), COUNT(*)
+        FROM savings WHERE user_id IS NOT NULL
+        GROUP BY user_id, date, source
+    ''')
+    conn.execute('DELETE FROM savings_monthly_totals')
+    conn.execute('''
+        INSERT INTO savings_monthly_totals (user_id, month, source, total, count)
+        SELECT user_id, substr(date, 1, 7), source, SUM(amount), COUNT(*)
+        FROM savings WHERE user_id IS NOT NULL
+        GROUP BY user_id, substr(date, 1, 7), source
+    ''')
+
+def _create_rollups(conn):
+    """Create rollup tables and triggers, then backfill them"""
+    for statement in ROLLUP_TABLES + _rollup_triggers():
+        conn.execute(statement)
+    _rebuild_daily_rollups(conn)
+
+# Rollups added after migration 3, each kept current by its own triggers:
+# (rollup table, source table, columns whose change moves a row between
+#  buckets, key columns, key expressions over {row})
+SAVINGS_TOTALS_ROLLUP = ('savings_totals', 'savings', 'amount, user_id', ['user_id'], ['{row}.user_id'])
+EXPENSE_MONTHLY_ROLLUP = (
+    'expense_monthly_totals', 'expenses', 'amount, user_id, date, category',
+    ['user_id', 'month', 'category'], ['{row}.user_id', 'substr({row}.date, 1, 7)', '{row}.category']
+)
+EXPENSE_FACET_ROLLUP = (
+    'expense_facet_totals', 'expenses', 'amount, user_id, category, payment_mode',
+    ['user_id', 'category', 'payment_mode'], ['{row}.user_id', '{row}.category', '{row}.payment_mode']
+)
+STANDALONE_ROLLUPS = (SAVINGS_TOTALS_ROLLUP, EXPENSE_MONTHLY_ROLLUP, EXPENSE_FACET_ROLLUP)
+
+# All-time savings per user, so goal progress is a primary-key lookup however
+# long the savings history is. Kept current by its own triggers (added after
+# the rollup triggers of migration 3, which must not change).
+SAVINGS_TOTALS_TABLE = '''CREATE TABLE IF NOT EXISTS savings_totals (
+    user_id INTEGER PRIMARY KEY,
+    total REAL NOT NULL,
+    count INTEGER NOT NULL
+)'''
+
+def _standalone_rollup_triggers(table, source_table, watched, keys, values):
+    """Insert/delete/update triggers keeping one rollup table current; used for
+    rollups added after migration 3, whose shared triggers must not change"""
+    add = rollup_sql(table, keys, [v.format(row='NEW') for v in values], '+')
+    remove = rollup_sql(table, keys, [v.format(row='OLD') for v in values], '-')
+    return [
+        f'CREATE TRIGGER IF NOT EXISTS {table}_insert AFTER INSERT ON {source_table} BEGIN {add} END',
+        f'CREATE TRIGGER IF NOT EXISTS {table}_delete AFTER DELETE ON {source_table} BEGIN {remove} END',
+        f'CREATE TRIGGER IF NOT EXISTS {table}_update AFTER UPDATE OF {watched} ON {source_table} '
+        f'BEGIN {remove} {add} END',
+    ]
+
+def _savings_totals_triggers():
+    return _standalone_rollup_triggers(*SAVINGS_TOTALS_ROLLUP)
+
+def _rebuild_savings_totals(conn):
+    conn.execute('DELETE FROM savings_totals')
+    conn.execute('''
+        INSERT INTO savings_totals (user_id, total, count)
+        SELECT user_id, SUM(amount), COUNT(*)
+        FROM savings WHERE user_id IS NOT NULL
+        GROUP BY user_id
+    ''')
+
+def _create_savings_totals(conn):
+    for statement in [SAVINGS_TOTALS_TABLE] + _savings_totals_triggers():
+        conn.execute(statement)
+    _rebuild_savings_totals(conn)
+
+# Expense totals per user, month and category, for month-level analytics
+EXPENSE_MONTHLY_TOTALS_TABLE = '''CREATE TABLE IF NOT EXISTS expense_monthly_totals (
+    user_id INTEGER NOT NULL,
+    month TEXT NOT NULL,
+    category TEXT NOT NULL,
+    total REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, month, category)
+) WITHOUT ROWID'''
+
+def _rebuild_expense_monthly_totals(conn):
+    conn.execute('DELETE FROM expense_monthly_totals')
+    conn.execute('''
+        INSERT INTO expense_monthly_totals (user_id, month, category, total, count)
+        SELECT user_id, substr(date, 1, 7), category, SUM(amount), COUNT(*)
+        FROM expenses WHERE user_id IS NOT NULL
+        GROUP BY user_id, substr(date, 1, 7), category
+    ''')
+
+def _create_expense_monthly_totals(conn):
+    statements = [EXPENSE_MONTHLY_TOTALS_TABLE] + _standalone_rollup_triggers(*EXPENSE_MONTHLY_ROLLUP)
+    for statement in statements:
+        conn.execute(statement)
+    _rebuild_expense_monthly_totals(conn)
+    # Lets outlier detection read just the largest expenses of each category
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_expenses_user_category_amount ON expenses (user_id, category, amount)')
+    conn.execute('ANALYZE')
+
+# All-time expense count and total per user, category and payment mode: the
+# unfiltered facet counts of the expense list, and the (category, mode)
+# pairs that the amount-filtered facet query seeks into.
+EXPENSE_FACET_TOTALS_TABLE = '''CREATE TABLE IF NOT EXISTS expense_facet_totals (
+    user_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    payment_mode TEXT NOT NULL,
+    total REAL NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user_id, category, payment_mode)
+) WITHOUT ROWID'''
+
+def _rebuild_expense_facet_totals(conn):
+    conn.execute('DELETE FROM expense_facet_totals')
+    conn.execute('''
+        INSERT INTO expense_facet_totals (user_id, category, payment_mode, total, count)
+        SELECT user_id, category, payment_mode, SUM(amount), COUNT(*)
+        FROM expenses WHERE user_id IS NOT NULL
+        GROUP BY user_id, category, payment_mode
+    ''')
+
+def _create_expense_facets(conn):
+    statements = [EXPENSE_FACET_TOTALS_TABLE] + _standalone_rollup_triggers(*EXPENSE_FACET_ROLLUP)
+    for statement in statements:
+        conn.execute(statement)
+    _rebuild_expense_facet_totals(conn)
+    # Amount-sorted pages, and covering indexes for facet counts filtered by
+    # amount: seeked per (category, mode) pair, then by amount or date range
+    for statement in (
+        'CREATE INDEX IF NOT EXISTS idx_expenses_user_amount ON expenses (user_id, amount)',
+        'CREATE INDEX IF NOT EXISTS idx_expenses_facets_amount ON expenses (user_id, category, payment_mode, amount, date)',
+        'CREATE INDEX IF NOT EXISTS idx_expenses_facets_date ON expenses (user_id, category, payment_mode, date, amount)',
+        'CREATE INDEX IF NOT EXISTS idx_savings_user_amount ON savings (user_id, amount)',
+        'ANALYZE',
+    ):
+        conn.execute(statement)
+
+# Full-text indexes over the free-text columns. They are contentless (the
+# rows already live in expenses/savings) and a document's rowid is
+# (user_id << 32) | id, so each user's documents form one rowid range that a
+# search seeks into instead of filtering every match by owner. Kept in sync
+# by triggers; a contentless delete needs the old values.
+SEARCH_INDEXES = {
+    'expenses': ('expenses_fts', ['notes', 'category', 'payment_mode']),
+    'savings': ('savings_fts', ['notes', 'source']),
+}
+SEARCH_ROWID_BITS = 32
+SEARCH_ID_MASK = (1 << SEARCH_ROWID_BITS) - 1
+
+def search_rowid_range(user_id):
+    """First and last search-index rowid that can belong to a user"""
+    return user_id << SEARCH_ROWID_BITS, ((user_id + 1) << SEARCH_ROWID_BITS) - 1
+
+def _search_index_statements():
+    statements = []
+    for source_table, (index, columns) in SEARCH_INDEXES.items():
+        names = ', '.join(columns)
+        new = ', '.join(f'NEW.{column}' for column in columns)
+        old = ', '.join(f'OLD.{column}' for column in columns)
+        add = (f"INSERT INTO {index} (rowid, {names}) "
+               f"VALUES ((NEW.user_id << {SEARCH_ROWID_BITS}) | NEW.id, {new});")
+        remove = (f"INSERT INTO {index} ({index}, rowid, {names}) "
+                  f"VALUES ('delete', (OLD.user_id << {SEARCH_ROWID_BITS}) | OLD.id, {old});")
+        statements += [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {index} USING fts5({names}, "
+            f"content='', prefix='2 3 4', tokenize='unicode61 remove_diacritics 2')",
+            f'CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {source_table} BEGIN {add} END',
+            f'CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {source_table} BEGIN {remove} END',
+            f'CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF user_id, {names} ON {source_table} '
+            f'BEGIN {remove} {add} END',
+        ]
+    return statements
+
+def rebuild_search_index(conn):
+    """Re-index every expense and savings row, then merge the index segments"""
+    for source_table, (index, columns) in SEARCH_INDEXES.items():
+        names = ', '.join(columns)
+        conn.execute(f"INSERT INTO {index} ({index}) VALUES ('delete-all')")
+        conn.execute(
+            f"INSERT INTO {index} (rowid, {names}) "
+            f"SELECT (user_id << {SEARCH_ROWID_BITS}) | id, {names} FROM {source_table} WHERE user_id IS NOT NULL"
+        )
+        conn.execute(f"INSERT INTO {index} ({index}) VALUES ('optimize')")
+
+def _create_search_index(conn):
+    for statement in _search_index_statements():
+        conn.execute(statement)
+    rebuild_search_index(conn)
+
+def analyze(conn):
+    """Refresh the planner statistics, leaving out the full-text index tables.
+
+    FTS5 plans the lookups on its own shadow tables (expenses_fts_data,
+    ...) assuming they have no statistics. Statistics gathered while an
+    index is still small make every later write to it scan the whole
+    index, so they are dropped again and the schema reloaded.
+    """
+    conn.execute('ANALYZE')
+    conn.executemany(
+        "DELETE FROM sqlite_stat1 WHERE tbl LIKE ? ESCAPE '\\'",
+        [(f'{index}\\_%',) for index, _ in SEARCH_INDEXES.values()]
+    )
+    conn.execute('ANALYZE sqlite_master')
+
+# Recurring expense rules (see recurring.py). Generated expenses point back
+# at their rule; the unique (recurring_id, date) index makes generation
+# idempotent, and the partial index finds the due rules of all users.
+RECURRING_EXPENSES_TABLE = '''CREATE TABLE IF NOT EXISTS recurring_expenses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    amount REAL NOT NULL,
+    category TEXT NOT NULL,
+    payment_mode TEXT NOT NULL,
+    notes TEXT,
+    frequency TEXT NOT NULL,
+    interval INTEGER NOT NULL DEFAULT 1,
+    start_date TEXT NOT NULL,
+    end_date TEXT,
+    next_date TEXT NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id)
+)'''
+
+def _create_recurring_expenses(conn):
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(expenses)')]
+    if 'recurring_id' not in columns:
+        conn.execute('ALTER TABLE expenses ADD COLUMN recurring_id INTEGER')
+    for statement in (
+        RECURRING_EXPENSES_TABLE,
+        'CREATE INDEX IF NOT EXISTS idx_recurring_expenses_user ON recurring_expenses (user_id, next_date)',
+        'CREATE INDEX IF NOT EXISTS idx_recurring_expenses_due ON recurring_expenses (next_date) WHERE active = 1',
+        '''CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_recurring_date ON expenses (recurring_id, date)
+           WHERE recurring_id IS NOT NULL''',
+    ):
+        conn.execute(statement)
+
+# Every write to these tables bumps the owner's row in user_changes inside the
+# same transaction; other worker processes poll it to notice changes, and
+# cached responses and ETags are keyed on it. recurring_expenses is tracked
+# since migration 13.
+CHANGE_TRACKED_TABLES = ('expenses', 'savings', 'budget', 'savings_goals')
+
+def _change_tracking(tables=CHANGE_TRACKED_TABLES):
+    bump = (
+        'INSERT INTO user_changes (user_id, version) VALUES ({row}.user_id, 1) '
+        'ON CONFLICT (user_id) DO UPDATE SET version = version + 1, changed_at = CURRENT_TIMESTAMP;'
+    )
+    statements = ['''CREATE TABLE IF NOT EXISTS user_changes (
+        user_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL,
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''']
+    for table in tables:
+        for event, row in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            statements.append(
+                f'CREATE TRIGGER IF NOT EXISTS {table}_track_{event.lower()} AFTER {event} ON {table} '
+                f'BEGIN {bump.format(row=row)} END'
+            )
+    return statements
+
+def _add_user_id_columns(conn):
+    """Databases created before multi-user support lack user_id; existing rows go to user 1"""
+    for table in ('savings', 'expenses', 'savings_goals'):
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info({table})')]
+        if 'user_id' not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN user_id INTEGER')
+            conn.execute(f'UPDATE {table} SET user_id = 1 WHERE user_id IS NULL')
+
+# Schema migrations, applied in order by run_migrations(). Each step is either
+# a list of SQL statements or a callable taking the connection. Never edit or
+# reorder a released migration; append a new one instead.
+MIGRATIONS = [
+    (1, 'add user_id to legacy tables', _add_user_id_columns),
+    (2, 'composite indexes for the user/date query pattern', [
+        'CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses (user_id, date)',
+        'CREATE INDEX IF NOT EXISTS idx_expenses_user_date_amount ON expenses (user_id, date, amount)',
+        'CREATE INDEX IF NOT EXISTS idx_expenses_user_date_category ON expenses (user_id, date, category, amount)',
+        'CREATE INDEX IF NOT EXISTS idx_expenses_user_date_mode ON expenses (user_id, date, payment_mode, amount)',
+        'CREATE INDEX IF NOT EXISTS idx_savings_user_date ON savings (user_id, date)',
+        'CREATE INDEX IF NOT EXISTS idx_savings_user_date_amount ON savings (user_id, date, amount)',
+        'CREATE INDEX IF NOT EXISTS idx_savings_user_source ON savings (user_id, source, amount)',
+        'CREATE INDEX IF NOT EXISTS idx_budget_user_month ON budget (user_id, month, type, category)',
+        'CREATE INDEX IF NOT EXISTS idx_savings_goals_user_created ON savings_goals (user_id, created_at)',
+        'ANALYZE',
+    ]),
+    (3, 'daily/monthly rollup tables maintained by triggers', _create_rollups),
+    (4, 'per-user change counter for push notifications', _change_tracking()),
+    (5, 'per-user savings running total', _create_savings_totals),
+    (6, 'monthly expense rollup and category/amount index', _create_expense_monthly_totals),
+    (7, 'full-text search over expense and savings notes', _create_search_index),
+    (8, 'expense facet rollup and amount/facet indexes', _create_expense_facets),
+    (9, 'drop planner statistics of the full-text index tables', analyze),
+    (10, 'recurring expense rules', _create_recurring_expenses),
+    (11, 'user to shard map of the users directory', [
+        'CREATE TABLE IF NOT EXISTS user_shards (user_id INTEGER PRIMARY KEY, shard INTEGER NOT NULL)',
+    ]),
+    # idx_expenses_user_date is a prefix of idx_expenses_user_date_amount
+    # that every expense write had to maintain
+    (12, 'drop the redundant expense user/date index', [
+        'DROP INDEX IF EXISTS idx_expenses_user_date',
+    ]),
+    (13, 'change tracking of recurring expense rules', _change_tracking(('recurring_expenses',))),
+    # idx_savings_user_date is a prefix of idx_savings_user_date_amount; the
+    # category, payment mode and source breakdowns read the rollups, so no
+    # query picks the other three any more
+    (14, 'drop redundant and unused expense and savings indexes', [
+        'DROP INDEX IF EXISTS idx_savings_user_date',
+        'DROP INDEX IF EXISTS idx_expenses_user_date_category',
+        'DROP INDEX IF EXISTS idx_expenses_user_date_mode',
+        'DROP INDEX IF EXISTS idx_savings_user_source',
+    ]),
+]
+
+def run_migrations(conn):
+    """Apply pending migrations, tracking the schema version in PRAGMA user_version.
+
+    Each migration runs in its own IMMEDIATE transaction together with the
+    version bump, so concurrently starting workers apply it exactly once.
+    """
+    for version, description, step in MIGRATIONS:
+        if conn.execute('PRAGMA user_version').fetchone()[0] >= version:
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Another worker may have applied it while we waited for the lock
+            if conn.execute('PRAGMA user_version').fetchone()[0] >= version:
+                conn.rollback()
+                continue
+            if callable(step):
+                step(conn)
+            else:
+                for statement in step:
+                    conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {version}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+DEFAULT_CATEGORIES = [
+    'Food & Dining', 'Transportation', 'Shopping', 'Bills & Utilities',
+    'Entertainment', 'Healthcare', 'Education', 'Travel',
+    'Personal Care', 'Others'
+]
 
 def init_db():
-    """Initialize database with required tables"""
-    conn = sqlite3.connect(DATABASE)
+    """Initialize the users directory and every shard with the required tables"""
+    init_database(shard_path(0))
+    for shard in get_router().shards():
+        if shard:
+            init_database(shard_path(shard))
+
+def init_database(path):
+    """Create the tables of one database file and bring it up to date.
+
+    Every shard gets the full schema; the account tables simply stay empty
+    outside the directory.
+    """
+    conn = sqlite3.connect(path)
+    conn.execute(f'PRAGMA journal_mode = {JOURNAL_MODE}')
+    configure_connection(conn)
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -44,13 +861,7 @@ def init_db():
         )
     ''')
     
-    default_categories = [
-        'Food & Dining', 'Transportation', 'Shopping', 'Bills & Utilities',
-        'Entertainment', 'Healthcare', 'Education', 'Travel',
-        'Personal Care', 'Others'
-    ]
-    
-    for category in default_categories:
+    for category in DEFAULT_CATEGORIES:
         cursor.execute('INSERT OR IGNORE INTO categories (name) VALUES (?)', (category,))
     
     cursor.execute('''
@@ -104,48 +915,7 @@ def init_db():
         )
     ''')
     
-    # Migration: Add user_id column to savings table if it doesn't exist
-    try:
-        cursor.execute('SELECT user_id FROM savings LIMIT 1')
-    except sqlite3.OperationalError:
-        # Column doesn't exist, add it
-        try:
-            cursor.execute('ALTER TABLE savings ADD COLUMN user_id INTEGER')
-            # Set user_id to 1 for existing records (if any)
-            cursor.execute('UPDATE savings SET user_id = 1 WHERE user_id IS NULL')
-            conn.commit()
-        except sqlite3.OperationalError:
-            # If column already exists or other error, just continue
-            pass
-    
-    # Migration: Add user_id column to expenses table if it doesn't exist
-    try:
-        cursor.execute('SELECT user_id FROM expenses LIMIT 1')
-    except sqlite3.OperationalError:
-        # Column doesn't exist, add it
-        try:
-            cursor.execute('ALTER TABLE expenses ADD COLUMN user_id INTEGER')
-            # Set user_id to 1 for existing records (if any)
-            cursor.execute('UPDATE expenses SET user_id = 1 WHERE user_id IS NULL')
-            conn.commit()
-        except sqlite3.OperationalError:
-            # If column already exists or other error, just continue
-            pass
-    
-    # Migration: Add user_id column to savings_goals table if it doesn't exist
-    try:
-        cursor.execute('SELECT user_id FROM savings_goals LIMIT 1')
-    except sqlite3.OperationalError:
-        # Column doesn't exist, add it
-        try:
-            cursor.execute('ALTER TABLE savings_goals ADD COLUMN user_id INTEGER')
-            # Set user_id to 1 for existing records (if any)
-            cursor.execute('UPDATE savings_goals SET user_id = 1 WHERE user_id IS NULL')
-            conn.commit()
-        except sqlite3.OperationalError:
-            # If column already exists or other error, just continue
-            pass
-    
     conn.commit()
+    
+    run_migrations(conn)
     conn.close()
-
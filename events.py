@@ -0,0 +1,46 @@
+import threading
+import time
+
+DEFAULT_POLL_INTERVAL = 1.0
+
+class ChangeNotifier:
+    """Wakes server-sent event streams when a user's data changes.
+
+    Streams in this worker are woken immediately by notify(), which the
+    write routes call after committing. Changes committed by other worker
+    processes (or scripts) are picked up by polling ``version(user_id)``, the
+    user's row of the user_changes table (a primary-key lookup), every
+    ``poll_interval`` seconds.
+    """
+
+    def __init__(self, version, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.version = version
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._local_versions = {}
+
+    def notify(self, user_id):
+        with self._condition:
+            self._local_versions[user_id] = self._local_versions.get(user_id, 0) + 1
+            self._condition.notify_all()
+
+    def current_version(self, user_id):
+        return self.version(user_id)
+
+    def wait_for_change(self, user_id, version, timeout):
+        """Block until the user's change counter differs from ``version`` or
+        ``timeout`` seconds pass; returns the counter at that point"""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            local = self._local_versions.get(user_id, 0)
+        while True:
+            current = self.current_version(user_id)
+            remaining = deadline - time.monotonic()
+            if current != version or remaining <= 0:
+                return current
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._local_versions.get(user_id, 0) != local,
+                    timeout=min(self.poll_interval, remaining)
+                )
+                local = self._local_versions.get(user_id, 0)
@@ -0,0 +1,110 @@
+import csv
+import io
+
+EXPORT_BATCH_SIZE = 1000
+
+# dataset -> (table, [(column, type)], column the "category" filter applies to,
+#             column the date filters apply to)
+DATASETS = {
+    'expenses': ('expenses', [
+        ('id', 'int'), ('date', 'str'), ('amount', 'float'), ('category', 'str'),
+        ('payment_mode', 'str'), ('notes', 'str'), ('created_at', 'str'),
+    ], 'category', 'date'),
+    'savings': ('savings', [
+        ('id', 'int'), ('date', 'str'), ('amount', 'float'), ('source', 'str'),
+        ('notes', 'str'), ('created_at', 'str'),
+    ], 'source', 'date'),
+    'budget': ('budget', [
+        ('id', 'int'), ('month', 'str'), ('type', 'str'), ('category', 'str'),
+        ('amount', 'float'), ('created_at', 'str'),
+    ], 'category', 'month'),
+}
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+def build_query(dataset, user_id, date_from=None, date_to=None, category=None):
+    """SELECT for one user's rows of a dataset, oldest first"""
+    table, columns, category_column, date_column = DATASETS[dataset]
+    query = f"SELECT {', '.join(name for name, _ in columns)} FROM {table} WHERE user_id = ?"
+    params = [user_id]
+    # Budget months are YYYY-MM, so compare them against the month part of the dates
+    width = 7 if date_column == 'month' else 10
+    if date_from:
+        query += f' AND {date_column} >= ?'
+        params.append(date_from[:width])
+    if date_to:
+        query += f' AND {date_column} <= ?'
+        params.append(date_to[:width])
+    if category:
+        query += f' AND {category_column} = ?'
+        params.append(category)
+    query += f' ORDER BY {date_column}, id'
+    return query, params
+
+def csv_chunks(batches, columns):
+    """Yield CSV text a batch of rows at a time (``batches`` yields lists of
+    rows, e.g. a storage session's stream())"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in columns])
+    for rows in batches:
+        writer.writerows(tuple(row) for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that collects bytes until they are drained"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def parquet_chunks(batches, columns):
+    """Yield a Parquet file one row group per batch (needs the optional pyarrow)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {'int': pa.int64(), 'float': pa.float64(), 'str': pa.string()}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='zstd')
+    try:
+        for rows in batches:
+            arrays = [
+                pa.array([row[i] for row in rows], type=schema.field(i).type)
+                for i in range(len(columns))
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
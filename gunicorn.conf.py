@@ -0,0 +1,26 @@
+"""Gunicorn launcher settings for the ASGI app (``gunicorn -c gunicorn.conf.py asgi:app``)"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+# ETags and cache keys follow the shared user_changes table, but without Redis
+# the cached responses, their generation counters and the cached user context
+# live in each worker: every worker fills its own copy, and a profile change
+# only reaches another worker's copy through the session that made it. So
+# default to a single worker (which still serves ASGI_THREADS requests at
+# once) when CACHE_REDIS_URL is unset.
+if os.environ.get('CACHE_REDIS_URL'):
+    _default_workers = min(multiprocessing.cpu_count() * 2 + 1, 8)
+else:
+    _default_workers = 1
+workers = int(os.environ.get('WEB_CONCURRENCY', _default_workers))
+
+# Server-sent event streams are capped at 5 minutes by the app; leave headroom
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 360))
+graceful_timeout = 30
+keepalive = 5
+max_requests = 10000
+max_requests_jitter = 1000
+accesslog = '-'
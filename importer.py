@@ -0,0 +1,84 @@
+import codecs
+import csv
+import json
+import math
+from datetime import datetime
+
+EXPENSE_FIELDS = ('amount', 'category', 'date', 'payment_mode', 'notes')
+
+class RowError(ValueError):
+    """A single uploaded row could not be imported"""
+
+def detect_format(content_type, filename=None, requested=None):
+    """Work out whether an upload is CSV or NDJSON"""
+    if requested:
+        return requested.lower()
+    if filename:
+        lowered = filename.lower()
+        if lowered.endswith('.csv'):
+            return 'csv'
+        if lowered.endswith(('.ndjson', '.jsonl')):
+            return 'ndjson'
+    if content_type and ('ndjson' in content_type or 'jsonl' in content_type):
+        return 'ndjson'
+    return 'csv'
+
+def iter_records(stream, fmt):
+    """Yield (line_number, record) pairs from a binary upload stream.
+
+    Records are decoded lazily, so only the current line is held in memory.
+    A line that is not valid JSON yields a RowError instead of a record.
+    """
+    text = codecs.getreader('utf-8-sig')(stream)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield line_number, RowError(f'Invalid JSON: {e}')
+                continue
+            if not isinstance(record, dict):
+                yield line_number, RowError('Each line must be a JSON object')
+                continue
+            yield line_number, record
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+def _text(record, field):
+    """A text field of a record ('' when missing); NDJSON may carry any JSON type"""
+    value = record.get(field)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise RowError(f'{field} must be a string')
+    return value
+
+def validate_expense(record, categories):
+    """Turn an uploaded record into an (amount, category, date, payment_mode, notes) tuple"""
+    if isinstance(record, RowError):
+        raise record
+    try:
+        amount = float(record.get('amount'))
+    except (TypeError, ValueError):
+        raise RowError('amount must be a number')
+    if not math.isfinite(amount):
+        raise RowError('amount must be a finite number')
+    category = _text(record, 'category').strip()
+    if category not in categories:
+        raise RowError(f'Unknown category: {category!r}')
+    date = _text(record, 'date').strip()
+    try:
+        datetime.strptime(date, '%Y-%m-%d')
+    except ValueError:
+        raise RowError('date must be YYYY-MM-DD')
+    payment_mode = _text(record, 'payment_mode').strip()
+    if not payment_mode:
+        raise RowError('payment_mode is required')
+    notes = _text(record, 'notes')
+    return amount, category, date, payment_mode, notes
@@ -0,0 +1,168 @@
+import bisect
+import json
+import logging
+import re
+import threading
+from functools import lru_cache
+
+from flask import g, has_app_context
+
+DEFAULT_SLOW_QUERY_MS = 100
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+logger = logging.getLogger('expense_tracker.requests')
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+@lru_cache(maxsize=2048)
+def normalize_sql(sql):
+    """Collapse whitespace, literals and IN lists so equivalent queries group together"""
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    sql = _LITERALS.sub('?', sql)
+    return _IN_LISTS.sub('(?)', sql)
+
+class QueryLog:
+    """Queries issued while handling one request.
+
+    Each entry is a mutable ``[sql, seconds, rows]`` list; the cursor that
+    ran the query keeps adding fetch time and rows to it as they are read.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def add(self, sql, seconds, rows):
+        entry = [sql, seconds, rows]
+        self.queries.append(entry)
+        return entry
+
+    @property
+    def total_seconds(self):
+        return sum(entry[1] for entry in self.queries)
+
+    @property
+    def total_rows(self):
+        return sum(entry[2] for entry in self.queries)
+
+def configure_logging(level='INFO'):
+    """Send request log lines to stderr unless a handler is already configured"""
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+        logger.propagate = False
+    logger.setLevel(level)
+
+def current_query_log():
+    """The QueryLog of the request being handled, if instrumentation is on"""
+    if has_app_context():
+        return g.get('query_log')
+    return None
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+def _labels(**labels):
+    return ','.join(f'{name}="{value}"' for name, value in labels.items())
+
+class RequestMetrics:
+    """Per-route request and SQL statistics, rendered in Prometheus text format.
+
+    Routes are labelled by their URL rule (e.g. ``/api/expenses/<int:expense_id>``)
+    so the number of series stays bounded. Counts are per worker process.
+    """
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._request_seconds = {}
+        self._sql_seconds = {}
+        self._queries = {}
+        self._slow_queries = {}
+
+    def observe(self, route, method, status, seconds, query_log, slow_queries):
+        with self._lock:
+            key = (route, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            self._request_seconds.setdefault((route, method), Histogram(self.buckets)).observe(seconds)
+            if query_log is not None:
+                self._sql_seconds.setdefault((route, method), Histogram(self.buckets)).observe(query_log.total_seconds)
+                self._queries[route] = self._queries.get(route, 0) + len(query_log.queries)
+            if slow_queries:
+                self._slow_queries[route] = self._slow_queries.get(route, 0) + slow_queries
+
+    def _histogram_lines(self, name, help_text, histograms):
+        lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for (route, method), histogram in sorted(histograms.items()):
+            labels = _labels(route=route, method=method)
+            cumulative = 0
+            for bound, count in zip(self.buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{{labels}}} {histogram.sum:.6f}')
+            lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        return lines
+
+    def render(self):
+        with self._lock:
+            lines = ['# HELP http_requests_total Requests handled, by route, method and status',
+                     '# TYPE http_requests_total counter']
+            for (route, method, status), count in sorted(self._requests.items()):
+                lines.append(f'http_requests_total{{{_labels(route=route, method=method, status=status)}}} {count}')
+            lines += self._histogram_lines(
+                'http_request_duration_seconds', 'Time spent handling requests', self._request_seconds)
+            lines += self._histogram_lines(
+                'sql_request_duration_seconds', 'Time spent in SQL per request', self._sql_seconds)
+            lines += ['# HELP sql_queries_total SQL statements executed, by route',
+                      '# TYPE sql_queries_total counter']
+            for route, count in sorted(self._queries.items()):
+                lines.append(f'sql_queries_total{{{_labels(route=route)}}} {count}')
+            lines += ['# HELP sql_slow_queries_total SQL statements slower than the slow-query threshold',
+                      '# TYPE sql_slow_queries_total counter']
+            for route, count in sorted(self._slow_queries.items()):
+                lines.append(f'sql_slow_queries_total{{{_labels(route=route)}}} {count}')
+        return '\n'.join(lines) + '\n'
+
+def server_timing(query_log, seconds):
+    """Server-Timing header value for one request"""
+    return (f'db;dur={query_log.total_seconds * 1000:.2f};desc="{len(query_log.queries)} queries", '
+            f'total;dur={seconds * 1000:.2f}')
+
+def log_request(method, route, path, status, seconds, query_log, slow_query_seconds):
+    """Write the structured log line for a request plus one line per slow query.
+
+    Returns the number of slow queries.
+    """
+    slow = [entry for entry in query_log.queries if entry[1] >= slow_query_seconds]
+    logger.info(json.dumps({
+        'event': 'request',
+        'method': method,
+        'route': route,
+        'path': path,
+        'status': status,
+        'duration_ms': round(seconds * 1000, 2),
+        'sql_ms': round(query_log.total_seconds * 1000, 2),
+        'queries': len(query_log.queries),
+        'rows': query_log.total_rows,
+    }))
+    for sql, query_seconds, rows in slow:
+        logger.warning(json.dumps({
+            'event': 'slow_query',
+            'route': route,
+            'sql': normalize_sql(sql),
+            'duration_ms': round(query_seconds * 1000, 2),
+            'rows': rows,
+        }))
+    return len(slow)
@@ -0,0 +1,74 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_HASH_WORKERS = min(4, os.cpu_count() or 1)
+DEFAULT_MAX_PENDING = 32
+HASH_TIMEOUT = 10
+
+class HasherBusy(RuntimeError):
+    """Too many password hashes are already waiting for a worker"""
+
+class PasswordHasher:
+    """Runs werkzeug password hashing on a bounded pool of worker processes.
+
+    Hashing is deliberately slow and holds the GIL, so doing it on the
+    request thread stalls every other request in the worker during a burst
+    of sign-ins. Here the request thread just waits on a future. At most
+    ``max_pending`` hashes may be queued or running; beyond that callers get
+    HasherBusy after HASH_TIMEOUT seconds instead of piling up. With
+    ``workers=0`` hashing runs inline.
+    """
+
+    def __init__(self, workers=DEFAULT_HASH_WORKERS, max_pending=DEFAULT_MAX_PENDING):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(max(max_pending, 1))
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Recreated after a fork (e.g. gunicorn workers); spawned children do
+        # not inherit the server's threads or open database connections
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        if not self._slots.acquire(timeout=HASH_TIMEOUT):
+            raise HasherBusy('Too many password checks in progress')
+        try:
+            executor = self._get_executor()
+            try:
+                return executor.submit(fn, *args).result(timeout=HASH_TIMEOUT)
+            except FutureTimeout:
+                raise HasherBusy('Password check timed out')
+            except BrokenProcessPool:
+                with self._lock:
+                    if self._executor is executor:
+                        self._executor = None
+                return fn(*args)
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
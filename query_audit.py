@@ -0,0 +1,106 @@
+"""EXPLAIN QUERY PLAN auditor that flags full scans of the large tables.
+
+Enable it for the app with ``QUERY_PLAN_AUDIT=true``. Every distinct
+statement run through a pooled connection is explained once (plans are
+cached by SQL text) and any ``SCAN`` of a watched table, under its own
+name or an alias the statement gives it, is logged together with the
+route that issued it.
+
+In tests, load this module as a plugin (``pytest_plugins = ['query_audit']``
+in conftest.py) and request the ``query_plan_audit`` fixture: the test
+fails if anything it ran scanned a watched table.
+"""
+import logging
+import re
+import sqlite3
+import threading
+
+from flask import has_request_context, request
+
+import database
+
+DEFAULT_WATCHED_TABLES = ('expenses', 'savings')
+AUDITED_STATEMENTS = ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT', 'REPLACE')
+# Words that can follow a table name in FROM/JOIN and are not an alias
+CLAUSE_KEYWORDS = frozenset((
+    'WHERE', 'INDEXED', 'NOT', 'ON', 'USING', 'JOIN', 'LEFT', 'RIGHT', 'FULL', 'INNER', 'OUTER', 'CROSS',
+    'NATURAL', 'GROUP', 'ORDER', 'HAVING', 'LIMIT', 'WINDOW', 'UNION', 'EXCEPT', 'INTERSECT', 'SET',
+    'VALUES', 'DEFAULT', 'RETURNING',
+))
+
+logger = logging.getLogger('expense_tracker.query_audit')
+
+class QueryPlanAuditor:
+    """Explains statements and collects full scans of ``watched_tables``"""
+
+    def __init__(self, watched_tables=DEFAULT_WATCHED_TABLES):
+        self.watched_tables = tuple(watched_tables)
+        self._references = re.compile(
+            r'(?:\bFROM|\bJOIN|,)\s*(%s)\b(?:\s+(?:AS\s+)?(\w+))?' % '|'.join(map(re.escape, watched_tables)),
+            re.IGNORECASE
+        )
+        self._plans = {}
+        self._reported = set()
+        self._lock = threading.Lock()
+        self.findings = []
+
+    def check(self, conn, sql, parameters=()):
+        """Explain ``sql`` (once per distinct text) and record any watched scan"""
+        if not sql.lstrip().upper().startswith(AUDITED_STATEMENTS):
+            return
+        scans = self._plans.get(sql)
+        if scans is None:
+            try:
+                plan = sqlite3.Connection.execute(conn, 'EXPLAIN QUERY PLAN ' + sql, parameters).fetchall()
+            except sqlite3.Error:
+                return
+            scan = self.scan_pattern(sql)
+            scans = [row[3] for row in plan if scan.match(row[3])]
+            self._plans[sql] = scans
+        if not scans:
+            return
+        route = request.url_rule.rule if has_request_context() and request.url_rule else None
+        with self._lock:
+            if (route, sql) in self._reported:
+                return
+            self._reported.add((route, sql))
+            self.findings.append({'route': route, 'sql': ' '.join(sql.split()), 'plan': scans})
+        logger.warning('Full scan (%s) from %s: %s', '; '.join(scans), route or 'outside a request', ' '.join(sql.split()))
+
+    def scan_pattern(self, sql):
+        """Plan lines that scan a watched table, by name or by any alias
+        ``sql`` gives one (EXPLAIN reports ``SCAN t`` for ``FROM expenses t``)"""
+        names = set(self.watched_tables)
+        for table, alias in self._references.findall(sql):
+            if alias and alias.upper() not in CLAUSE_KEYWORDS:
+                names.add(alias)
+        return re.compile(r'^SCAN (?:TABLE )?(%s)\b' % '|'.join(map(re.escape, sorted(names))))
+
+    def report(self):
+        return '\n'.join(
+            f"{finding['route'] or '-'}: {'; '.join(finding['plan'])}\n    {finding['sql']}"
+            for finding in self.findings
+        )
+
+    def reset(self):
+        with self._lock:
+            self._reported.clear()
+            self.findings = []
+
+try:
+    import pytest
+except ImportError:
+    pytest = None
+
+if pytest is not None:
+    @pytest.fixture
+    def query_plan_audit():
+        """Fail the test if a statement it ran scans expenses or savings"""
+        auditor = QueryPlanAuditor()
+        previous = database.set_query_auditor(auditor)
+        try:
+            yield auditor
+        finally:
+            database.set_query_auditor(previous)
+        if auditor.findings:
+            pytest.fail('Full table scans:\n' + auditor.report(), pytrace=False)
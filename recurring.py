@@ -0,0 +1,153 @@
+"""Recurring expenses: schedule arithmetic and the background materializer.
+
+A rule in ``recurring_expenses`` produces one expense per occurrence from
+``start_date`` until ``end_date`` (if any). ``next_date`` is the first
+occurrence not yet written. Due occurrences are inserted in batched write
+transactions of the storage session, each of which also advances
+``next_date``. The insert is ``ON CONFLICT DO NOTHING`` against a unique
+(recurring_id, date) index, so a pass that is repeated, interrupted or raced
+by another worker never duplicates an expense. The rollup, search and
+change-tracking triggers on ``expenses`` keep every aggregate consistent
+within the same transaction.
+"""
+import calendar
+import logging
+import os
+import threading
+from datetime import date, datetime, timedelta
+
+FREQUENCIES = ('daily', 'weekly', 'monthly', 'yearly')
+DEFAULT_INTERVAL = 300          # seconds between background passes
+DEFAULT_BATCH_SIZE = 500        # rules per transaction
+MAX_OCCURRENCES_PER_BATCH = 10000  # bounds how long one transaction holds the write lock
+
+logger = logging.getLogger('expense_tracker.recurring')
+
+def next_occurrence(frequency, interval, anchor, current):
+    """The occurrence after ``current`` of a rule starting on ``anchor``.
+
+    Monthly and yearly rules keep the anchor's day of month, falling back to
+    the last day of shorter months (Jan 31, Feb 28, Mar 31, ...).
+    """
+    if frequency == 'daily':
+        return current + timedelta(days=interval)
+    if frequency == 'weekly':
+        return current + timedelta(weeks=interval)
+    months = current.year * 12 + current.month - 1 + interval * (12 if frequency == 'yearly' else 1)
+    year, month = divmod(months, 12)
+    return date(year, month + 1, min(anchor.day, calendar.monthrange(year, month + 1)[1]))
+
+def _materialize_batch(db, today, batch_size):
+    rules = db.execute(
+        '''SELECT id, user_id, amount, category, payment_mode, notes, frequency, interval,
+                  start_date, end_date, next_date
+           FROM recurring_expenses
+           WHERE active = 1 AND next_date <= ?
+           ORDER BY next_date, id LIMIT ?''' + db.row_lock,
+        (today.isoformat(), batch_size)
+    ).fetchall()
+    expenses, updates, user_ids, behind = [], [], set(), False
+    budget = MAX_OCCURRENCES_PER_BATCH
+    for rule in rules:
+        if not budget:
+            behind = True
+            break
+        anchor = date.fromisoformat(rule['start_date'])
+        current = date.fromisoformat(rule['next_date'])
+        end_date = date.fromisoformat(rule['end_date']) if rule['end_date'] else None
+        last = min(today, end_date) if end_date else today
+        count = 0
+        while current <= last and count < budget:
+            expenses.append((rule['user_id'], rule['amount'], rule['category'], current.isoformat(),
+                             rule['payment_mode'], rule['notes'], rule['id']))
+            current = next_occurrence(rule['frequency'], rule['interval'], anchor, current)
+            count += 1
+        finished = end_date is not None and current > end_date
+        behind = behind or current <= last
+        budget -= count
+        updates.append((current.isoformat(), 0 if finished else 1, rule['id']))
+        if count:
+            user_ids.add(rule['user_id'])
+    db.executemany(
+        '''INSERT INTO expenses (user_id, amount, category, date, payment_mode, notes, recurring_id)
+           VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT DO NOTHING''',
+        expenses
+    )
+    db.executemany('UPDATE recurring_expenses SET next_date = ?, active = ? WHERE id = ?', updates)
+    return [rule_id for _, _, rule_id in updates], len(expenses), user_ids, behind
+
+def materialize_due(db, today, batch_size=DEFAULT_BATCH_SIZE, on_change=None):
+    """Write every occurrence due up to ``today`` for all users of a storage
+    session's store.
+
+    Works through the due rules ``batch_size`` (and at most
+    MAX_OCCURRENCES_PER_BATCH occurrences) at a time, one transaction per
+    batch, so a long catch-up never holds the write lock for long.
+    ``on_change(user_ids)`` is called after each committed batch. Returns
+    the number of rules processed and of occurrences written (including
+    ones that already existed).
+    """
+    rule_ids, occurrences = set(), 0
+    while True:
+        batch_rules, batch_occurrences, user_ids, behind = db.write(
+            lambda db: _materialize_batch(db, today, batch_size)
+        )
+        rule_ids.update(batch_rules)
+        occurrences += batch_occurrences
+        if user_ids and on_change is not None:
+            on_change(user_ids)
+        if len(batch_rules) < batch_size and not behind:
+            return {'rules': len(rule_ids), 'occurrences': occurrences}
+
+class RecurringScheduler:
+    """Runs materialize_due() over every store of a storage (each SQLite
+    shard, or the server) on a daemon thread every ``interval`` seconds.
+
+    The thread is started lazily (and again after a fork) by
+    ensure_started(); wake() asks for a pass right away, e.g. after a rule
+    is created. Every worker process may run one: passes are idempotent and
+    serialized by each shard's write lock (on the server, by locking the
+    due rules).
+    """
+
+    def __init__(self, storage, interval=DEFAULT_INTERVAL, batch_size=DEFAULT_BATCH_SIZE, on_change=None):
+        self.storage = storage
+        self.interval = interval
+        self.batch_size = batch_size
+        self.on_change = on_change
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._wake = threading.Event()
+                threading.Thread(target=self._run, name='recurring-scheduler', daemon=True).start()
+                self._pid = os.getpid()
+
+    def wake(self):
+        self._wake.set()
+
+    def run_once(self, today=None):
+        """One pass over every store"""
+        today = today or datetime.now().date()
+        totals = {'rules': 0, 'occurrences': 0}
+        for db in self.storage.stores():
+            result = materialize_due(db, today, self.batch_size, self.on_change)
+            totals['rules'] += result['rules']
+            totals['occurrences'] += result['occurrences']
+        return totals
+
+    def _run(self):
+        while True:
+            try:
+                result = self.run_once()
+                if result['occurrences']:
+                    logger.info('Materialized %(occurrences)d occurrences of %(rules)d recurring expenses', result)
+            except Exception:
+                logger.exception('Recurring expense pass failed')
+            self._wake.wait(self.interval)
+            self._wake.clear()
@@ -0,0 +1,98 @@
+"""Offline rebalancing: move users' data between shard files.
+
+Run it with the app stopped (``flask --app app rebalance-shards``): workers
+cache where each user lives, so a move is only seen after a restart.
+
+A user is moved in three steps, each in its own transaction: their rows are
+copied to the target shard (after clearing anything a previous interrupted
+move left there), the users directory is pointed at the target, and the rows
+are deleted from the source. The triggers on the copied tables rebuild the
+rollups, search index and change counter on both sides. Ids are local to a
+shard, so moved rows get new ids (recurring_id references are remapped);
+an interrupted run is repaired by running the tool again.
+"""
+from database import get_router, init_database, pooled_connection, run_write, shard_path
+
+# Per-user tables in copy order: recurring rules before the expenses that
+# point at them
+SHARDED_TABLES = ('recurring_expenses', 'expenses', 'savings', 'budget', 'savings_goals')
+COPY_BATCH_SIZE = 1000
+
+def _delete_user(conn, user_id):
+    for table in SHARDED_TABLES:
+        conn.execute(f'DELETE FROM {table} WHERE user_id = ?', (user_id,))
+    # Bumped by the deletes above; the user no longer has data here
+    conn.execute('DELETE FROM user_changes WHERE user_id = ?', (user_id,))
+
+def _copy_user(source, target, user_id):
+    """Copy a user's rows from source to target; returns the number copied"""
+    _delete_user(target, user_id)
+    copied, rule_ids = 0, {}
+    for table in SHARDED_TABLES:
+        cursor = source.execute(f'SELECT * FROM {table} WHERE user_id = ? ORDER BY id', (user_id,))
+        columns = [column[0] for column in cursor.description if column[0] != 'id']
+        insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        while True:
+            rows = cursor.fetchmany(COPY_BATCH_SIZE)
+            if not rows:
+                break
+            values = [[row[column] for column in columns] for row in rows]
+            if table == 'recurring_expenses':
+                for row, row_values in zip(rows, values):
+                    rule_ids[row['id']] = target.execute(insert, row_values).lastrowid
+            else:
+                if table == 'expenses':
+                    position = columns.index('recurring_id')
+                    for row_values in values:
+                        row_values[position] = rule_ids.get(row_values[position])
+                target.executemany(insert, values)
+            copied += len(rows)
+    return copied
+
+def move_user(user_id, shard):
+    """Move one user's data to ``shard``; returns the number of rows moved"""
+    router = get_router()
+    current = router.shard_for(user_id)
+    if current == shard:
+        return 0
+    init_database(shard_path(shard, router.database))
+    with pooled_connection(shard=current) as source, pooled_connection(shard=shard) as target:
+        copied = run_write(target, lambda c: _copy_user(source, c, user_id))
+    with pooled_connection() as directory:
+        run_write(directory, lambda c: c.execute(
+            'INSERT OR REPLACE INTO user_shards (user_id, shard) VALUES (?, ?)', (user_id, shard)
+        ))
+    router.forget(user_id)
+    with pooled_connection(shard=current) as source:
+        run_write(source, lambda c: _delete_user(c, user_id))
+    return copied
+
+def purge_strays():
+    """Delete rows left on a shard that no longer owns their user (after an
+    interrupted move); returns the number of users cleaned up"""
+    router = get_router()
+    purged = 0
+    for shard in router.shards():
+        with pooled_connection(shard=shard) as conn:
+            user_ids = [row[0] for row in conn.execute('SELECT user_id FROM user_changes')]
+            for user_id in user_ids:
+                if router.shard_for(user_id) != shard:
+                    run_write(conn, lambda c: _delete_user(c, user_id))
+                    purged += 1
+    return purged
+
+def rebalance(shard_count, log=print):
+    """Move every user to shard ``user_id % shard_count``, the placement new
+    users get once the app runs with DB_SHARDS set to ``shard_count``.
+    Returns the number of users moved."""
+    with pooled_connection() as directory:
+        user_ids = [row[0] for row in directory.execute('SELECT id FROM users ORDER BY id')]
+    moved = 0
+    for user_id in user_ids:
+        shard = user_id % shard_count
+        if get_router().shard_for(user_id) != shard:
+            rows = move_user(user_id, shard)
+            log(f'Moved user {user_id} to shard {shard} ({rows} rows)')
+            moved += 1
+    purge_strays()
+    return moved
@@ -104,73 +104,104 @@ async function loadBudgets() {
 
     try {
         const currentMonth = new Date().toISOString().slice(0, 7);
-        const response = await fetch(`/api/budget?month=${currentMonth}`);
-        const budgets = await response.json();
-
-        if (budgets.length === 0) {
-            container.innerHTML = `
-                <div class="empty-state">
-                    <div class="empty-state-icon"></div>
-                    <p>No budgets set for this month. Set your first budget above!</p>
-                </div>
-            `;
-            return;
-        }
-
-        container.innerHTML = budgets.map(budget => {
-            const budgetType = budget.type === 'monthly' ? 'Monthly Budget' : `Category: ${budget.category}`;
-            return `
-                <div class="budget-item">
-                    <div class="budget-item-info">
-                        <h4>${budgetType}</h4>
-                        <p>Amount: ₹${budget.amount.toLocaleString('en-IN')} | Month: ${budget.month}</p>
-                    </div>
-                </div>
-            `;
-        }).join('');
+        const response = await fetch(`/api/budget/status?month=${currentMonth}`);
+        const status = await response.json();
+        renderBudgets(status);
     } catch (error) {
         console.error('Error loading budgets:', error);
         container.innerHTML = '<p class="loading">Error loading budgets. Please try again.</p>';
     }
 }
 
+// Render the budget list from a /api/budget/status payload
+function renderBudgets(status) {
+    const container = document.getElementById('budgets-list');
+    const budgets = status.budgets;
+
+    if (budgets.length === 0) {
+        container.innerHTML = `
+            <div class="empty-state">
+                <div class="empty-state-icon"></div>
+                <p>No budgets set for this month. Set your first budget above!</p>
+            </div>
+        `;
+        return;
+    }
+
+    container.innerHTML = budgets.map(budget => {
+        const budgetType = budget.type === 'monthly' ? 'Monthly Budget' : `Category: ${budget.category}`;
+        return `
+            <div class="budget-item">
+                <div class="budget-item-info">
+                    <h4>${budgetType}</h4>
+                    <p>Amount: ₹${budget.amount.toLocaleString('en-IN')} | Month: ${status.month}</p>
+                    <p>Spent: ₹${budget.spent.toLocaleString('en-IN')} (${budget.utilization_percent.toFixed(1)}%) | Projected: ₹${budget.projected_spend.toLocaleString('en-IN')}</p>
+                </div>
+            </div>
+        `;
+    }).join('');
+}
+
 // Update budget status
 async function updateBudgetStatus() {
     try {
-        const response = await fetch('/api/dashboard/summary');
+        const response = await fetch('/api/budget/status');
         const data = await response.json();
+        renderBudgetStatus(data);
+    } catch (error) {
+        console.error('Error updating budget status:', error);
+    }
+}
 
-        const statusDiv = document.getElementById('monthly-budget-status');
-        
-        if (data.monthly_budget === 0) {
-            statusDiv.innerHTML = '';
-            return;
-        }
+// Render the monthly budget banner from a /api/budget/status payload
+function renderBudgetStatus(data) {
+    const statusDiv = document.getElementById('monthly-budget-status');
+    const monthly = data.monthly;
+    
+    if (!monthly || monthly.amount === 0) {
+        statusDiv.innerHTML = '';
+        return;
+    }
 
-        const percent = data.budget_usage_percent;
-        let statusClass = 'success';
-        let statusText = '';
-
-        if (percent >= 100) {
-            statusClass = 'danger';
-            statusText = `⚠️ Budget exceeded! You've spent ${percent.toFixed(1)}% of your monthly budget.`;
-        } else if (percent >= 80) {
-            statusClass = 'warning';
-            statusText = `⚠️ Budget warning! You've used ${percent.toFixed(1)}% of your monthly budget.`;
-        } else {
-            statusText = `✓ Budget on track. You've used ${percent.toFixed(1)}% of your monthly budget.`;
-        }
+    const percent = monthly.utilization_percent;
+    const statusClass = monthly.status;
+    let statusText = '';
 
-        statusDiv.className = `budget-status ${statusClass}`;
-        statusDiv.textContent = statusText;
-    } catch (error) {
-        console.error('Error updating budget status:', error);
+    if (percent >= 100) {
+        statusText = `⚠️ Budget exceeded! You've spent ${percent.toFixed(1)}% of your monthly budget.`;
+    } else if (percent >= 80) {
+        statusText = `⚠️ Budget warning! You've used ${percent.toFixed(1)}% of your monthly budget.`;
+    } else {
+        statusText = `✓ Budget on track. You've used ${percent.toFixed(1)}% of your monthly budget.`;
+    }
+
+    if (percent < 100 && monthly.projected_overspend > 0) {
+        statusText += ` At this rate you will overspend by ₹${monthly.projected_overspend.toLocaleString('en-IN')}.`;
     }
+
+    statusDiv.className = `budget-status ${statusClass}`;
+    statusDiv.textContent = statusText;
 }
 
-// Call updateBudgetStatus periodically
-setInterval(() => {
-    updateBudgetStatus().catch(err => console.error('Error updating budget status:', err));
-}, 30000); // Update every 30 seconds
-updateBudgetStatus().catch(err => console.error('Error updating budget status:', err));
+// Keep the budget status live: the server pushes an update whenever the
+// user's data changes. Browsers without EventSource fall back to polling.
+function subscribeToBudgetUpdates() {
+    if (!window.EventSource) {
+        setInterval(() => {
+            updateBudgetStatus().catch(err => console.error('Error updating budget status:', err));
+        }, 30000); // Update every 30 seconds
+        updateBudgetStatus().catch(err => console.error('Error updating budget status:', err));
+        return;
+    }
+
+    const source = new EventSource('/api/events');
+    source.addEventListener('update', function(event) {
+        const data = JSON.parse(event.data);
+        if (data.budget) {
+            renderBudgetStatus(data.budget);
+            renderBudgets(data.budget);
+        }
+    });
+}
 
+subscribeToBudgetUpdates();
@@ -8,8 +8,29 @@ document.addEventListener('DOMContentLoaded', function() {
     loadDashboardData();
     setupExpenseForm();
     setDefaultDate();
+    subscribeToDashboardUpdates();
 });
 
+// Refresh the dashboard when the server reports a change (from this or
+// another tab); the first event only mirrors what loadDashboardData fetched
+function subscribeToDashboardUpdates() {
+    if (!window.EventSource) {
+        return;
+    }
+    let initial = true;
+    const source = new EventSource('/api/events');
+    source.addEventListener('update', function(event) {
+        if (initial) {
+            initial = false;
+            return;
+        }
+        // The charts change with the summary, so reload the whole bundle
+        if (JSON.parse(event.data).summary) {
+            loadDashboardData();
+        }
+    });
+}
+
 // Set default date to today
 function setDefaultDate() {
     const dateInput = document.getElementById('date');
@@ -18,25 +39,24 @@ function setDefaultDate() {
     }
 }
 
-// Load all dashboard data
+// Load all dashboard data in a single request
 async function loadDashboardData() {
     try {
-        // Load summary cards
-        const summaryResponse = await fetch('/api/dashboard/summary');
-        const summaryData = await summaryResponse.json();
-        updateSummaryCards(summaryData);
-        updateBudgetProgress(summaryData);
-
-        // Load all charts
-        await Promise.all([
-            loadCategoryDistribution(),
-            loadDailyTrend(),
-            loadCategoryBar(),
-            loadPaymentMode(),
-            loadMonthlyComparison(),
-            loadTopExpenses(),
-            loadCumulativeSpending()
-        ]);
+        const response = await fetch('/api/dashboard/bundle');
+        const data = await response.json();
+
+        // Summary cards
+        updateSummaryCards(data.summary);
+        updateBudgetProgress(data.summary);
+
+        // Charts
+        renderCategoryDistribution(data.category_distribution);
+        renderDailyTrend(data.daily_trend);
+        renderCategoryBar(data.category_distribution);
+        renderPaymentMode(data.payment_mode);
+        renderMonthlyComparison(data.monthly_comparison);
+        renderTopExpenses(data.top_expenses);
+        renderCumulativeSpending(data.cumulative);
     } catch (error) {
         console.error('Error loading dashboard data:', error);
     }
@@ -100,12 +120,9 @@ function updateBudgetProgress(data) {
     }
 }
 
-// Load category distribution (Pie Chart)
-async function loadCategoryDistribution() {
+// Render category distribution (Pie Chart)
+function renderCategoryDistribution(data) {
     try {
-        const response = await fetch('/api/dashboard/charts/category-distribution');
-        const data = await response.json();
-
         const ctx = document.getElementById('pieChart').getContext('2d');
         
         if (pieChart) {
@@ -151,12 +168,9 @@ async function loadCategoryDistribution() {
     }
 }
 
-// Load daily trend (Line Chart)
-async function loadDailyTrend() {
+// Render daily trend (Line Chart)
+function renderDailyTrend(data) {
     try {
-        const response = await fetch('/api/dashboard/charts/daily-trend');
-        const data = await response.json();
-
         const ctx = document.getElementById('lineChart').getContext('2d');
         
         if (lineChart) {
@@ -222,12 +236,9 @@ async function loadDailyTrend() {
     }
 }
 
-// Load category bar chart
-async function loadCategoryBar() {
+// Render category bar chart
+function renderCategoryBar(data) {
     try {
-        const response = await fetch('/api/dashboard/charts/category-bar');
-        const data = await response.json();
-
         const ctx = document.getElementById('barChart').getContext('2d');
         
         if (barChart) {
@@ -289,12 +300,9 @@ async function loadCategoryBar() {
     }
 }
 
-// Load payment mode (Donut Chart)
-async function loadPaymentMode() {
+// Render payment mode (Donut Chart)
+function renderPaymentMode(data) {
     try {
-        const response = await fetch('/api/dashboard/charts/payment-mode');
-        const data = await response.json();
-
         const ctx = document.getElementById('donutChart').getContext('2d');
         
         if (donutChart) {
@@ -336,12 +344,9 @@ async function loadPaymentMode() {
     }
 }
 
-// Load monthly comparison
-async function loadMonthlyComparison() {
+// Render monthly comparison
+function renderMonthlyComparison(data) {
     try {
-        const response = await fetch('/api/dashboard/charts/monthly-comparison');
-        const data = await response.json();
-
         const ctx = document.getElementById('monthlyChart').getContext('2d');
         
         if (monthlyChart) {
@@ -403,12 +408,9 @@ async function loadMonthlyComparison() {
     }
 }
 
-// Load top expenses
-async function loadTopExpenses() {
+// Render top expenses
+function renderTopExpenses(data) {
     try {
-        const response = await fetch('/api/dashboard/charts/top-expenses');
-        const data = await response.json();
-
         const ctx = document.getElementById('topExpensesChart').getContext('2d');
         
         if (topExpensesChart) {
@@ -441,12 +443,9 @@ async function loadTopExpenses() {
     }
 }
 
-// Load cumulative spending
-async function loadCumulativeSpending() {
+// Render cumulative spending
+function renderCumulativeSpending(data) {
     try {
-        const response = await fetch('/api/dashboard/charts/cumulative');
-        const data = await response.json();
-
         const ctx = document.getElementById('cumulativeChart').getContext('2d');
         
         if (cumulativeChart) {
@@ -2,10 +2,25 @@
 
 let editingExpenseId = null;
 
+// Paging state: expenses are fetched one page at a time. nextPage is the
+// query parameter of the next page: a keyset cursor, or a page number while
+// searching (search results are ranked by relevance, not by date)
+const PAGE_SIZE = 50;
+const SEARCH_DELAY_MS = 250;
+let nextPage = null;
+let searchTimer = null;
+
+// Facet selections: any number of categories and payment modes
+const selectedFacets = {category: new Set(), payment_mode: new Set()};
+let loadingPage = false;
+const loadedExpenses = new Map();
+
 // Initialize on page load
 document.addEventListener('DOMContentLoaded', function() {
     loadExpenses();
     setupExpenseForm();
+    setupLoadMore();
+    setupSearch();
     setDefaultDate();
 });
 
@@ -17,39 +32,97 @@ function setDefaultDate() {
     }
 }
 
-// Load expenses with optional filters
+// Load the first page of expenses with optional filters
 async function loadExpenses() {
     const container = document.getElementById('expense-list-container');
     container.innerHTML = '<p class="loading">Loading expenses...</p>';
+    nextPage = null;
+    loadedExpenses.clear();
+    updateLoadMoreButton();
+    await loadExpensePage(true);
+}
+
+// Load the next page when the user asks for more
+async function loadMoreExpenses() {
+    if (nextPage) {
+        await loadExpensePage(false);
+    }
+}
+
+// Fetch one page and render it (replacing the list on the first page)
+async function loadExpensePage(firstPage) {
+    if (loadingPage) {
+        return;
+    }
+    loadingPage = true;
+    const container = document.getElementById('expense-list-container');
 
     try {
         const dateFrom = document.getElementById('filter-date-from').value;
         const dateTo = document.getElementById('filter-date-to').value;
-        const category = document.getElementById('filter-category').value;
+        const amountMin = document.getElementById('filter-amount-min').value;
+        const amountMax = document.getElementById('filter-amount-max').value;
+        const sort = document.getElementById('filter-sort').value;
+        const search = document.getElementById('filter-search').value.trim();
 
-        let url = '/api/expenses?';
-        const params = [];
+        const params = [`limit=${PAGE_SIZE}`];
         
+        if (search) params.push(`q=${encodeURIComponent(search)}`);
         if (dateFrom) params.push(`date_from=${dateFrom}`);
         if (dateTo) params.push(`date_to=${dateTo}`);
-        if (category) params.push(`category=${category}`);
+        if (amountMin) params.push(`amount_min=${amountMin}`);
+        if (amountMax) params.push(`amount_max=${amountMax}`);
+        if (!search && sort !== 'date_desc') params.push(`sort=${sort}`);
+        for (const [column, values] of Object.entries(selectedFacets)) {
+            values.forEach(value => params.push(`${column}=${encodeURIComponent(value)}`));
+        }
+        if (!firstPage && nextPage) params.push(nextPage);
 
-        url += params.join('&');
+        const endpoint = search ? '/api/expenses/search?' : '/api/expenses?';
+        const response = await fetch(endpoint + params.join('&'));
+        const page = await response.json();
 
-        const response = await fetch(url);
-        const expenses = await response.json();
+        if (firstPage) {
+            renderFacets(page.facets);
+        }
 
-        if (expenses.length === 0) {
+        if (firstPage && page.items.length === 0) {
             container.innerHTML = `
                 <div class="empty-state">
                     <div class="empty-state-icon"></div>
-                    <p>No expenses found. Add your first expense!</p>
+                    <p>${search ? 'No expenses match your search.' : 'No expenses found. Add your first expense!'}</p>
                 </div>
             `;
+            nextPage = null;
             return;
         }
 
-        container.innerHTML = expenses.map(expense => `
+        page.items.forEach(expense => loadedExpenses.set(expense.id, expense));
+        const html = page.items.map(renderExpenseItem).join('');
+        if (firstPage) {
+            container.innerHTML = html;
+        } else {
+            container.insertAdjacentHTML('beforeend', html);
+        }
+        if (search) {
+            nextPage = page.has_more ? `page=${page.page + 1}` : null;
+        } else {
+            nextPage = page.next_cursor ? `cursor=${encodeURIComponent(page.next_cursor)}` : null;
+        }
+    } catch (error) {
+        console.error('Error loading expenses:', error);
+        if (firstPage) {
+            container.innerHTML = '<p class="loading">Error loading expenses. Please try again.</p>';
+        }
+    } finally {
+        loadingPage = false;
+        updateLoadMoreButton();
+    }
+}
+
+// Render a single expense row
+function renderExpenseItem(expense) {
+    return `
             <div class="expense-item">
                 <div class="expense-info">
                     <h3>₹${expense.amount.toLocaleString('en-IN')}</h3>
@@ -63,13 +136,95 @@ async function loadExpenses() {
                     <button class="btn-delete" onclick="deleteExpense(${expense.id})">Delete</button>
                 </div>
             </div>
-        `).join('');
-    } catch (error) {
-        console.error('Error loading expenses:', error);
-        container.innerHTML = '<p class="loading">Error loading expenses. Please try again.</p>';
+        `;
+}
+
+// Show the "Load More" button only while there are more pages
+function updateLoadMoreButton() {
+    const button = document.getElementById('load-more-expenses');
+    if (button) {
+        button.style.display = nextPage ? '' : 'none';
+        button.disabled = loadingPage;
     }
 }
 
+// Load the next page automatically when the button scrolls into view
+function setupLoadMore() {
+    const button = document.getElementById('load-more-expenses');
+    if (!button || !('IntersectionObserver' in window)) {
+        return;
+    }
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadMoreExpenses();
+        }
+    });
+    observer.observe(button);
+}
+
+// Show per-category and per-mode counts as chips that toggle the filter
+function renderFacets(facets) {
+    const section = document.getElementById('expense-facets');
+    if (!section) {
+        return;
+    }
+    if (!facets) {
+        section.style.display = 'none';
+        return;
+    }
+    section.style.display = '';
+    document.getElementById('facet-total').textContent =
+        `${facets.total.toLocaleString('en-IN')} matching expense${facets.total === 1 ? '' : 's'}`;
+    for (const column of Object.keys(selectedFacets)) {
+        const counts = Object.assign({}, facets[column]);
+        // Keep selected values visible even when nothing matches them
+        selectedFacets[column].forEach(value => { counts[value] = counts[value] || 0; });
+        const container = document.getElementById(`facet-${column}`);
+        container.innerHTML = '';
+        Object.keys(counts).sort().forEach(value => {
+            const chip = document.createElement('button');
+            chip.type = 'button';
+            chip.className = 'facet-chip' + (selectedFacets[column].has(value) ? ' selected' : '');
+            chip.textContent = value;
+            const count = document.createElement('span');
+            count.className = 'facet-count';
+            count.textContent = counts[value].toLocaleString('en-IN');
+            chip.appendChild(count);
+            chip.addEventListener('click', () => toggleFacet(column, value));
+            container.appendChild(chip);
+        });
+    }
+}
+
+// Add or remove one facet value and reload
+function toggleFacet(column, value) {
+    const values = selectedFacets[column];
+    if (values.has(value)) {
+        values.delete(value);
+    } else {
+        values.add(value);
+    }
+    loadExpenses();
+}
+
+// Search as the user types, once they pause
+function setupSearch() {
+    const input = document.getElementById('filter-search');
+    if (!input) {
+        return;
+    }
+    input.addEventListener('input', () => {
+        clearTimeout(searchTimer);
+        searchTimer = setTimeout(loadExpenses, SEARCH_DELAY_MS);
+    });
+    input.addEventListener('keydown', event => {
+        if (event.key === 'Enter') {
+            clearTimeout(searchTimer);
+            loadExpenses();
+        }
+    });
+}
+
 // Apply filters
 function applyFilters() {
     loadExpenses();
@@ -79,16 +234,18 @@ function applyFilters() {
 function clearFilters() {
     document.getElementById('filter-date-from').value = '';
     document.getElementById('filter-date-to').value = '';
-    document.getElementById('filter-category').value = '';
+    document.getElementById('filter-amount-min').value = '';
+    document.getElementById('filter-amount-max').value = '';
+    document.getElementById('filter-sort').value = 'date_desc';
+    document.getElementById('filter-search').value = '';
+    Object.values(selectedFacets).forEach(values => values.clear());
     loadExpenses();
 }
 
 // Edit expense
 async function editExpense(id) {
     try {
-        const response = await fetch('/api/expenses');
-        const expenses = await response.json();
-        const expense = expenses.find(e => e.id === id);
+        const expense = loadedExpenses.get(id);
 
         if (!expense) {
             alert('Expense not found');
@@ -23,20 +23,18 @@ function setDefaultDate() {
 // Load all savings data
 async function loadSavingsData() {
     try {
-        // Load summary cards
-        const summaryResponse = await fetch('/api/savings/summary');
-        const summaryData = await summaryResponse.json();
-        updateSummaryCards(summaryData);
+        // Summary cards and charts come from a single request
+        const response = await fetch('/api/savings/bundle');
+        const data = await response.json();
+        updateSummaryCards(data.summary);
 
         // Load goals
         await loadGoals();
 
-        // Load all charts
-        await Promise.all([
-            loadSavingsGrowth(),
-            loadSourceDistribution(),
-            loadMonthlyComparison()
-        ]);
+        // Charts
+        renderSavingsGrowth(data.growth);
+        renderSourceDistribution(data.source_distribution);
+        renderMonthlyComparison(data.monthly_comparison);
     } catch (error) {
         console.error('Error loading savings data:', error);
     }
@@ -50,12 +48,9 @@ function updateSummaryCards(data) {
     document.getElementById('remaining-to-goal').textContent = `₹${data.remaining_to_goal.toLocaleString('en-IN')}`;
 }
 
-// Load savings growth chart
-async function loadSavingsGrowth() {
+// Render savings growth chart
+function renderSavingsGrowth(data) {
     try {
-        const response = await fetch('/api/savings/charts/growth');
-        const data = await response.json();
-
         const ctx = document.getElementById('growthChart').getContext('2d');
         
         if (growthChart) {
@@ -121,12 +116,9 @@ async function loadSavingsGrowth() {
     }
 }
 
-// Load source distribution chart
-async function loadSourceDistribution() {
+// Render source distribution chart
+function renderSourceDistribution(data) {
     try {
-        const response = await fetch('/api/savings/charts/source-distribution');
-        const data = await response.json();
-
         const ctx = document.getElementById('sourceChart').getContext('2d');
         
         if (sourceChart) {
@@ -170,12 +162,9 @@ async function loadSourceDistribution() {
     }
 }
 
-// Load monthly comparison chart
-async function loadMonthlyComparison() {
+// Render monthly comparison chart
+function renderMonthlyComparison(data) {
     try {
-        const response = await fetch('/api/savings/charts/monthly-comparison');
-        const data = await response.json();
-
         const ctx = document.getElementById('monthlySavingsChart').getContext('2d');
         
         if (monthlySavingsChart) {
@@ -265,6 +254,10 @@ async function loadGoals() {
                        Current: ₹${goal.current_amount.toLocaleString('en-IN')} | 
                        ${goal.target_date ? `Target Date: ${formatDate(goal.target_date)}` : 'No target date'}
                     </p>
+                    <p>${goal.remaining_amount === 0 ? 'Goal reached' :
+                        goal.projected_completion_date ? `Projected: ${formatDate(goal.projected_completion_date)}${goal.on_track === false ? ' (behind target date)' : ''}` :
+                        'No recent savings to project from'}
+                    </p>
                     <div class="progress-bar-wrapper" style="margin-top: 10px;">
                         <div class="progress-bar" style="width: ${Math.min(goal.progress_percent, 100)}%;">
                             <span>${goal.progress_percent.toFixed(1)}%</span>
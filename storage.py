@@ -0,0 +1,999 @@
+"""Storage backends and the repositories the routes call into.
+
+A repository (ExpenseRepo, SavingsRepo, BudgetRepo, GoalRepo, RecurringRepo,
+ChangeRepo, UserRepo) keeps the SQL for one kind of record behind plain
+methods, scoped to one user. Its SQL is written once, in the subset both
+backends run: ``?`` placeholders, TEXT dates and ``RETURNING id``. The few
+places where the backends differ (full-text search, SQLite index hints) are
+chosen by the session's ``dialect``.
+
+A storage hands out repositories over a session, a connection plus a way to
+run a write transaction and to stream a large result:
+
+- SQLiteStorage uses the pooled shard connections of database.py (writes go
+  through run_write, statements are prepared once per connection by the
+  sqlite3 statement cache).
+- PostgresStorage talks to a PostgreSQL server (14 or later) through the
+  optional ``psycopg`` package, with its own connection pool and
+  server-side prepared statements. Its tables, rollups, change tracking and
+  search indexes are created from SERVER_SCHEMA.
+
+create_storage() picks one from the STORAGE_BACKEND and STORAGE_URL config
+keys.
+"""
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_app_context
+
+import database
+from database import (
+    CHANGE_TRACKED_TABLES, DEFAULT_CATEGORIES, DEFAULT_POOL_SIZE, ROLLUPS, SEARCH_ID_MASK, SEARCH_INDEXES,
+    STANDALONE_ROLLUPS, WRITE_RETRIES, WRITE_RETRY_BASE_DELAY, WRITE_RETRY_MAX_DELAY,
+    get_db_connection, get_router, pooled_connection, rebuild_rollups, rebuild_search_index, rollup_sql,
+    run_write, search_rowid_range,
+)
+from instrumentation import current_query_log
+
+STORAGE_BACKENDS = ('sqlite', 'postgres')
+
+class SQLiteSession:
+    """Repository session over a pooled SQLite connection"""
+
+    dialect = 'sqlite'
+    # Write transactions already hold the database's write lock
+    row_lock = ''
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=()):
+        return self.conn.execute(sql, params)
+
+    def executemany(self, sql, params):
+        return self.conn.executemany(sql, params)
+
+    def stream(self, sql, params, size):
+        """Yield the rows of a query ``size`` at a time"""
+        cursor = self.conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(size)
+            if not rows:
+                return
+            yield rows
+
+    def write(self, work):
+        """Run work(session) in one IMMEDIATE transaction; returns its result"""
+        return run_write(self.conn, lambda conn: work(self))
+
+    def close(self):
+        self.conn.close()
+
+_server_statements = {}
+
+def server_sql(sql):
+    """Repository SQL with ``?`` placeholders in psycopg's ``%s`` style"""
+    translated = _server_statements.get(sql)
+    if translated is None:
+        translated = _server_statements[sql] = sql.replace('%', '%%').replace('?', '%s')
+    return translated
+
+class ServerRow(tuple):
+    """Server result row that, like sqlite3.Row, is a tuple also indexed by column name"""
+
+    def __new__(cls, values, names):
+        row = super().__new__(cls, values)
+        row.names = names
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self.names[key]
+        return super().__getitem__(key)
+
+    def keys(self):
+        return list(self.names)
+
+def server_rows(cursor):
+    """psycopg row factory producing ServerRow"""
+    names = {column.name: i for i, column in enumerate(cursor.description or ())}
+    return lambda values: ServerRow(values, names)
+
+# Deadlock and serialization failures: the server rolled the transaction back
+# and running it again is safe
+RETRYABLE_SQLSTATES = ('40001', '40P01')
+
+class ServerSession:
+    """Repository session over a pooled server connection.
+
+    Every statement is prepared on the server (once per connection) the
+    first time it runs there and timed into the request's QueryLog; writes
+    run in one transaction.
+    """
+
+    dialect = 'postgres'
+    # READ COMMITTED lets a read-modify-write race other writers otherwise
+    row_lock = ' FOR UPDATE'
+
+    def __init__(self, conn, pool):
+        self.conn = conn
+        self.pool = pool
+        self.request_bound = False
+
+    def execute(self, sql, params=()):
+        started = time.perf_counter()
+        cursor = self.conn.execute(server_sql(sql), params, prepare=True)
+        query_log = current_query_log()
+        if query_log is not None:
+            query_log.add(sql, time.perf_counter() - started, max(cursor.rowcount, 0))
+        return cursor
+
+    def executemany(self, sql, params):
+        cursor = self.conn.cursor()
+        cursor.executemany(server_sql(sql), params)
+        return cursor
+
+    def stream(self, sql, params, size):
+        """Yield the rows of a query ``size`` at a time from a server-side cursor"""
+        with self.conn.transaction():
+            with self.conn.cursor(name='stream') as cursor:
+                cursor.execute(server_sql(sql), params)
+                while True:
+                    rows = cursor.fetchmany(size)
+                    if not rows:
+                        return
+                    yield rows
+
+    def write(self, work):
+        """Run work(session) in one transaction (a savepoint inside another)
+        and return its result, retrying with jittered backoff when the
+        server aborts it as a deadlock or serialization failure"""
+        if self.conn.info.transaction_status:
+            with self.conn.transaction():
+                return work(self)
+        delay = WRITE_RETRY_BASE_DELAY
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                with self.conn.transaction():
+                    return work(self)
+            except Exception as e:
+                if getattr(e, 'sqlstate', None) not in RETRYABLE_SQLSTATES or attempt == WRITE_RETRIES:
+                    raise
+            time.sleep(delay + random.uniform(0, delay))
+            delay = min(delay * 2, WRITE_RETRY_MAX_DELAY)
+
+    def close(self):
+        if self.conn is not None and not self.request_bound:
+            self.pool.release(self.conn)
+            self.conn = None
+
+def filter_sql(conditions, alias=''):
+    """`` AND ...`` SQL and parameters for (column, operator, value)
+    conditions; the value of an ``IN`` condition is a list"""
+    sql, params = '', []
+    for column, operator, value in conditions:
+        if operator == 'IN':
+            sql += f" AND {alias}{column} IN ({', '.join('?' * len(value))})"
+            params += value
+        else:
+            sql += f' AND {alias}{column} {operator} ?'
+            params.append(value)
+    return sql, params
+
+def _prefix_last(terms):
+    # Single-letter prefixes would expand to most of the vocabulary
+    return len(terms[-1]) > 1
+
+def fts_match(terms):
+    """FTS5 query: every term must occur, the last one as a prefix"""
+    words = [f'"{term}"' for term in terms]
+    if _prefix_last(terms):
+        words[-1] += '*'
+    return ' '.join(words)
+
+def server_tsquery(terms):
+    """to_tsquery() text for the same search on the server"""
+    words = [f"'{term}'" for term in terms]
+    if _prefix_last(terms):
+        words[-1] += ':*'
+    return ' & '.join(words)
+
+def server_search_document(table, alias=''):
+    """tsvector of a row's SEARCH_INDEXES columns, with notes weighted A"""
+    columns = [f"coalesce({alias}{column}, '')" for column in SEARCH_INDEXES[table][1]]
+    rest = " || ' ' || ".join(columns[1:])
+    return f"setweight(to_tsvector('simple', {columns[0]}), 'A') || to_tsvector('simple', {rest})"
+
+# ts_rank weights of D (the other columns), C, B and A (notes): the same 4:1
+# as the BM25 weights of the SQLite search
+SERVER_SEARCH_WEIGHTS = '{0.25, 0.2, 0.4, 1.0}'
+
+class Repo:
+    """Base repository: SQL for one user's records over a session"""
+
+    def __init__(self, db, user_id=None):
+        self.db = db
+        self.user_id = user_id
+
+    def _all(self, sql, params=()):
+        return self.db.execute(sql, params).fetchall()
+
+    def _one(self, sql, params=()):
+        return self.db.execute(sql, params).fetchone()
+
+    def _insert(self, sql, params):
+        return self.db.execute(sql + ' RETURNING id', params).fetchone()[0]
+
+    def transaction(self, work):
+        """Run work(repo) as one write transaction; returns its result"""
+        return self.db.write(lambda db: work(self))
+
+class LedgerRepo(Repo):
+    """Shared reads of the dated ledgers (expenses, savings) and their rollups"""
+
+    table = None
+    daily_table = None
+    monthly_table = None
+
+    def page(self, conditions=(), column='date', direction='DESC', limit=None, after=None, index=None):
+        """The user's rows matching ``conditions`` in (column, id) order.
+
+        ``after`` is the (value, id) of the last row of the previous page;
+        ``index`` names an index for SQLite to walk (see ExpenseRepo.page_index).
+        """
+        sql, params = self._select(conditions, column, direction, after, index)
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return self._all(sql, params)
+
+    def batches(self, conditions, column, direction, size):
+        """Every matching row, ``size`` at a time without materializing them"""
+        sql, params = self._select(conditions, column, direction)
+        return self.db.stream(sql, params, size)
+
+    def _select(self, conditions, column, direction, after=None, index=None):
+        source = f'{self.table} INDEXED BY {index}' if index and self.db.dialect == 'sqlite' else self.table
+        filters, params = filter_sql(conditions)
+        sql = f'SELECT * FROM {source} WHERE user_id = ?' + filters
+        params = [self.user_id] + params
+        if after is not None:
+            past = '<' if direction == 'DESC' else '>'
+            sql += f' AND ({column} {past} ? OR ({column} = ? AND id {past} ?))'
+            params += [after[0], after[0], after[1]]
+        return sql + f' ORDER BY {column} {direction}, id {direction}', params
+
+    def search(self, terms, conditions=(), limit=50, offset=0):
+        """The user's rows containing every search term (the last as a
+        prefix), best first, each with a relevance ``score`` (higher is
+        better). Notes weigh four times the other columns and newer rows
+        come first on ties; ``conditions`` filter the matches."""
+        filters, params = filter_sql(conditions, 't.')
+        if self.db.dialect == 'postgres':
+            document = server_search_document(self.table, 't.')
+            return self._all(
+                f'''SELECT t.*, ts_rank('{SERVER_SEARCH_WEIGHTS}', {document}, q) AS score
+                   FROM {self.table} t, to_tsquery('simple', ?) q
+                   WHERE t.user_id = ? AND {document} @@ q{filters}
+                   ORDER BY score DESC, t.id DESC LIMIT ? OFFSET ?''',
+                [server_tsquery(terms), self.user_id] + params + [limit, offset]
+            )
+        # All of the user's matches are ranked by BM25 within their rowid
+        # range; only the rows of the requested page are then read
+        index, columns = SEARCH_INDEXES[self.table]
+        weights = ', '.join(['4.0'] + ['1.0'] * (len(columns) - 1))
+        first_rowid, last_rowid = search_rowid_range(self.user_id)
+        # Only look up the matched rows before ranking when filtering on them
+        join = f' JOIN {self.table} t ON t.id = {index}.rowid & {SEARCH_ID_MASK}' if filters else ''
+        return self._all(
+            f'''SELECT t.*, -m.score AS score FROM (
+                   SELECT {index}.rowid AS rowid, bm25({index}, {weights}) AS score
+                   FROM {index}{join}
+                   WHERE {index} MATCH ? AND {index}.rowid BETWEEN ? AND ?{filters}
+                   ORDER BY score, {index}.rowid DESC LIMIT ? OFFSET ?) m
+               JOIN {self.table} t ON t.id = m.rowid & {SEARCH_ID_MASK}
+               ORDER BY m.score, m.rowid DESC''',
+            [fts_match(terms), first_rowid, last_rowid] + params + [limit, offset]
+        )
+
+    def daily_totals(self, group_by, start=None, end=None):
+        """Totals from the daily rollup per ``group_by`` columns (e.g.
+        ('date',) or ('category',)) between two dates if given, ordered by
+        those columns"""
+        return self._totals(self.daily_table, 'date', group_by, start, end)
+
+    def monthly_totals(self, group_by, first=None, last=None):
+        """Totals from the monthly rollup per ``group_by`` columns between two
+        YYYY-MM months if given, ordered by those columns"""
+        return self._totals(self.monthly_table, 'month', group_by, first, last)
+
+    def _totals(self, table, column, group_by, start, end):
+        columns = ', '.join(group_by)
+        sql, params = f'SELECT {columns}, SUM(total) AS total FROM {table} WHERE user_id = ?', [self.user_id]
+        if start:
+            sql += f' AND {column} >= ?'
+            params.append(start)
+        if end:
+            sql += f' AND {column} <= ?'
+            params.append(end)
+        return self._all(sql + f' GROUP BY {columns} ORDER BY {columns}', params)
+
+class ExpenseRepo(LedgerRepo):
+    table = 'expenses'
+    daily_table = 'expense_daily_totals'
+    monthly_table = 'expense_monthly_totals'
+
+    def add(self, amount, category, date, payment_mode, notes=''):
+        return self.db.write(lambda db: self._insert(
+            'INSERT INTO expenses (user_id, amount, category, date, payment_mode, notes) VALUES (?, ?, ?, ?, ?, ?)',
+            (self.user_id, amount, category, date, payment_mode, notes)
+        ))
+
+    def add_many(self, rows):
+        """Insert (amount, category, date, payment_mode, notes) tuples in one transaction"""
+        self.db.write(lambda db: db.executemany(
+            'INSERT INTO expenses (user_id, amount, category, date, payment_mode, notes) VALUES (?, ?, ?, ?, ?, ?)',
+            [(self.user_id,) + tuple(row) for row in rows]
+        ))
+        return len(rows)
+
+    def get(self, expense_id):
+        return self._one('SELECT * FROM expenses WHERE id = ? AND user_id = ?', (expense_id, self.user_id))
+
+    def update(self, expense_id, amount, category, date, payment_mode, notes=''):
+        """Returns whether the user had such an expense"""
+        return self.db.write(lambda db: db.execute(
+            '''UPDATE expenses SET amount = ?, category = ?, date = ?, payment_mode = ?, notes = ?
+               WHERE id = ? AND user_id = ?''',
+            (amount, category, date, payment_mode, notes, expense_id, self.user_id)
+        ).rowcount > 0)
+
+    def delete(self, expense_id):
+        return self.db.write(lambda db: db.execute(
+            'DELETE FROM expenses WHERE id = ? AND user_id = ?', (expense_id, self.user_id)
+        ).rowcount > 0)
+
+    def largest(self, start, end, limit):
+        """(category, amount, date) of the biggest expenses between two dates"""
+        return self._all(
+            '''SELECT category, amount, date
+               FROM expenses
+               WHERE user_id = ? AND date >= ? AND date <= ?
+               ORDER BY amount DESC
+               LIMIT ?''',
+            (self.user_id, start, end, limit)
+        )
+
+    def facet_counts(self, ranges=()):
+        """(category, payment_mode, count) groups of the user's expenses
+        within the date/amount ``ranges`` conditions.
+
+        Comes from the facet rollup (no ranges), the daily rollup (dates
+        only) or, with an amount range, a covering index seeked per
+        (category, mode) pair.
+        """
+        columns = {column for column, _, _ in ranges}
+        filters, params = filter_sql(ranges)
+        if 'amount' not in columns:
+            if filters:
+                return self._all(
+                    f'''SELECT category, payment_mode, SUM(count) FROM expense_daily_totals
+                        WHERE user_id = ?{filters} GROUP BY category, payment_mode''',
+                    [self.user_id] + params
+                )
+            return self._all(
+                'SELECT category, payment_mode, count FROM expense_facet_totals WHERE user_id = ?', (self.user_id,)
+            )
+        pairs = self._all(
+            'SELECT category, payment_mode FROM expense_facet_totals WHERE user_id = ?', (self.user_id,)
+        )
+        if not pairs:
+            return []
+        categories = sorted({row[0] for row in pairs})
+        modes = sorted({row[1] for row in pairs})
+        index = 'idx_expenses_facets_date' if 'date' in columns else 'idx_expenses_facets_amount'
+        source = f'expenses INDEXED BY {index}' if self.db.dialect == 'sqlite' else 'expenses'
+        return self._all(
+            f'''SELECT category, payment_mode, COUNT(*) FROM {source}
+               WHERE user_id = ? AND category IN ({', '.join('?' * len(categories))})
+               AND payment_mode IN ({', '.join('?' * len(modes))}){filters}
+               GROUP BY category, payment_mode''',
+            [self.user_id] + categories + modes + params
+        )
+
+    def page_index(self, column, matching, limit, amounts, facets):
+        """Index for SQLite to walk for one page of the filtered list (None
+        leaves the choice to the planner, as on the server).
+
+        Walking the sort column's index stops after about limit * total /
+        matching rows, while seeking the filtered rows through a filter index
+        reads (and sorts) all ``matching`` of them; the first wins unless the
+        filters keep fewer than sqrt(limit * total) rows. ``matching`` comes
+        from the facet counts; SQLite's own estimate cannot tell a wide
+        amount range from a narrow one. ``amounts`` and ``facets`` say
+        whether an amount range or category/mode filter is set.
+        """
+        if self.db.dialect != 'sqlite':
+            return None
+        total = self._one(
+            'SELECT COALESCE(SUM(count), 0) FROM expense_facet_totals WHERE user_id = ?', (self.user_id,)
+        )[0]
+        if matching * matching >= limit * total or not (amounts or facets):
+            return 'idx_expenses_user_amount' if column == 'amount' else 'idx_expenses_user_date_amount'
+        if facets:
+            return 'idx_expenses_facets_amount' if amounts else 'idx_expenses_facets_date'
+        return 'idx_expenses_user_amount'
+
+    def recent_amounts(self, start, end, limit):
+        """(category, amount) of the newest ``limit`` expenses between two dates"""
+        return self._all(
+            '''SELECT category, amount FROM expenses
+               WHERE user_id = ? AND date >= ? AND date <= ?
+               ORDER BY date DESC LIMIT ?''',
+            (self.user_id, start, end, limit)
+        )
+
+    def largest_above(self, cutoffs, start, end, limit):
+        """Up to ``limit`` of the largest expenses of each category above its
+        cut-off ({category: amount}) between two dates, read from the
+        (user_id, category, amount) index from the top down"""
+        per_category = '''SELECT * FROM (
+            SELECT id, date, category, amount, payment_mode, notes FROM expenses
+            WHERE user_id = ? AND category = ? AND amount > ? AND date >= ? AND date <= ?
+            ORDER BY amount DESC LIMIT ?) AS largest'''
+        params = []
+        for category, cutoff in cutoffs.items():
+            params += [self.user_id, category, cutoff, start, end, limit]
+        return self._all(' UNION ALL '.join([per_category] * len(cutoffs)), params)
+
+class SavingsRepo(LedgerRepo):
+    table = 'savings'
+    daily_table = 'savings_daily_totals'
+    monthly_table = 'savings_monthly_totals'
+
+    def add(self, amount, source, date, notes=''):
+        return self.db.write(lambda db: self._insert(
+            'INSERT INTO savings (user_id, amount, source, date, notes) VALUES (?, ?, ?, ?, ?)',
+            (self.user_id, amount, source, date, notes)
+        ))
+
+    def update(self, saving_id, amount, source, date, notes=''):
+        return self.db.write(lambda db: db.execute(
+            'UPDATE savings SET amount = ?, source = ?, date = ?, notes = ? WHERE id = ? AND user_id = ?',
+            (amount, source, date, notes, saving_id, self.user_id)
+        ).rowcount > 0)
+
+    def delete(self, saving_id):
+        return self.db.write(lambda db: db.execute(
+            'DELETE FROM savings WHERE id = ? AND user_id = ?', (saving_id, self.user_id)
+        ).rowcount > 0)
+
+    def total(self):
+        """All-time savings of the user from the maintained savings_totals row"""
+        row = self._one('SELECT total FROM savings_totals WHERE user_id = ?', (self.user_id,))
+        return row[0] if row else 0
+
+class BudgetRepo(Repo):
+    def for_month(self, month):
+        return self._all('SELECT * FROM budget WHERE user_id = ? AND month = ?', (self.user_id, month))
+
+    def amount(self, budget_type, month):
+        """Amount of the user's budget of a type and month (0 without one)"""
+        row = self._one(
+            'SELECT amount FROM budget WHERE user_id = ? AND type = ? AND month = ?', (self.user_id, budget_type, month)
+        )
+        return row['amount'] if row else 0
+
+    def status(self, month):
+        """Every budget of a YYYY-MM month with the month's spend it covers
+        (its category's, or all of it for an overall budget), overall first.
+
+        Budgets and the per-category spend from the daily rollup are joined
+        in a single query.
+        """
+        return self._all(
+            '''WITH spend AS (
+                   SELECT category, SUM(total) AS spent
+                   FROM expense_daily_totals
+                   WHERE user_id = ? AND date >= ? AND date <= ?
+                   GROUP BY category
+               )
+               SELECT b.id, b.type, b.category, b.amount,
+                      CASE WHEN b.category IS NULL
+                           THEN (SELECT COALESCE(SUM(spent), 0) FROM spend)
+                           ELSE COALESCE(s.spent, 0) END AS spent
+               FROM budget b
+               LEFT JOIN spend s ON s.category = b.category
+               WHERE b.user_id = ? AND b.month = ?
+               ORDER BY b.category IS NOT NULL, b.category''',
+            (self.user_id, f'{month}-01', f'{month}-31', self.user_id, month)
+        )
+
+    def set(self, amount, budget_type, month, category=None):
+        """Create or replace the user's budget of a type, month and (optional) category"""
+        match = 'user_id = ? AND type = ? AND month = ? AND ' + ('category = ?' if category else 'category IS NULL')
+        key = (self.user_id, budget_type, month) + ((category,) if category else ())
+
+        def save(db):
+            if self._one(f'SELECT id FROM budget WHERE {match}', key):
+                db.execute(f'UPDATE budget SET amount = ? WHERE {match}', (amount,) + key)
+            else:
+                self._insert(
+                    'INSERT INTO budget (user_id, amount, type, month, category) VALUES (?, ?, ?, ?, ?)',
+                    (self.user_id, amount, budget_type, month, category or None)
+                )
+        self.db.write(save)
+
+class GoalRepo(Repo):
+    def list(self):
+        return self._all('SELECT * FROM savings_goals WHERE user_id = ? ORDER BY created_at DESC', (self.user_id,))
+
+    def newest(self):
+        """The user's most recently created goal (the active one), or None"""
+        return self._one(
+            'SELECT goal_name, target_amount, target_date FROM savings_goals WHERE user_id = ? ORDER BY created_at DESC LIMIT 1',
+            (self.user_id,)
+        )
+
+    def add(self, goal_name, target_amount, target_date=None):
+        return self.db.write(lambda db: self._insert(
+            'INSERT INTO savings_goals (user_id, goal_name, target_amount, target_date) VALUES (?, ?, ?, ?)',
+            (self.user_id, goal_name, target_amount, target_date)
+        ))
+
+    def delete(self, goal_id):
+        return self.db.write(lambda db: db.execute(
+            'DELETE FROM savings_goals WHERE id = ? AND user_id = ?', (goal_id, self.user_id)
+        ).rowcount > 0)
+
+class RecurringRepo(Repo):
+    def list(self):
+        return self._all(
+            'SELECT * FROM recurring_expenses WHERE user_id = ? ORDER BY active DESC, next_date', (self.user_id,)
+        )
+
+    def get(self, rule_id):
+        """A rule of the user, locked against concurrent passes inside a transaction"""
+        return self._one(
+            'SELECT * FROM recurring_expenses WHERE id = ? AND user_id = ?' + self.db.row_lock, (rule_id, self.user_id)
+        )
+
+    def add(self, amount, category, payment_mode, notes, frequency, interval, start_date, end_date=None):
+        """New rule whose first occurrence is start_date"""
+        return self.db.write(lambda db: self._insert(
+            '''INSERT INTO recurring_expenses (user_id, amount, category, payment_mode, notes,
+               frequency, interval, start_date, end_date, next_date) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            (self.user_id, amount, category, payment_mode, notes, frequency, interval, start_date, end_date, start_date)
+        ))
+
+    def update(self, rule_id, amount, category, payment_mode, notes, end_date, next_date, active):
+        self.db.execute(
+            '''UPDATE recurring_expenses SET amount = ?, category = ?, payment_mode = ?, notes = ?,
+               end_date = ?, next_date = ?, active = ? WHERE id = ? AND user_id = ?''',
+            (amount, category, payment_mode, notes, end_date, next_date, int(active), rule_id, self.user_id)
+        )
+
+    def delete(self, rule_id):
+        return self.db.write(lambda db: db.execute(
+            'DELETE FROM recurring_expenses WHERE id = ? AND user_id = ?', (rule_id, self.user_id)
+        ).rowcount > 0)
+
+class ChangeRepo(Repo):
+    """The user's change counter, bumped by triggers on every write to their data"""
+
+    def version(self):
+        """Current counter (0 if the user never wrote anything)"""
+        row = self._one('SELECT version FROM user_changes WHERE user_id = ?', (self.user_id,))
+        return row[0] if row else 0
+
+class UserRepo(Repo):
+    """Accounts and profiles in the users directory.
+
+    ``on_created(session, user_id)`` runs inside the transaction creating an
+    account (SQLiteStorage places the user on a shard there).
+    """
+
+    def __init__(self, db, on_created=None):
+        super().__init__(db)
+        self.on_created = on_created
+
+    def by_email(self, email):
+        return self._one('SELECT id, email, password, name FROM users WHERE email = ?', (email,))
+
+    def create(self, email, password_hash, name):
+        def create(db):
+            user_id = self._insert('INSERT INTO users (email, password, name) VALUES (?, ?, ?)',
+                                   (email, password_hash, name))
+            if self.on_created is not None:
+                self.on_created(db, user_id)
+            return user_id
+        return self.db.write(create)
+
+    def context(self, user_id):
+        """Name, email and profile columns of a user"""
+        return self._one(
+            """SELECT u.name, u.email, p.about, p.vision_year, p.vision_month, p.company
+               FROM users u LEFT JOIN user_profile p ON p.user_id = u.id
+               WHERE u.id = ?""",
+            (user_id,)
+        )
+
+    def save_profile(self, user_id, about, vision_year, vision_month, company):
+        def save(db):
+            values = (about, vision_year, vision_month, company, user_id)
+            if self._one('SELECT id FROM user_profile WHERE user_id = ?', (user_id,)):
+                db.execute(
+                    '''UPDATE user_profile SET about = ?, vision_year = ?, vision_month = ?,
+                       company = ?, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?''',
+                    values
+                )
+            else:
+                db.execute(
+                    'INSERT INTO user_profile (about, vision_year, vision_month, company, user_id) VALUES (?, ?, ?, ?, ?)',
+                    values
+                )
+        self.db.write(save)
+
+    def category_names(self):
+        return {row['name'] for row in self._all('SELECT name FROM categories')}
+
+class Storage:
+    """Hands out repositories; subclasses provide session(user_id),
+    connect(user_id) and stores().
+
+    session(None) is the users directory, session(user_id) the store
+    holding that user's data. Inside a request a session is bound to the
+    request; connect() gives one that is not, e.g. for a streamed response
+    or a background thread.
+    """
+
+    # What a failed statement raises on this backend
+    errors = (sqlite3.Error,)
+
+    def expenses(self, user_id):
+        return ExpenseRepo(self.session(user_id), user_id)
+
+    def savings(self, user_id):
+        return SavingsRepo(self.session(user_id), user_id)
+
+    def budgets(self, user_id):
+        return BudgetRepo(self.session(user_id), user_id)
+
+    def goals(self, user_id):
+        return GoalRepo(self.session(user_id), user_id)
+
+    def recurring(self, user_id):
+        return RecurringRepo(self.session(user_id), user_id)
+
+    def changes(self, user_id):
+        return ChangeRepo(self.session(user_id), user_id)
+
+    def users(self):
+        return UserRepo(self.session(None))
+
+    def rebuild_rollups(self):
+        """Recompute every rollup table from the raw expenses and savings rows"""
+        for db in self.stores():
+            db.write(rebuild_rollups)
+
+class SQLiteStorage(Storage):
+    """Repositories over the SQLite shards, routed by database.get_db_connection"""
+
+    def init_app(self, app):
+        """Configure the pools and shards and bring every shard file up to date"""
+        database.init_app(app)
+        database.init_db()
+
+    def session(self, user_id=None):
+        return SQLiteSession(get_db_connection(user_id))
+
+    @contextmanager
+    def connect(self, user_id=None):
+        with pooled_connection(user_id) as conn:
+            yield SQLiteSession(conn)
+
+    def stores(self):
+        """A session on each shard in turn (for passes over every user)"""
+        for shard in get_router().shards():
+            with pooled_connection(shard=shard) as conn:
+                yield SQLiteSession(conn)
+
+    def users(self):
+        return UserRepo(self.session(None), on_created=get_router().place)
+
+    def rebuild_search_index(self):
+        """Re-index every expense and savings row of every shard"""
+        for db in self.stores():
+            db.write(rebuild_search_index)
+
+class ServerPool:
+    """Pool of server connections, LIFO like database.ConnectionPool"""
+
+    def __init__(self, connect, size=DEFAULT_POOL_SIZE):
+        self.connect = connect
+        self.pid = os.getpid()
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def acquire(self):
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            return self.connect()
+        if conn.closed:
+            return self.connect()
+        return conn
+
+    def release(self, conn):
+        try:
+            if conn.info.transaction_status:
+                conn.rollback()
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        except Exception:
+            conn.close()
+
+    def close_all(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+class PostgresStorage(Storage):
+    """Repositories on a PostgreSQL server (needs the optional psycopg).
+
+    Connections run in autocommit mode so reads take no transaction;
+    writes open one explicitly. Inside a request a session's connection is
+    reused for the whole request and returned to the pool on teardown (see
+    init_app), as with the SQLite pools. All users share the one database.
+    """
+
+    def __init__(self, url, pool_size=DEFAULT_POOL_SIZE):
+        try:
+            import psycopg
+        except ImportError as e:
+            raise RuntimeError('PostgresStorage needs the psycopg package (pip install "psycopg[binary]")') from e
+        self.connect_server = lambda: psycopg.connect(url, autocommit=True, row_factory=server_rows)
+        self.errors = (psycopg.Error,)
+        self.pool_size = pool_size
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def pool(self):
+        # Recreated after a fork: server connections must not be shared
+        with self._lock:
+            if self._pool is None or self._pool.pid != os.getpid():
+                self._pool = ServerPool(self.connect_server, self.pool_size)
+            return self._pool
+
+    def init_app(self, app):
+        """Create any missing tables and return each request's connection to
+        the pool on teardown"""
+        self.create_schema()
+        app.teardown_appcontext(self.close_request_sessions)
+
+    def session(self, user_id=None):
+        pool = self.pool()
+        if has_app_context():
+            sessions = g.setdefault('_server_sessions', {})
+            session = sessions.get(id(self))
+            if session is None:
+                session = sessions[id(self)] = ServerSession(pool.acquire(), pool)
+                session.request_bound = True
+            return session
+        return ServerSession(pool.acquire(), pool)
+
+    def close_request_sessions(self, exception=None):
+        session = g.get('_server_sessions', {}).pop(id(self), None)
+        if session is not None:
+            session.request_bound = False
+            session.close()
+
+    @contextmanager
+    def connect(self, user_id=None):
+        pool = self.pool()
+        session = ServerSession(pool.acquire(), pool)
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def stores(self):
+        with self.connect() as db:
+            yield db
+
+    def rebuild_search_index(self):
+        """Rebuild the search indexes (PostgreSQL keeps them current by itself)"""
+        with self.connect() as db:
+            for index, _ in SEARCH_INDEXES.values():
+                db.execute(f'REINDEX INDEX {index}')
+
+    def create_schema(self):
+        """Create SERVER_SCHEMA's tables, triggers and indexes where missing"""
+        with self.connect() as db:
+            with db.conn.transaction():
+                # Serializes workers that start at the same time
+                db.conn.execute("SELECT pg_advisory_xact_lock(hashtext('expense_tracker schema'))")
+                for statement in SERVER_SCHEMA:
+                    db.conn.execute(statement)
+
+def create_storage(config):
+    """Build the storage backend from app config (STORAGE_BACKEND, STORAGE_URL)"""
+    backend = config.get('STORAGE_BACKEND', 'sqlite')
+    if backend == 'sqlite':
+        return SQLiteStorage()
+    if backend == 'postgres':
+        if not config.get('STORAGE_URL'):
+            raise RuntimeError('STORAGE_BACKEND=postgres needs STORAGE_URL (a PostgreSQL connection URL)')
+        return PostgresStorage(config['STORAGE_URL'], int(config.get('DB_POOL_SIZE', DEFAULT_POOL_SIZE)))
+    raise RuntimeError(f"STORAGE_BACKEND must be one of {', '.join(STORAGE_BACKENDS)}, not {backend!r}")
+
+# The server schema. Dates and timestamps stay TEXT in SQLite's formats, so
+# the repository SQL and the values it returns are the same on both
+# backends. Rollups and change tracking are built from the same definitions
+# as the SQLite triggers in database.py.
+SERVER_TIMESTAMP = "to_char(now() AT TIME ZONE 'UTC', 'YYYY-MM-DD HH24:MI:SS')"
+
+def _server_rollups():
+    """source table -> (watched columns, [(rollup table, key columns, key expressions)])"""
+    rollups = {}
+    for source_table, (watched, targets) in ROLLUPS.items():
+        rollups[source_table] = (watched.split(', '), list(targets))
+    for table, source_table, watched, keys, values in STANDALONE_ROLLUPS:
+        columns, targets = rollups[source_table]
+        columns += [column for column in watched.split(', ') if column not in columns]
+        targets.append((table, keys, values))
+    return rollups
+
+def _server_rollup_statements():
+    statements = []
+    for source_table, (watched, targets) in _server_rollups().items():
+        for table, keys, _ in targets:
+            columns = ', '.join(f"{key} {'BIGINT' if key == 'user_id' else 'TEXT'} NOT NULL" for key in keys)
+            statements.append(
+                f'''CREATE TABLE IF NOT EXISTS {table} ({columns}, total DOUBLE PRECISION NOT NULL,
+                    count INTEGER NOT NULL, PRIMARY KEY ({', '.join(keys)}))'''
+            )
+        add = ' '.join(rollup_sql(table, keys, [v.format(row='NEW') for v in values], '+')
+                       for table, keys, values in targets)
+        remove = ' '.join(rollup_sql(table, keys, [v.format(row='OLD') for v in values], '-')
+                          for table, keys, values in targets)
+        statements += [
+            f'''CREATE OR REPLACE FUNCTION {source_table}_rollup() RETURNS trigger LANGUAGE plpgsql AS $$
+                BEGIN
+                    IF TG_OP <> 'INSERT' THEN {remove} END IF;
+                    IF TG_OP <> 'DELETE' THEN {add} END IF;
+                    RETURN NULL;
+                END $$''',
+            f'''CREATE OR REPLACE TRIGGER {source_table}_rollup
+                AFTER INSERT OR DELETE OR UPDATE OF {', '.join(watched)} ON {source_table}
+                FOR EACH ROW EXECUTE FUNCTION {source_table}_rollup()''',
+        ]
+    return statements
+
+def _server_change_tracking():
+    statements = [
+        f'''CREATE TABLE IF NOT EXISTS user_changes (
+            user_id BIGINT PRIMARY KEY,
+            version BIGINT NOT NULL,
+            changed_at TEXT DEFAULT {SERVER_TIMESTAMP}
+        )''',
+        f'''CREATE OR REPLACE FUNCTION track_user_change() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                INSERT INTO user_changes (user_id, version)
+                VALUES (CASE WHEN TG_OP = 'DELETE' THEN OLD.user_id ELSE NEW.user_id END, 1)
+                ON CONFLICT (user_id) DO UPDATE SET version = user_changes.version + 1,
+                    changed_at = {SERVER_TIMESTAMP};
+                RETURN NULL;
+            END $$''',
+    ]
+    for table in CHANGE_TRACKED_TABLES + ('recurring_expenses',):
+        statements.append(
+            f'''CREATE OR REPLACE TRIGGER {table}_track AFTER INSERT OR UPDATE OR DELETE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION track_user_change()'''
+        )
+    return statements
+
+def _server_search_indexes():
+    return [
+        f'CREATE INDEX IF NOT EXISTS {index} ON {table} USING gin (({server_search_document(table)}))'
+        for table, (index, _) in SEARCH_INDEXES.items()
+    ]
+
+_categories = ', '.join("('{}')".format(name.replace("'", "''")) for name in DEFAULT_CATEGORIES)
+
+SERVER_SCHEMA = [
+    f'''CREATE TABLE IF NOT EXISTS users (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        name TEXT NOT NULL,
+        created_at TEXT DEFAULT {SERVER_TIMESTAMP}
+    )''',
+    f'''CREATE TABLE IF NOT EXISTS user_profile (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL UNIQUE REFERENCES users (id),
+        about TEXT,
+        vision_year TEXT,
+        vision_month TEXT,
+        company TEXT,
+        updated_at TEXT DEFAULT {SERVER_TIMESTAMP}
+    )''',
+    '''CREATE TABLE IF NOT EXISTS categories (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        name TEXT UNIQUE NOT NULL
+    )''',
+    f'INSERT INTO categories (name) VALUES {_categories} ON CONFLICT (name) DO NOTHING',
+    f'''CREATE TABLE IF NOT EXISTS expenses (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        amount DOUBLE PRECISION NOT NULL,
+        category TEXT NOT NULL,
+        date TEXT NOT NULL,
+        payment_mode TEXT NOT NULL,
+        notes TEXT,
+        recurring_id BIGINT,
+        created_at TEXT DEFAULT {SERVER_TIMESTAMP}
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_expenses_user_date_amount ON expenses (user_id, date, amount)',
+    'CREATE INDEX IF NOT EXISTS idx_expenses_user_amount ON expenses (user_id, amount)',
+    'CREATE INDEX IF NOT EXISTS idx_expenses_user_category_amount ON expenses (user_id, category, amount)',
+    'CREATE INDEX IF NOT EXISTS idx_expenses_facets_amount ON expenses (user_id, category, payment_mode, amount, date)',
+    'CREATE INDEX IF NOT EXISTS idx_expenses_facets_date ON expenses (user_id, category, payment_mode, date, amount)',
+    '''CREATE UNIQUE INDEX IF NOT EXISTS idx_expenses_recurring_date ON expenses (recurring_id, date)
+       WHERE recurring_id IS NOT NULL''',
+    f'''CREATE TABLE IF NOT EXISTS savings (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        amount DOUBLE PRECISION NOT NULL,
+        source TEXT NOT NULL,
+        date TEXT NOT NULL,
+        notes TEXT,
+        created_at TEXT DEFAULT {SERVER_TIMESTAMP}
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_savings_user_date_amount ON savings (user_id, date, amount)',
+    'DROP INDEX IF EXISTS idx_savings_user_date',
+    'CREATE INDEX IF NOT EXISTS idx_savings_user_amount ON savings (user_id, amount)',
+    f'''CREATE TABLE IF NOT EXISTS budget (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        amount DOUBLE PRECISION NOT NULL,
+        type TEXT NOT NULL,
+        month TEXT NOT NULL,
+        category TEXT,
+        created_at TEXT DEFAULT {SERVER_TIMESTAMP}
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_budget_user_month ON budget (user_id, month, type, category)',
+    f'''CREATE TABLE IF NOT EXISTS savings_goals (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        goal_name TEXT NOT NULL,
+        target_amount DOUBLE PRECISION NOT NULL,
+        target_date TEXT,
+        created_at TEXT DEFAULT {SERVER_TIMESTAMP}
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_savings_goals_user_created ON savings_goals (user_id, created_at)',
+    f'''CREATE TABLE IF NOT EXISTS recurring_expenses (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL,
+        amount DOUBLE PRECISION NOT NULL,
+        category TEXT NOT NULL,
+        payment_mode TEXT NOT NULL,
+        notes TEXT,
+        frequency TEXT NOT NULL,
+        interval INTEGER NOT NULL DEFAULT 1,
+        start_date TEXT NOT NULL,
+        end_date TEXT,
+        next_date TEXT NOT NULL,
+        active INTEGER NOT NULL DEFAULT 1,
+        created_at TEXT DEFAULT {SERVER_TIMESTAMP}
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_recurring_expenses_user ON recurring_expenses (user_id, next_date)',
+    'CREATE INDEX IF NOT EXISTS idx_recurring_expenses_due ON recurring_expenses (next_date) WHERE active = 1',
+] + _server_rollup_statements() + _server_change_tracking() + _server_search_indexes()
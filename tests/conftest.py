@@ -0,0 +1,45 @@
+import itertools
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault('RECURRING_SCHEDULER', 'false')
+os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+os.environ.setdefault('REQUEST_LOG_LEVEL', 'WARNING')
+
+# Point the app at a scratch database before any test module imports it
+import database
+database.DATABASE = os.path.join(tempfile.mkdtemp(prefix='expense-tests-'), 'expenses.db')
+
+pytest_plugins = ['query_audit']
+
+_emails = itertools.count(1)
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    app.config['TESTING'] = True
+    return app
+
+@pytest.fixture
+def client(app):
+    """A test client signed in as a new user; ``client.user_id`` is their id"""
+    client = app.test_client()
+    response = client.post('/signup', json={
+        'email': f'user{next(_emails)}@example.com', 'password': 'secret123', 'name': 'Test User'
+    })
+    assert response.status_code == 201
+    with client.session_transaction() as session:
+        client.user_id = session['user_id']
+    return client
+
+def add_expense(client, amount=10.0, category='Food & Dining', date='2026-01-15', payment_mode='Cash', notes=''):
+    response = client.post('/api/expenses', json={
+        'amount': amount, 'category': category, 'date': date, 'payment_mode': payment_mode, 'notes': notes
+    })
+    assert response.status_code == 201
+    return response
@@ -0,0 +1,24 @@
+from datetime import date, timedelta
+
+from conftest import add_expense
+
+def last_month():
+    return (date.today().replace(day=1) - timedelta(days=1)).replace(day=15).isoformat()
+
+def test_seasonality_without_history(client):
+    response = client.get('/api/dashboard/analytics/seasonality')
+    assert response.status_code == 200
+    assert response.get_json()['categories'] == {}
+
+def test_seasonality_of_zero_total_history(client):
+    add_expense(client, amount=0, date=last_month())
+    response = client.get('/api/dashboard/analytics/seasonality')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert len(body['months']) == 12 and body['categories'] == {}
+
+def test_seasonality_index(client):
+    add_expense(client, amount=30, category='Travel', date=last_month())
+    body = client.get('/api/dashboard/analytics/seasonality').get_json()
+    index = body['categories']['Travel']
+    assert index[(date.today().replace(day=1) - timedelta(days=1)).month - 1] == 1.0
@@ -0,0 +1,37 @@
+import calendar
+from datetime import date
+
+from conftest import add_expense
+
+def test_past_month_status_burns_over_the_whole_month(client):
+    add_expense(client, amount=28, category='Travel', date='2024-02-03')
+    add_expense(client, amount=30, category='Shopping', date='2024-02-20')
+    client.post('/api/budget', json={'amount': 100, 'month': '2024-02'})
+    client.post('/api/budget', json={'amount': 20, 'type': 'category', 'category': 'Travel', 'month': '2024-02'})
+
+    status = client.get('/api/budget/status?month=2024-02').get_json()
+    assert (status['days_elapsed'], status['days_in_month']) == (29, 29)
+    monthly = status['monthly']
+    assert (monthly['spent'], monthly['burn_rate'], monthly['projected_spend'], monthly['projected_overspend']) == (58, 2, 58, 0)
+    assert (monthly['utilization_percent'], monthly['status']) == (58, 'success')
+    travel = next(budget for budget in status['budgets'] if budget['category'] == 'Travel')
+    assert (travel['spent'], travel['remaining'], travel['status']) == (28, -8, 'danger')
+
+def test_current_month_projects_the_overspend(client):
+    today = date.today()
+    days_in_month = calendar.monthrange(today.year, today.month)[1]
+    add_expense(client, amount=60, date=today.isoformat())
+    client.post('/api/budget', json={'amount': 100})
+
+    monthly = client.get('/api/budget/status').get_json()['monthly']
+    projected = round(60 / today.day * days_in_month, 2)
+    assert monthly['burn_rate'] == round(60 / today.day, 2)
+    assert monthly['projected_spend'] == projected
+    assert monthly['projected_overspend'] == round(max(0, projected - 100), 2)
+    assert monthly['status'] == 'success'
+
+def test_future_month_and_bad_month(client):
+    client.post('/api/budget', json={'amount': 100, 'month': '2999-01'})
+    status = client.get('/api/budget/status?month=2999-01').get_json()
+    assert status['days_elapsed'] == 0 and status['monthly']['burn_rate'] == 0
+    assert client.get('/api/budget/status?month=January').status_code == 400
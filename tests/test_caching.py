@@ -0,0 +1,74 @@
+import sqlite3
+
+import app as app_module
+from database import get_router, shard_path
+
+from conftest import add_expense
+
+def insert_out_of_process(user_id, amount):
+    """Write an expense the way another worker or a script would"""
+    path = shard_path(get_router().shard_for(user_id))
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "INSERT INTO expenses (user_id, amount, category, date, payment_mode) VALUES (?, ?, 'Travel', '2026-01-20', 'Card')",
+        (user_id, amount)
+    )
+    conn.commit()
+    conn.close()
+
+def test_etag_revalidates_until_a_write(client):
+    add_expense(client)
+    first = client.get('/api/dashboard/summary?month=2026-01')
+    assert first.status_code == 200 and first.headers['ETag']
+    again = client.get('/api/dashboard/summary?month=2026-01', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    add_expense(client, amount=5)
+    after = client.get('/api/dashboard/summary?month=2026-01', headers={'If-None-Match': first.headers['ETag']})
+    assert after.status_code == 200
+
+def test_out_of_process_write_invalidates_etag_and_cache(client):
+    add_expense(client, amount=10)
+    first = client.get('/api/expenses/search?q=travel')
+    assert first.get_json()['items'] == []
+
+    insert_out_of_process(client.user_id, 42)
+
+    revalidated = client.get('/api/expenses/search?q=travel', headers={'If-None-Match': first.headers['ETag']})
+    assert revalidated.status_code == 200
+    assert [item['amount'] for item in revalidated.get_json()['items']] == [42]
+
+def query_count(response):
+    """Number of SQL queries the request ran, from its Server-Timing header"""
+    return int(response.headers['Server-Timing'].split('desc="')[1].split(' ')[0])
+
+def test_pages_and_a_cached_profile_run_no_queries(client):
+    assert query_count(client.get('/dashboard')) == 0
+    first = client.get('/api/profile')
+    assert first.get_json()['name'] == 'Test User'
+    assert query_count(client.get('/api/profile')) == 0
+    assert client.get('/api/profile', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+def test_profile_update_is_seen_by_the_next_read(client):
+    client.get('/api/profile')
+    assert client.put('/api/profile', json={'company': 'Acme'}).get_json()['success']
+    assert client.get('/api/profile').get_json()['company'] == 'Acme'
+
+    other = client.application.test_client()
+    assert other.post('/signin', json={'email': client.get('/api/profile').get_json()['email'],
+                                       'password': 'secret123'}).status_code == 200
+    assert other.get('/api/profile').get_json()['company'] == 'Acme'
+
+def test_cache_hit_looks_up_the_data_version_once(client):
+    add_expense(client)
+    client.get('/api/dashboard/summary?month=2026-01')
+    assert query_count(client.get('/api/dashboard/summary?month=2026-01')) == 1
+
+def test_result_cache_can_be_disabled(app, client, monkeypatch):
+    # A version that ignores writes: only a bypassed cache sees the new row
+    monkeypatch.setattr(app_module.result_cache, 'data_version', lambda user_id: 'frozen')
+    assert client.get('/api/expenses/search?q=travel').get_json()['items'] == []
+    insert_out_of_process(client.user_id, 42)
+    assert client.get('/api/expenses/search?q=travel').get_json()['items'] == []
+
+    monkeypatch.setitem(app.config, 'RESULT_CACHE', False)
+    assert [item['amount'] for item in client.get('/api/expenses/search?q=travel').get_json()['items']] == [42]
@@ -0,0 +1,22 @@
+from datetime import date, datetime
+
+from conftest import add_expense
+
+def months_ago(count):
+    today = date.today()
+    year, month = divmod(today.year * 12 + today.month - 1 - count, 12)
+    return date(year, month + 1, 1)
+
+def test_monthly_comparison_covers_the_requested_months(client):
+    add_expense(client, amount=7, date=date.today().isoformat())
+    add_expense(client, amount=3, date=months_ago(2).isoformat())
+    add_expense(client, amount=50, date=months_ago(5).isoformat())
+
+    data = client.get('/api/dashboard/charts/monthly-comparison?months=3').get_json()
+    assert data['months'] == [datetime(d.year, d.month, 1).strftime('%b %Y') for d in map(months_ago, (2, 1, 0))]
+    assert data['amounts'] == [3, 0, 7]
+    assert client.get('/api/dashboard/charts/monthly-comparison').get_json()['amounts'] == [50, 0, 0, 3, 0, 7]
+
+def test_monthly_comparison_clamps_the_window(client):
+    assert len(client.get('/api/dashboard/charts/monthly-comparison?months=0').get_json()['months']) == 1
+    assert len(client.get('/api/savings/charts/monthly-comparison?months=500').get_json()['amounts']) == 120
@@ -0,0 +1,40 @@
+import json
+from datetime import date
+
+import app as app_module
+
+from conftest import add_expense
+
+def read_event(stream):
+    """Next event of the stream as (name, data), skipping keepalive comments"""
+    while True:
+        chunk = next(stream)
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        if text.startswith(':'):
+            continue
+        fields = dict(line.split(': ', 1) for line in text.strip().splitlines())
+        return fields['event'], json.loads(fields['data'])
+
+def test_event_stream_sends_state_then_changed_sections(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'SSE_KEEPALIVE_SECONDS', 0.2)
+    client.post('/api/budget', json={'amount': 100})
+    response = client.get('/api/events', buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    stream = iter(response.response)
+    try:
+        name, state = read_event(stream)
+        assert name == 'update' and set(state) == {'summary', 'budget'}
+        assert state['budget']['monthly']['spent'] == 0
+
+        add_expense(client, amount=40, date=date.today().isoformat())
+        name, delta = read_event(stream)
+        assert name == 'update'
+        assert delta['summary']['month_total'] == 40
+        assert delta['budget']['monthly']['spent'] == 40
+
+        # A write that changes neither section sends nothing but keepalives
+        add_expense(client, amount=5, date='2020-01-01')
+        assert next(stream).startswith(b':')
+    finally:
+        response.close()
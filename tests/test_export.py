@@ -0,0 +1,38 @@
+import csv
+import io
+
+import pytest
+
+from conftest import add_expense
+
+def test_csv_export_streams_the_filtered_ledger(client):
+    add_expense(client, amount=12.5, category='Travel', date='2026-03-02', notes='taxi, airport')
+    add_expense(client, amount=4, category='Shopping', date='2026-03-01')
+    add_expense(client, amount=9, category='Travel', date='2026-02-01')
+
+    response = client.get('/api/export/expenses?date_from=2026-03-01&category=Travel')
+    assert response.mimetype == 'text/csv'
+    assert 'attachment; filename="expenses-' in response.headers['Content-Disposition']
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [(row['date'], row['amount'], row['notes']) for row in rows] == [('2026-03-02', '12.5', 'taxi, airport')]
+
+def test_budget_export_filters_by_month(client):
+    client.post('/api/budget', json={'amount': 300, 'month': '2026-03'})
+    client.post('/api/budget', json={'amount': 200, 'month': '2026-04'})
+    text = client.get('/api/export/budget?date_from=2026-04-01').get_data(as_text=True)
+    assert [row['month'] for row in csv.DictReader(io.StringIO(text))] == ['2026-04']
+
+def test_parquet_export_round_trips(client):
+    pq = pytest.importorskip('pyarrow.parquet')
+    client.post('/api/savings', json={'amount': 100, 'source': 'Salary', 'date': '2026-01-31'})
+    client.post('/api/savings', json={'amount': 40, 'source': 'Gift', 'date': '2026-01-05'})
+
+    response = client.get('/api/export/savings?format=parquet')
+    assert response.mimetype == 'application/vnd.apache.parquet'
+    table = pq.read_table(io.BytesIO(response.get_data()))
+    assert table.column('source').to_pylist() == ['Gift', 'Salary']
+    assert table.column('amount').to_pylist() == [40.0, 100.0]
+
+def test_unknown_dataset_and_format_are_rejected(client):
+    assert client.get('/api/export/goals').status_code == 404
+    assert client.get('/api/export/expenses?format=xlsx').status_code == 400
@@ -0,0 +1,34 @@
+from datetime import date, timedelta
+
+def add_goal(client, name, target_amount, target_date=None):
+    response = client.post('/api/savings/goals', json={
+        'goal_name': name, 'target_amount': target_amount, 'target_date': target_date
+    })
+    assert response.status_code == 201
+
+def goals_by_name(client):
+    return {goal['goal_name']: goal for goal in client.get('/api/savings/goals').get_json()}
+
+def in_days(days):
+    return (date.today() + timedelta(days=days)).isoformat()
+
+def test_goals_project_completion_at_the_recent_rate(client):
+    # 900 over the 90-day window: 10 a day
+    client.post('/api/savings', json={'amount': 900, 'source': 'Salary', 'date': date.today().isoformat()})
+    add_goal(client, 'House', 1900, in_days(200))
+    add_goal(client, 'Car', 1900, in_days(50))
+    add_goal(client, 'Phone', 500)
+
+    goals = goals_by_name(client)
+    assert goals['House']['projected_completion_date'] == in_days(100)
+    assert goals['House']['remaining_amount'] == 1000 and goals['House']['on_track'] is True
+    assert goals['Car']['on_track'] is False
+    assert goals['Phone']['projected_completion_date'] == in_days(0)
+    assert goals['Phone']['progress_percent'] == 100 and goals['Phone']['on_track'] is None
+
+def test_goals_without_recent_savings_have_no_projection(client):
+    client.post('/api/savings', json={'amount': 100, 'source': 'Gift', 'date': '2020-01-01'})
+    add_goal(client, 'Trip', 1000, in_days(30))
+    trip = goals_by_name(client)['Trip']
+    assert trip['projected_completion_date'] is None and trip['on_track'] is False
+    assert trip['current_amount'] == 100
@@ -0,0 +1,74 @@
+import io
+import json
+import sqlite3
+
+import app as app_module
+import storage
+
+CSV_HEADER = b'amount,category,date,payment_mode,notes\n'
+
+def upload(client, body, filename):
+    return client.post('/api/expenses/import', data={'file': (io.BytesIO(body), filename)})
+
+def ndjson(*records):
+    return b''.join(json.dumps(record).encode() + b'\n' for record in records)
+
+def valid(**overrides):
+    return dict({'amount': 12.5, 'category': 'Travel', 'date': '2026-10-02', 'payment_mode': 'Card', 'notes': ''},
+                **overrides)
+
+def test_imports_valid_rows(client):
+    response = upload(client, CSV_HEADER + b'3,Food & Dining,2026-10-02,Cash,lunch\n4,Travel,2026-10-03,UPI,\n', 'x.csv')
+    assert response.status_code == 200
+    assert response.get_json()['inserted'] == 2
+    assert len(client.get('/api/expenses').get_json()) == 2
+
+def test_non_string_fields_are_row_errors(client):
+    response = upload(client, ndjson(
+        valid(category=7), valid(date=20261002), valid(payment_mode=['Card']), valid(notes={'a': 1}), valid()
+    ), 'x.ndjson')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['inserted'], body['failed']) == (1, 4)
+    assert [error['row'] for error in body['errors']] == [1, 2, 3, 4]
+    assert body['errors'][0]['message'] == 'category must be a string'
+
+def test_non_finite_amounts_are_row_errors(client):
+    response = upload(client, CSV_HEADER + b'nan,Travel,2026-10-02,Cash,\ninf,Travel,2026-10-02,Cash,\n', 'x.csv')
+    body = response.get_json()
+    assert response.status_code == 200
+    assert (body['inserted'], body['failed']) == (0, 2)
+    assert body['errors'][0]['message'] == 'amount must be a finite number'
+
+def test_database_error_fails_only_its_chunk(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'IMPORT_CHUNK_SIZE', 2)
+    add_many = storage.ExpenseRepo.add_many
+    calls = []
+
+    def failing_second_chunk(self, rows):
+        calls.append(len(rows))
+        if len(calls) == 2:
+            raise sqlite3.OperationalError('disk I/O error')
+        return add_many(self, rows)
+    monkeypatch.setattr(storage.ExpenseRepo, 'add_many', failing_second_chunk)
+
+    response = upload(client, ndjson(*[valid(amount=i + 1) for i in range(5)]), 'x.ndjson')
+    body = response.get_json()
+    assert response.status_code == 200
+    assert (body['inserted'], body['failed']) == (3, 2)
+    assert [error['row'] for error in body['errors']] == [3, 4]
+    assert 'disk I/O error' in body['errors'][0]['message']
+
+def test_parse_error_after_committed_chunk_invalidates(client, monkeypatch):
+    monkeypatch.setattr(app_module, 'IMPORT_CHUNK_SIZE', 1)
+    notified = []
+    monkeypatch.setattr(app_module.change_notifier, 'notify', notified.append)
+    before = client.get('/api/expenses')
+    assert before.get_json() == []
+
+    response = upload(client, CSV_HEADER + b'3,Travel,2026-10-02,Cash,\n4,Travel,2026-10-03,Cash,\xff\xfe\n', 'x.csv')
+    assert response.status_code == 400
+    assert response.get_json()['inserted'] == 1
+    assert notified == [client.user_id]
+    after = client.get('/api/expenses', headers={'If-None-Match': before.headers['ETag']})
+    assert after.status_code == 200 and len(after.get_json()) == 1
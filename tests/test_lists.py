@@ -0,0 +1,37 @@
+import json
+
+from conftest import add_expense
+
+def add_expenses(client):
+    for day, amount, category in ((1, 5, 'Travel'), (2, 20, 'Shopping'), (3, 15, 'Travel'), (4, 10, 'Travel'), (5, 25, 'Travel')):
+        add_expense(client, amount=amount, category=category, date=f'2026-02-{day:02d}')
+
+def test_cursor_pages_walk_every_match_once(client):
+    add_expenses(client)
+    seen, cursor = [], None
+    while True:
+        url = '/api/expenses?limit=2&category=Travel&sort=amount_desc' + (f'&cursor={cursor}' if cursor else '')
+        page = client.get(url).get_json()
+        seen += [item['amount'] for item in page['items']]
+        cursor = page['next_cursor']
+        if not cursor:
+            break
+    assert seen == [25, 15, 10, 5]
+    assert page['facets']['total'] == 4
+    assert page['facets']['category'] == {'Shopping': 1, 'Travel': 4}
+
+def test_bad_cursor_and_sort_are_rejected(client):
+    assert client.get('/api/expenses?cursor=not-a-cursor').status_code == 400
+    assert client.get('/api/expenses?sort=sideways').status_code == 400
+    assert client.get('/api/expenses?stream=xml').status_code == 400
+
+def test_streams_return_every_row_in_order(client):
+    add_expenses(client)
+    as_json = client.get('/api/expenses?stream=json&sort=date_asc&amount_min=10')
+    assert [item['amount'] for item in json.loads(as_json.get_data(as_text=True))] == [20, 15, 10, 25]
+
+    as_ndjson = client.get('/api/expenses?stream=ndjson&sort=date_asc&amount_min=10')
+    assert as_ndjson.mimetype == 'application/x-ndjson'
+    lines = as_ndjson.get_data(as_text=True).splitlines()
+    assert [json.loads(line)['amount'] for line in lines] == [20, 15, 10, 25]
+    assert client.get('/api/expenses?stream=json&date_from=2030-01-01').get_json() == []
@@ -0,0 +1,36 @@
+import re
+
+from conftest import add_expense
+
+def sample(text, name, **labels):
+    """Value of one Prometheus sample in the /metrics text (0 if absent)"""
+    label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf'^{re.escape(name)}\{{{re.escape(label_text)}\}} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else 0
+
+def test_metrics_count_requests_and_queries_per_route(client):
+    route = '/api/expenses/<int:expense_id>'
+    before = client.get('/metrics').get_data(as_text=True)
+    add_expense(client)
+    expense_id = client.get('/api/expenses').get_json()[0]['id']
+    client.delete(f'/api/expenses/{expense_id}')
+    client.delete(f'/api/expenses/{expense_id}')
+
+    response = client.get('/metrics')
+    assert response.mimetype == 'text/plain'
+    text = response.get_data(as_text=True)
+    assert '# TYPE http_request_duration_seconds histogram' in text
+    assert sample(text, 'http_requests_total', route='/api/expenses', method='POST', status=201) == \
+        sample(before, 'http_requests_total', route='/api/expenses', method='POST', status=201) + 1
+    assert sample(text, 'http_request_duration_seconds_count', route=route, method='DELETE') == \
+        sample(before, 'http_request_duration_seconds_count', route=route, method='DELETE') + 2
+    assert sample(text, 'http_request_duration_seconds_bucket', route=route, method='DELETE', le='+Inf') == \
+        sample(text, 'http_request_duration_seconds_count', route=route, method='DELETE')
+    assert sample(text, 'sql_queries_total', route=route) > sample(before, 'sql_queries_total', route=route)
+
+def test_metrics_token_is_required_when_set(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 's3cret')
+    anonymous = app.test_client()
+    assert anonymous.get('/metrics').status_code == 401
+    assert anonymous.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert anonymous.get('/metrics', headers={'Authorization': 'Bearer s3cret'}).status_code == 200
@@ -0,0 +1,31 @@
+import os
+import runpy
+
+import database
+import instrumentation
+from passwords import PasswordHasher
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+
+def test_inline_hasher_round_trip():
+    hasher = PasswordHasher(workers=0)
+    password_hash = hasher.hash('secret123')
+    assert hasher.verify(password_hash, 'secret123')
+    assert not hasher.verify(password_hash, 'wrong')
+
+def test_hash_worker_import_skips_server_startup(monkeypatch):
+    """A spawned hash worker re-imports ``python app.py``'s module as __mp_main__"""
+    calls = []
+    monkeypatch.setattr(database, 'init_app', lambda app: calls.append('init_app'))
+    monkeypatch.setattr(database, 'init_db', lambda: calls.append('init_db'))
+    monkeypatch.setattr(instrumentation, 'configure_logging', lambda level: calls.append('configure_logging'))
+    namespace = runpy.run_path(APP_PATH, run_name='__mp_main__')
+    assert calls == []
+    assert 'result_cache' not in namespace and 'password_hasher' not in namespace
+
+def test_hash_workers_round_trip():
+    hasher = PasswordHasher(workers=1)
+    try:
+        assert hasher.verify(hasher.hash('secret123'), 'secret123')
+    finally:
+        hasher.shutdown()
@@ -0,0 +1,63 @@
+import pytest
+
+from conftest import add_expense
+
+AUDITED_ROUTES = [
+    '/api/dashboard/summary',
+    '/api/dashboard/summary?month=2026-01',
+    '/api/dashboard/charts/category-distribution',
+    '/api/dashboard/charts/daily-trend',
+    '/api/dashboard/charts/category-bar',
+    '/api/dashboard/charts/payment-mode',
+    '/api/dashboard/charts/monthly-comparison',
+    '/api/dashboard/charts/top-expenses',
+    '/api/dashboard/charts/cumulative',
+    '/api/dashboard/bundle',
+    '/api/dashboard/analytics/trends',
+    '/api/dashboard/analytics/forecast',
+    '/api/dashboard/analytics/seasonality',
+    '/api/dashboard/analytics/outliers',
+    '/api/budget/status',
+    '/api/expenses',
+    '/api/expenses?date_from=2026-01-01&date_to=2026-01-31&category=Travel',
+    '/api/expenses?limit=2',
+    '/api/expenses?limit=2&sort=amount_desc&amount_min=5',
+    '/api/expenses?limit=2&category=Travel&payment_mode=Card',
+    '/api/expenses/search?q=taxi',
+    '/api/expenses/search?q=taxi&category=Travel&date_from=2026-01-01',
+    '/api/savings',
+    '/api/savings?limit=2&source=Salary',
+    '/api/savings/search?q=bonus',
+    '/api/savings/summary',
+    '/api/savings/charts/growth',
+    '/api/savings/charts/source-distribution',
+    '/api/savings/charts/monthly-comparison',
+    '/api/savings/bundle',
+    '/api/savings/goals',
+    '/api/export/expenses',
+    '/api/export/expenses?category=Travel&date_from=2026-01-01',
+    '/api/export/savings',
+]
+
+@pytest.fixture
+def seeded_client(client):
+    for day in range(1, 8):
+        add_expense(client, amount=day * 3, category='Travel', date=f'2026-01-{day:02d}', payment_mode='Card', notes='taxi')
+        add_expense(client, amount=day, date=f'2026-01-{day:02d}')
+        client.post('/api/savings', json={'amount': 100, 'source': 'Salary', 'date': f'2026-01-{day:02d}', 'notes': 'bonus'})
+    client.post('/api/savings/goals', json={'goal_name': 'Car', 'target_amount': 5000})
+    client.post('/api/budget', json={'amount': 500})
+    return client
+
+@pytest.mark.parametrize('path', AUDITED_ROUTES)
+def test_route_does_not_scan(seeded_client, query_plan_audit, path):
+    response = seeded_client.get(path)
+    assert response.status_code == 200
+    response.get_data()
+
+def test_aliased_scan_is_flagged(app, query_plan_audit):
+    from database import get_db_connection
+    with app.app_context():
+        get_db_connection().execute('SELECT t.id FROM expenses t WHERE t.notes = ?', ('x',)).fetchall()
+    assert [finding['plan'] for finding in query_plan_audit.findings] == [['SCAN t']]
+    query_plan_audit.reset()
@@ -0,0 +1,46 @@
+from datetime import date, timedelta
+
+from database import get_router, pooled_connection
+from recurring import materialize_due, next_occurrence
+from storage import SQLiteSession
+
+def test_monthly_rule_keeps_day_of_month():
+    anchor = date(2024, 1, 31)
+    dates = [anchor]
+    for _ in range(3):
+        dates.append(next_occurrence('monthly', 1, anchor, dates[-1]))
+    assert dates == [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)]
+
+def run_like_cron(user_id):
+    """A pass from another process (``flask run-recurring``): no in-process callback"""
+    with pooled_connection(shard=get_router().shard_for(user_id)) as conn:
+        return materialize_due(SQLiteSession(conn), date.today())
+
+def test_cron_pass_invalidates_cached_responses_and_etags(client):
+    start = date.today() - timedelta(days=2)
+    response = client.post('/api/recurring', json={
+        'amount': 4, 'category': 'Travel', 'payment_mode': 'Card', 'frequency': 'daily', 'start_date': start.isoformat()
+    })
+    assert response.status_code == 201
+    expenses = client.get('/api/expenses')
+    rules = client.get('/api/recurring')
+    assert expenses.get_json() == []
+
+    assert run_like_cron(client.user_id)['occurrences'] >= 3
+
+    after = client.get('/api/expenses', headers={'If-None-Match': expenses.headers['ETag']})
+    assert after.status_code == 200 and len(after.get_json()) == 3
+    rules_after = client.get('/api/recurring', headers={'If-None-Match': rules.headers['ETag']})
+    assert rules_after.status_code == 200
+    assert rules_after.get_json()[0]['next_date'] == (date.today() + timedelta(days=1)).isoformat()
+    assert run_like_cron(client.user_id)['occurrences'] == 0
+
+def test_rule_change_from_another_process_changes_etag(client):
+    client.post('/api/recurring', json={'amount': 4, 'category': 'Travel', 'payment_mode': 'Card',
+                                        'start_date': (date.today() + timedelta(days=5)).isoformat()})
+    rules = client.get('/api/recurring')
+    with pooled_connection(shard=get_router().shard_for(client.user_id)) as conn:
+        conn.execute('UPDATE recurring_expenses SET active = 0 WHERE user_id = ?', (client.user_id,))
+        conn.commit()
+    after = client.get('/api/recurring', headers={'If-None-Match': rules.headers['ETag']})
+    assert after.status_code == 200 and after.get_json()[0]['active'] is False
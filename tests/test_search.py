@@ -0,0 +1,39 @@
+import sqlite3
+
+from database import get_router, shard_path
+
+from conftest import add_expense
+
+def bulk_insert(user_id, count, notes):
+    conn = sqlite3.connect(shard_path(get_router().shard_for(user_id)))
+    conn.executemany(
+        "INSERT INTO expenses (user_id, amount, category, date, payment_mode, notes) VALUES (?, ?, 'Travel', ?, 'Card', ?)",
+        [(user_id, i + 1, f'2025-{1 + i % 12:02d}-10', notes) for i in range(count)]
+    )
+    conn.commit()
+    conn.close()
+
+def test_search_ranks_notes_matches_first(client):
+    add_expense(client, category='Travel', notes='airport taxi')
+    add_expense(client, notes='lunch')
+    add_expense(client, category='Travel', notes='hotel')
+    items = client.get('/api/expenses/search?q=travel').get_json()['items']
+    assert len(items) == 2
+    taxi = client.get('/api/expenses/search?q=tax').get_json()['items']
+    assert [item['notes'] for item in taxi] == ['airport taxi']
+
+def test_search_pages_through_every_match(client):
+    bulk_insert(client.user_id, 1200, 'taxi ride')
+    seen = []
+    page = 1
+    while True:
+        body = client.get(f'/api/expenses/search?q=taxi&limit=500&page={page}').get_json()
+        seen += [item['id'] for item in body['items']]
+        if not body['has_more']:
+            break
+        page += 1
+    assert page == 3
+    assert len(seen) == len(set(seen)) == 1200
+
+def test_search_requires_a_word(client):
+    assert client.get('/api/expenses/search?q=%20!').status_code == 400
@@ -0,0 +1,121 @@
+import sqlite3
+from datetime import date, timedelta
+
+from database import get_router, pooled_connection, run_write, shard_path
+from recurring import materialize_due
+from shards import _copy_user, move_user, purge_strays, rebalance
+from storage import ChangeRepo, ExpenseRepo, SavingsRepo, SQLiteSession
+
+from conftest import add_expense
+
+def add_user_data(client):
+    """Expenses (two of them from a recurring rule), savings, a budget and a goal"""
+    add_expense(client, amount=12, category='Travel', notes='airport taxi')
+    add_expense(client, amount=30, notes='team lunch')
+    assert client.post('/api/recurring', json={
+        'amount': 4, 'category': 'Travel', 'payment_mode': 'Card', 'frequency': 'daily',
+        'start_date': (date.today() - timedelta(days=1)).isoformat()
+    }).status_code == 201
+    with pooled_connection(client.user_id) as conn:
+        materialize_due(SQLiteSession(conn), date.today())
+    assert client.post('/api/savings', json={'amount': 100, 'source': 'Salary', 'date': '2026-01-31'}).status_code == 201
+    assert client.post('/api/budget', json={'amount': 500}).status_code in (200, 201)
+    assert client.post('/api/savings/goals', json={'goal_name': 'Car', 'target_amount': 900}).status_code == 201
+
+def shard_rows(shard, table, user_id):
+    conn = sqlite3.connect(shard_path(shard))
+    conn.row_factory = sqlite3.Row
+    try:
+        return conn.execute(f'SELECT * FROM {table} WHERE user_id = ? ORDER BY rowid', (user_id,)).fetchall()
+    finally:
+        conn.close()
+
+def row_counts(shard, user_id):
+    return {table: len(shard_rows(shard, table, user_id))
+            for table in ('recurring_expenses', 'expenses', 'savings', 'budget', 'savings_goals')}
+
+def snapshot(user_id):
+    """What the app reads for a user on their current shard: rows, rollups and search"""
+    with pooled_connection(user_id) as conn:
+        db = SQLiteSession(conn)
+        expenses, savings = ExpenseRepo(db, user_id), SavingsRepo(db, user_id)
+        return {
+            'expenses': sorted((row['amount'], row['category'], row['date'], row['notes']) for row in expenses.page()),
+            'daily': [tuple(row) for row in expenses.daily_totals(('date', 'category', 'payment_mode'))],
+            'facets': sorted(tuple(row) for row in expenses.facet_counts()),
+            'search': [row['notes'] for row in expenses.search(['taxi'])],
+            'savings_total': savings.total(),
+            'changed': ChangeRepo(db, user_id).version() > 0,
+        }
+
+def assert_rules_remapped(shard, user_id):
+    rule_ids = {row['id'] for row in shard_rows(shard, 'recurring_expenses', user_id)}
+    recurring = [row['recurring_id'] for row in shard_rows(shard, 'expenses', user_id) if row['recurring_id']]
+    assert len(recurring) == 2 and set(recurring) <= rule_ids
+
+def test_move_user_carries_rows_rollups_and_search(client):
+    add_user_data(client)
+    user_id = client.user_id
+    source = get_router().shard_for(user_id)
+    target = source + 1
+    counts, before = row_counts(source, user_id), snapshot(user_id)
+
+    assert move_user(user_id, target) == sum(counts.values())
+
+    assert get_router().shard_for(user_id) == target
+    with pooled_connection() as directory:
+        assert directory.execute('SELECT shard FROM user_shards WHERE user_id = ?', (user_id,)).fetchone()[0] == target
+    assert row_counts(target, user_id) == counts
+    assert not any(row_counts(source, user_id).values())
+    assert not shard_rows(source, 'user_changes', user_id)
+    assert_rules_remapped(target, user_id)
+    assert snapshot(user_id) == before
+    move_user(user_id, source)
+
+def test_rerun_after_an_interrupted_move_leaves_one_copy(client):
+    add_user_data(client)
+    user_id = client.user_id
+    source = get_router().shard_for(user_id)
+    target = source + 1
+    counts, before = row_counts(source, user_id), snapshot(user_id)
+
+    # Interrupted after the copy: the directory still points at the source
+    with pooled_connection(shard=source) as conn, pooled_connection(shard=target) as copy:
+        run_write(copy, lambda c: _copy_user(conn, c, user_id))
+    move_user(user_id, target)
+    assert row_counts(target, user_id) == counts
+    assert_rules_remapped(target, user_id)
+    assert snapshot(user_id) == before
+
+    # Interrupted before the source delete: the old shard keeps stray rows
+    with pooled_connection(shard=target) as conn, pooled_connection(shard=source) as copy:
+        run_write(copy, lambda c: _copy_user(conn, c, user_id))
+    assert row_counts(source, user_id) == counts
+    assert purge_strays() == 1
+    assert not any(row_counts(source, user_id).values())
+    assert row_counts(target, user_id) == counts
+    assert snapshot(user_id) == before
+    move_user(user_id, source)
+
+def test_rebalance_spreads_existing_users(app, client):
+    add_user_data(client)
+    other = app.test_client()
+    assert other.post('/signup', json={
+        'email': f'rebalance{client.user_id}@example.com', 'password': 'secret123', 'name': 'Other'
+    }).status_code == 201
+    with other.session_transaction() as session:
+        other.user_id = other_id = session['user_id']
+    add_user_data(other)
+    before = {user_id: snapshot(user_id) for user_id in (client.user_id, other_id)}
+
+    logged = []
+    assert rebalance(2, log=logged.append) >= 1
+    for user_id in (client.user_id, other_id):
+        assert get_router().shard_for(user_id) == user_id % 2
+        assert snapshot(user_id) == before[user_id]
+        assert not any(row_counts(1 - user_id % 2, user_id).values())
+    assert any(f'Moved user {client.user_id if client.user_id % 2 else other_id} ' in line for line in logged)
+
+    rebalance(1, log=logged.append)
+    assert all(get_router().shard_for(user_id) == 0 for user_id in (client.user_id, other_id))
+    assert snapshot(other_id) == before[other_id]
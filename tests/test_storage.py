@@ -0,0 +1,224 @@
+import itertools
+import os
+import tempfile
+from datetime import date, timedelta
+
+import pytest
+
+from recurring import materialize_due
+from storage import (
+    BudgetRepo, ChangeRepo, ExpenseRepo, PostgresStorage, RecurringRepo, SavingsRepo, SQLiteStorage, create_storage,
+)
+
+_user_ids = itertools.count(100000)
+
+@pytest.fixture(scope='module')
+def server_url():
+    """A PostgreSQL server: STORAGE_TEST_URL, or a throwaway one from pgserver"""
+    pytest.importorskip('psycopg')
+    if os.environ.get('STORAGE_TEST_URL'):
+        yield os.environ['STORAGE_TEST_URL']
+        return
+    pgserver = pytest.importorskip('pgserver')
+    server = pgserver.get_server(tempfile.mkdtemp(prefix='expense-pg-'), cleanup_mode='stop')
+    try:
+        yield server.get_uri()
+    finally:
+        server.cleanup()
+
+@pytest.fixture(scope='module')
+def server_storage(server_url):
+    storage = PostgresStorage(server_url)
+    storage.create_schema()
+    return storage
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+def store(request, app):
+    """Each backend's storage, with a fresh user id for the test"""
+    if request.param == 'postgres':
+        storage = request.getfixturevalue('server_storage')
+    else:
+        storage = SQLiteStorage()
+    storage.user_id = next(_user_ids)
+    return storage
+
+def test_server_schema_can_be_applied_again(server_storage):
+    server_storage.create_schema()
+    with server_storage.connect() as db:
+        names = {row['name'] for row in db.execute('SELECT name FROM categories')}
+    assert 'Travel' in names
+
+def test_rollups_follow_every_write(store):
+    user_id = store.user_id
+    with store.connect(user_id) as db:
+        expenses = ExpenseRepo(db, user_id)
+        first = expenses.add(10, 'Travel', '2026-01-05', 'Card', 'taxi')
+        expenses.add(5, 'Travel', '2026-01-05', 'Cash')
+        expenses.add_many([(7, 'Shopping', '2026-02-01', 'Card', '')])
+        expenses.update(first, 12, 'Travel', '2026-01-06', 'Card', 'taxi')
+
+        assert [tuple(row) for row in expenses.daily_totals(('date',))] == [
+            ('2026-01-05', 5), ('2026-01-06', 12), ('2026-02-01', 7)
+        ]
+        assert [tuple(row) for row in expenses.monthly_totals(('month', 'category'), '2026-01', '2026-01')] == [
+            ('2026-01', 'Travel', 17)
+        ]
+        assert sorted(tuple(row) for row in expenses.facet_counts()) == [
+            ('Shopping', 'Card', 1), ('Travel', 'Card', 1), ('Travel', 'Cash', 1)
+        ]
+
+        expenses.delete(first)
+        assert [tuple(row) for row in expenses.daily_totals(('category',), '2026-01-01', '2026-01-31')] == [
+            ('Travel', 5)
+        ]
+
+        savings = SavingsRepo(db, user_id)
+        saving = savings.add(100, 'Salary', '2026-01-31')
+        savings.add(50, 'Salary', '2026-02-28')
+        savings.update(saving, 80, 'Salary', '2026-01-31')
+        assert savings.total() == 130
+        assert [tuple(row) for row in savings.monthly_totals(('month',))] == [('2026-01', 80), ('2026-02', 50)]
+
+def test_rebuilt_rollups_match_the_maintained_ones(store):
+    user_id = store.user_id
+    with store.connect(user_id) as db:
+        expenses = ExpenseRepo(db, user_id)
+        expenses.add_many([(i, 'Travel', f'2026-03-{1 + i % 5:02d}', 'Card', '') for i in range(1, 11)])
+        before = [tuple(row) for row in expenses.daily_totals(('date', 'category', 'payment_mode'))]
+    store.rebuild_rollups()
+    with store.connect(user_id) as db:
+        assert [tuple(row) for row in ExpenseRepo(db, user_id).daily_totals(('date', 'category', 'payment_mode'))] == before
+
+def test_change_version_counts_writes_to_tracked_tables(store):
+    user_id = store.user_id
+    with store.connect(user_id) as db:
+        changes = ChangeRepo(db, user_id)
+        assert changes.version() == 0
+        ExpenseRepo(db, user_id).add(10, 'Travel', '2026-01-05', 'Card')
+        BudgetRepo(db, user_id).set(500, 'monthly', '2026-01')
+        rule = RecurringRepo(db, user_id).add(3, 'Travel', 'Card', '', 'monthly', 1, '2030-01-01')
+        RecurringRepo(db, user_id).delete(rule)
+        assert changes.version() == 4
+
+def test_pages_and_batches_walk_the_rows_in_order(store):
+    user_id = store.user_id
+    with store.connect(user_id) as db:
+        expenses = ExpenseRepo(db, user_id)
+        expenses.add_many([(i, 'Travel' if i % 2 else 'Shopping', f'2026-01-{i:02d}', 'Card', '') for i in range(1, 21)])
+        conditions = [('amount', '>=', 5), ('category', 'IN', ['Travel'])]
+
+        seen, after = [], None
+        while True:
+            rows = expenses.page(conditions, 'amount', 'DESC', 4, after, 'idx_expenses_user_amount')
+            seen += [row['amount'] for row in rows]
+            if len(rows) < 4:
+                break
+            after = (rows[-1]['amount'], rows[-1]['id'])
+        assert seen == [19, 17, 15, 13, 11, 9, 7, 5]
+
+        batches = list(expenses.batches(conditions, 'date', 'ASC', 3))
+        assert [len(rows) for rows in batches] == [3, 3, 2]
+        assert [row['amount'] for rows in batches for row in rows] == seen[::-1]
+
+def test_search_ranks_notes_above_other_columns(store):
+    user_id = store.user_id
+    with store.connect(user_id) as db:
+        expenses = ExpenseRepo(db, user_id)
+        expenses.add(1, 'Travel', '2026-01-01', 'Card', 'hotel')
+        expenses.add(2, 'Shopping', '2026-01-02', 'Card', 'travel adapter')
+        expenses.add(3, 'Food & Dining', '2026-01-03', 'Cash', 'lunch')
+
+        ranked = expenses.search(['travel'])
+        assert [row['amount'] for row in ranked] == [2, 1]
+        assert ranked[0]['score'] > ranked[1]['score']
+        assert [row['notes'] for row in expenses.search(['adapt'])] == ['travel adapter']
+        assert [row['amount'] for row in expenses.search(['travel'], [('amount', '<=', 1)])] == [1]
+        assert expenses.search(['hotel'], limit=5, offset=1) == []
+
+def test_budget_status_joins_the_month_spend(store):
+    user_id = store.user_id
+    with store.connect(user_id) as db:
+        ExpenseRepo(db, user_id).add_many([
+            (30, 'Travel', '2026-04-02', 'Card', ''), (20, 'Shopping', '2026-04-03', 'Card', ''),
+            (99, 'Travel', '2026-05-01', 'Card', ''),
+        ])
+        budgets = BudgetRepo(db, user_id)
+        budgets.set(200, 'monthly', '2026-04')
+        budgets.set(25, 'category', '2026-04', 'Travel')
+        budgets.set(300, 'monthly', '2026-04')
+        assert [(row['category'], row['amount'], row['spent']) for row in budgets.status('2026-04')] == [
+            (None, 300, 50), ('Travel', 25, 30)
+        ]
+        assert budgets.amount('monthly', '2026-04') == 300
+
+def test_amount_filtered_facets_and_outlier_candidates(store):
+    user_id = store.user_id
+    with store.connect(user_id) as db:
+        expenses = ExpenseRepo(db, user_id)
+        expenses.add_many([(i, 'Travel' if i <= 5 else 'Shopping', '2026-01-10', 'Card', '') for i in range(1, 11)])
+        assert sorted(tuple(row) for row in expenses.facet_counts([('amount', '>=', 4), ('date', '<=', '2026-01-31')])) == [
+            ('Shopping', 'Card', 5), ('Travel', 'Card', 2)
+        ]
+        largest = expenses.largest_above({'Travel': 3, 'Shopping': 9}, '2026-01-01', '2026-01-31', 1)
+        assert sorted((row['category'], row['amount']) for row in largest) == [('Shopping', 10), ('Travel', 5)]
+
+def test_recurring_pass_writes_each_occurrence_once(store):
+    user_id = store.user_id
+    start = date.today() - timedelta(days=2)
+    with store.connect(user_id) as db:
+        RecurringRepo(db, user_id).add(4, 'Travel', 'Card', '', 'daily', 1, start.isoformat())
+        RecurringRepo(db, user_id).add(4, 'Travel', 'Card', '', 'daily', 1, start.isoformat())
+        # The rule repeats on the next pass as if it had never advanced
+        materialize_due(db, date.today())
+        db.write(lambda db: db.execute(
+            'UPDATE recurring_expenses SET next_date = ? WHERE user_id = ?', (start.isoformat(), user_id)
+        ))
+        materialize_due(db, date.today())
+        assert len(ExpenseRepo(db, user_id).page()) == 6
+        assert ExpenseRepo(db, user_id).facet_counts()[0]['count'] == 6
+
+def test_create_storage_reads_the_backend_from_config():
+    assert isinstance(create_storage({}), SQLiteStorage)
+    with pytest.raises(RuntimeError, match='STORAGE_URL'):
+        create_storage({'STORAGE_BACKEND': 'postgres'})
+    with pytest.raises(RuntimeError, match='STORAGE_BACKEND'):
+        create_storage({'STORAGE_BACKEND': 'mysql'})
+
+@pytest.fixture
+def server_client(app, server_storage, monkeypatch):
+    """A signed-in test client of the app running on the server backend"""
+    import app as app_module
+    from cache import create_cache
+    monkeypatch.setattr(app_module, 'storage', server_storage)
+    monkeypatch.setattr(app_module, 'result_cache', create_cache(app.config, app_module.stored_data_version))
+    app.teardown_appcontext_funcs.append(server_storage.close_request_sessions)
+    client = app.test_client()
+    response = client.post('/signup', json={
+        'email': f'server{next(_user_ids)}@example.com', 'password': 'secret123', 'name': 'Server User'
+    })
+    assert response.status_code == 201
+    yield client
+    app.teardown_appcontext_funcs.remove(server_storage.close_request_sessions)
+
+def test_dashboard_reads_run_on_the_server(server_client):
+    today = date.today()
+    for amount, notes in ((10, 'airport taxi'), (25, 'hotel')):
+        assert server_client.post('/api/expenses', json={
+            'amount': amount, 'category': 'Travel', 'date': today.isoformat(), 'payment_mode': 'Card', 'notes': notes
+        }).status_code == 201
+    server_client.post('/api/budget', json={'amount': 100})
+
+    bundle = server_client.get('/api/dashboard/bundle').get_json()
+    assert bundle['summary']['month_total'] == 35
+    assert bundle['top_expenses']['amounts'] == [25, 10]
+    assert server_client.get('/api/budget/status').get_json()['monthly']['spent'] == 35
+    page = server_client.get('/api/expenses?limit=1&amount_min=5').get_json()
+    assert page['facets']['total'] == 2 and page['next_cursor']
+    assert [item['notes'] for item in server_client.get('/api/expenses/search?q=tax').get_json()['items']] == ['airport taxi']
+    assert server_client.get('/api/export/expenses').get_data(as_text=True).count('\n') == 3
+    assert server_client.get('/api/dashboard/analytics/trends?days=7').get_json()['daily'][-1] == 35
+
+    first = server_client.get('/api/dashboard/summary')
+    server_client.delete(f"/api/expenses/{page['items'][0]['id']}")
+    after = server_client.get('/api/dashboard/summary', headers={'If-None-Match': first.headers['ETag']})
+    assert after.status_code == 200 and after.get_json()['month_total'] == 10